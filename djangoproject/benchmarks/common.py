@@ -0,0 +1,88 @@
+"""Helpers shared by the benchmark scripts in this directory."""
+import atexit
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django(profile=None, **overrides):
+    """
+    Configure Django with the given DATABASE_PROFILES entry (default: the
+    one from the environment) and migrate it. SQLite profiles point at a
+    throwaway file so a run never touches db.sqlite3. Extra keyword
+    arguments override settings.
+    """
+    if PROJECT_DIR not in sys.path:
+        sys.path.insert(0, PROJECT_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'djangoproject.settings')
+
+    import django
+    from django.conf import settings
+
+    tmpdir = tempfile.mkdtemp(prefix='djangoapp-bench-')
+    atexit.register(shutil.rmtree, tmpdir, ignore_errors=True)
+    database = dict(settings.DATABASE_PROFILES[profile] if profile else settings.DATABASES['default'])
+    if database['ENGINE'] == 'django.db.backends.sqlite3':
+        database['NAME'] = os.path.join(tmpdir, 'bench.sqlite3')
+    settings.DATABASES = {'default': database}
+    # The benchmarks post forms directly, without a CSRF round trip first.
+    settings.MIDDLEWARE = [m for m in settings.MIDDLEWARE if m != 'django.middleware.csrf.CsrfViewMiddleware']
+    settings.ALLOWED_HOSTS = ['localhost']
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return tmpdir
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(name, latencies, elapsed):
+    return '%-22s %8.1f req/s   p50 %7.1f ms   p99 %7.1f ms' % (
+        name,
+        len(latencies) / elapsed if elapsed else 0.0,
+        percentile(latencies, 50) * 1000,
+        percentile(latencies, 99) * 1000,
+    )
+
+
+def wsgi_post(application, path, body, remote_addr='127.0.0.1'):
+    """POST a urlencoded body to a WSGI application; returns (status code, seconds)."""
+    environ = {
+        'REQUEST_METHOD': 'POST',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'REMOTE_ADDR': remote_addr,
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'HTTP_HOST': 'localhost',
+        'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http',
+        'wsgi.version': (1, 0),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    status = []
+    start = time.perf_counter()
+    result = application(environ, lambda s, headers, exc_info=None: status.append(s))
+    b''.join(result)
+    if hasattr(result, 'close'):
+        result.close()
+    return int(status[0].split()[0]), time.perf_counter() - start
@@ -0,0 +1,105 @@
+"""
+Concurrency benchmark for the database profiles in settings.DATABASE_PROFILES.
+
+Each profile runs in its own process against a fresh database: writer
+threads register users (one transaction per signup, as the register view
+does) while reader threads run uniqueness lookups. Connections are released
+after every operation the way the end of a request would, so persistent
+connections are exercised too. Reported per profile: signups/s, p50/p99
+write latency, read latency, and how many operations failed with
+"database is locked".
+
+Usage: python benchmarks/db_contention.py [--profiles dev sqlite-wal] [--writers 8]
+"""
+import argparse
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+from common import percentile, setup_django
+
+
+def run_profile(profile, writers, readers, ops):
+    setup_django(profile, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+
+    from django.contrib.auth.models import User
+    from django.db import OperationalError, close_old_connections, transaction
+
+    prefix = uuid.uuid4().hex[:8]
+    write_latencies, read_latencies = [], []
+    locked = [0]
+    lock = threading.Lock()
+
+    def writer(n):
+        for i in range(ops):
+            start = time.perf_counter()
+            try:
+                with transaction.atomic():
+                    User.objects.create_user('%s-%d-%d' % (prefix, n, i), email='%s-%d-%d@example.com' % (prefix, n, i), password='pw')
+            except OperationalError:
+                with lock:
+                    locked[0] += 1
+                continue
+            finally:
+                close_old_connections()
+            with lock:
+                write_latencies.append(time.perf_counter() - start)
+
+    def reader(n):
+        for i in range(ops):
+            start = time.perf_counter()
+            try:
+                User.objects.filter(username='%s-%d-%d' % (prefix, n, i)).exists()
+            except OperationalError:
+                with lock:
+                    locked[0] += 1
+                continue
+            finally:
+                close_old_connections()
+            with lock:
+                read_latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    threads += [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    print('%-11s %7.1f signups/s   write p50 %6.1f ms  p99 %7.1f ms   read p99 %6.1f ms   locked %d' % (
+        profile,
+        len(write_latencies) / elapsed,
+        percentile(write_latencies, 50) * 1000,
+        percentile(write_latencies, 99) * 1000,
+        percentile(read_latencies, 99) * 1000,
+        locked[0],
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles', nargs='+', default=['dev', 'sqlite-wal'])
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--ops', type=int, default=200, help='Operations per thread.')
+    parser.add_argument('--run-profile', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_profile:
+        run_profile(args.run_profile, args.writers, args.readers, args.ops)
+        return
+    print('%d writers, %d readers, %d ops each' % (args.writers, args.readers, args.ops))
+    for profile in args.profiles:
+        # Settings are per process, so every profile gets a fresh interpreter.
+        subprocess.run([
+            sys.executable, __file__, '--run-profile', profile,
+            '--writers', str(args.writers), '--readers', str(args.readers), '--ops', str(args.ops),
+        ], check=True)
+
+
+if __name__ == '__main__':
+    main()
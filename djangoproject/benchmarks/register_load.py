@@ -0,0 +1,125 @@
+"""
+Load benchmark for POST /register/ under the WSGI and ASGI deployments.
+
+Drives djangoproject.wsgi.application from a pool of threads (as a threaded
+WSGI server would) and djangoproject.asgi.application from concurrent asyncio
+tasks, then reports req/s and p50/p99 latency for:
+
+  wsgi  + register    the sync view behind a threaded WSGI server
+  asgi  + register    the sync view under ASGI (one thread hop per request)
+  asgi  + aregister   the async view under ASGI
+
+Usage: python benchmarks/register_load.py [--requests N] [--concurrency C]
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from common import setup_django, summarize, wsgi_post
+
+
+def form_body(prefix, i):
+    password = 'Bench-pass-%d' % i
+    return urlencode({
+        'username': '%s%d' % (prefix, i),
+        'email': '%s%d@example.com' % (prefix, i),
+        'password': password,
+        'password2': password,
+    }).encode()
+
+
+def run_wsgi(application, path, prefix, requests, concurrency):
+    def one(i):
+        status, latency = wsgi_post(application, path, form_body(prefix, i))
+        return latency, status == 200
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    return results, time.perf_counter() - start
+
+
+async def run_asgi(application, path, prefix, requests, concurrency):
+    results = []
+    counter = iter(range(requests))
+
+    async def one(i):
+        body = form_body(prefix, i)
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'POST',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': b'',
+            'root_path': '',
+            'headers': [
+                (b'host', b'localhost'),
+                (b'content-type', b'application/x-www-form-urlencoded'),
+                (b'content-length', str(len(body)).encode()),
+            ],
+            'client': ('127.0.0.1', 40000),
+            'server': ('localhost', 80),
+        }
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        never = asyncio.get_running_loop().create_future()
+        status = []
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            return await never
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        start = time.perf_counter()
+        await application(scope, receive, send)
+        return time.perf_counter() - start, status[0] == 200
+
+    async def client():
+        for i in counter:
+            results.append(await one(i))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return results, time.perf_counter() - start
+
+
+def report(name, results, elapsed):
+    latencies = [latency for latency, ok in results]
+    failed = sum(1 for latency, ok in results if not ok)
+    print(summarize(name, latencies, elapsed) + ('   %d failed' % failed if failed else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--fast-hasher', action='store_true', help='Use MD5 to measure the request path without PBKDF2.')
+    args = parser.parse_args()
+
+    overrides = {'REGISTRATION_THROTTLE_ENABLED': False}
+    if args.fast_hasher:
+        overrides['PASSWORD_HASHERS'] = ['django.contrib.auth.hashers.MD5PasswordHasher']
+    setup_django(**overrides)
+
+    from djangoproject.asgi import application as asgi_application
+    from djangoproject.wsgi import application as wsgi_application
+
+    print('%d requests, concurrency %d' % (args.requests, args.concurrency))
+    results, elapsed = run_wsgi(wsgi_application, '/register/', 'wsgi', args.requests, args.concurrency)
+    report('wsgi  + register', results, elapsed)
+    results, elapsed = asyncio.run(run_asgi(asgi_application, '/register/', 'asgisync', args.requests, args.concurrency))
+    report('asgi  + register', results, elapsed)
+    results, elapsed = asyncio.run(run_asgi(asgi_application, '/register/async/', 'asgi', args.requests, args.concurrency))
+    report('asgi  + aregister', results, elapsed)
+
+
+if __name__ == '__main__':
+    main()
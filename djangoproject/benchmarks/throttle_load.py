@@ -0,0 +1,90 @@
+"""
+Abuse load test for registration throttling.
+
+A WSGI server with a fixed number of worker threads is modelled by a
+semaphore around djangoproject.wsgi.application. Legitimate clients sign up
+at a steady pace, each from its own address, while attackers flood POST
+/register/ from a handful of addresses. Legitimate latency (queueing
+included) is reported for three runs: no attack, attack with throttling
+off, and attack with throttling on.
+
+Usage: python benchmarks/throttle_load.py [--duration 20] [--attackers 16]
+"""
+import argparse
+import itertools
+import logging
+import threading
+import time
+from urllib.parse import urlencode
+
+from common import setup_django, summarize, wsgi_post
+
+
+def run(application, server_slots, duration, legit_clients, legit_interval, attackers, attacker_ips, label):
+    stop = time.perf_counter() + duration
+    legit, attack = [], []
+    statuses = {}
+    lock = threading.Lock()
+    ids = itertools.count()
+
+    def request(ip, bucket):
+        n = next(ids)
+        body = urlencode({'username': '%s-%d' % (label, n), 'password': 'Load-pass-%d' % n, 'password2': 'Load-pass-%d' % n}).encode()
+        start = time.perf_counter()
+        with server_slots:
+            status, _ = wsgi_post(application, '/register/', body, remote_addr=ip)
+        latency = time.perf_counter() - start
+        with lock:
+            bucket.append(latency)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    def legit_client(c):
+        for i in itertools.count():
+            if time.perf_counter() >= stop:
+                return
+            request('10.%d.%d.%d' % (c, i // 250, i % 250 + 1), legit)
+            time.sleep(legit_interval)
+
+    def attacker(a):
+        while time.perf_counter() < stop:
+            request('192.0.2.%d' % (a % attacker_ips + 1), attack)
+
+    threads = [threading.Thread(target=legit_client, args=(c,)) for c in range(legit_clients)]
+    threads += [threading.Thread(target=attacker, args=(a,)) for a in range(attackers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    print(summarize(label, legit, elapsed) + '   attack requests %d   statuses %s' % (len(attack), dict(sorted(statuses.items()))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--server-threads', type=int, default=8)
+    parser.add_argument('--legit-clients', type=int, default=4)
+    parser.add_argument('--legit-interval', type=float, default=0.5, help='Seconds between signups per legitimate client.')
+    parser.add_argument('--attackers', type=int, default=16)
+    parser.add_argument('--attacker-ips', type=int, default=2)
+    args = parser.parse_args()
+
+    setup_django(REGISTRATION_THROTTLE_RATES={'ip': (5 / 60, 5), 'global': (200, 400)})
+
+    from django.conf import settings
+    from djangoapp import throttling
+    from djangoproject.wsgi import application
+
+    # Every 429 would otherwise be logged as a warning.
+    logging.getLogger('django.request').setLevel(logging.ERROR)
+    slots = threading.BoundedSemaphore(args.server_threads)
+    print('req/s below counts legitimate signups only')
+    for label, attackers, enabled in (('no-attack', 0, True), ('attack-open', args.attackers, False), ('attack-throttled', args.attackers, True)):
+        settings.REGISTRATION_THROTTLE_ENABLED = enabled
+        throttling.get_store().clear()
+        run(application, slots, args.duration, args.legit_clients, args.legit_interval, attackers, args.attacker_ips, label)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,23 @@
 from django.contrib import admin
+from django.contrib.auth.admin import UserAdmin
+from django.contrib.auth.models import User
 
-# Register your models here.
+from .forms import UserAdminChangeForm, UserAdminCreationForm
+from .models import Task
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'run_after', 'finished_at')
+    list_filter = ('status', 'name')
+
+
+admin.site.unregister(User)
+
+
+@admin.register(User)
+class IdentityUserAdmin(UserAdmin):
+    # Report case-insensitive username/email conflicts as form errors rather
+    # than leaving them to check_user_identity's IntegrityError.
+    form = UserAdminChangeForm
+    add_form = UserAdminCreationForm
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class DjangoappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'djangoapp'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import signals  # noqa: F401
+        from .perf import install_execute_wrapper
+
+        connection_created.connect(install_execute_wrapper)
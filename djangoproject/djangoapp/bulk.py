@@ -0,0 +1,221 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+
+from .forms import UNIQUE_MESSAGES, UserRegistrationForm
+from .models import UserIdentity
+from .tasks import enqueue_many, registration_followups
+from .uniqueness import identity_for, identity_index
+
+DEFAULT_BATCH_SIZE = 1000
+# Uploads to the bulk_register view with more rows go through the task queue.
+DEFAULT_INLINE_ROWS = 25
+
+
+def read_rows(stream, fmt='csv'):
+    """Yield (line number, row dict) pairs from a text stream of CSV or JSONL."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_num, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                row = {'__error__': str(exc)}
+            else:
+                if not isinstance(row, dict):
+                    row = {'__error__': 'expected a JSON object'}
+            yield line_num, row
+    else:
+        raise ValueError('Unknown format: %s' % fmt)
+
+
+def _init_worker():
+    # Under the "spawn" start method the workers begin with an empty Django.
+    if not apps.ready:
+        django.setup()
+
+
+def hash_password(raw_password):
+    return make_password(raw_password)
+
+
+class BulkRegistrationReport:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.errors = []
+        self.elapsed = 0.0
+
+    @property
+    def rate(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def add_error(self, line, errors):
+        self.errors.append({'line': line, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'failed': len(self.errors),
+            'elapsed': round(self.elapsed, 3),
+            'rows_per_second': round(self.rate, 1),
+            'errors': self.errors,
+        }
+
+
+class BulkRegistration:
+    """
+    Validate rows with UserRegistrationForm, hash the passwords on a process
+    pool and insert the users with batched bulk_create.
+
+    Hashing of one batch overlaps with validation of the next. With
+    workers <= 1 the passwords are hashed inline. `heartbeat`, if given, is
+    called for every row (see tasks.heartbeat).
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, workers=None, heartbeat=None):
+        self.batch_size = batch_size
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.heartbeat = heartbeat or (lambda: None)
+        self.report = BulkRegistrationReport()
+        self._seen = set()
+
+    def run(self, rows):
+        start = time.perf_counter()
+        executor = None
+        if self.workers > 1:
+            executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        try:
+            rows = iter(rows)
+            pending = None
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                prepared = self._prepare(batch, executor)
+                if pending is not None:
+                    self._save(*pending)
+                pending = prepared
+            if pending is not None:
+                self._save(*pending)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            self.report.elapsed = time.perf_counter() - start
+        return self.report
+
+    def _validate(self, line, row):
+        self.report.rows += 1
+        if '__error__' in row:
+            self.report.add_error(line, {'__all__': [{'message': row['__error__'], 'code': 'invalid'}]})
+            return None
+        data = dict(row)
+        data.setdefault('password2', data.get('password'))
+        form = UserRegistrationForm(data)
+        if not form.is_valid():
+            self.report.add_error(line, form.errors.get_json_data())
+            return None
+        identity = identity_for(form.instance)
+        keys = [('username', identity.username)]
+        if identity.email:
+            keys.append(('email', identity.email))
+        duplicates = {
+            field: [{'message': str(UNIQUE_MESSAGES[field]), 'code': 'unique'}]
+            for field, value in keys if (field, value) in self._seen
+        }
+        if duplicates:
+            self.report.add_error(line, duplicates)
+            return None
+        self._seen.update(keys)
+        return form
+
+    def _prepare(self, batch, executor):
+        valid = []
+        for line, row in batch:
+            self.heartbeat()
+            form = self._validate(line, row)
+            if form is not None:
+                valid.append((line, form))
+        passwords = [form.cleaned_data['password'] for line, form in valid]
+        if executor is None:
+            hashes = map(hash_password, passwords)
+        else:
+            chunksize = max(1, len(passwords) // (self.workers * 4))
+            hashes = executor.map(hash_password, passwords, chunksize=chunksize)
+        return valid, hashes
+
+    def _save(self, valid, hashes):
+        users = []
+        for (line, form), encoded in zip(valid, hashes):
+            self.heartbeat()
+            user = form.save(commit=False)
+            user.password = encoded
+            users.append((line, form, user))
+        if not users:
+            return
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create([user for line, form, user in users])
+                # bulk_create() sends no post_save, so add the identities here.
+                identities = UserIdentity.objects.bulk_create([identity_for(user) for line, form, user in users])
+                enqueue_many([item for line, form, user in users for item in registration_followups(user)])
+            for identity in identities:
+                identity_index.add(identity.username, identity.email)
+            self.report.created += len(users)
+        except IntegrityError:
+            # Someone else registered one of these names since validation;
+            # fall back to row-by-row inserts to find the offending rows,
+            # which get the form's "already taken" errors.
+            for line, form, user in users:
+                user.pk = None
+                if form.save_user(user):
+                    self.report.created += 1
+                else:
+                    self.report.add_error(line, form.errors.get_json_data())
+
+
+def bulk_register(rows, batch_size=DEFAULT_BATCH_SIZE, workers=None, heartbeat=None):
+    return BulkRegistration(batch_size=batch_size, workers=workers, heartbeat=heartbeat).run(rows)
+
+
+def register_file(path, fmt, batch_size=DEFAULT_BATCH_SIZE, workers=None, heartbeat=None):
+    with open(path, newline='', encoding='utf-8-sig') as stream:
+        return bulk_register(read_rows(stream, fmt), batch_size=batch_size, workers=workers, heartbeat=heartbeat)
+
+
+def count_rows(path, fmt, limit):
+    """The number of rows in a spooled file, reading no more than limit + 1."""
+    with open(path, newline='', encoding='utf-8-sig') as stream:
+        return sum(1 for row in islice(read_rows(stream, fmt), limit + 1))
+
+
+def spool(source, fmt):
+    """
+    Copy a file-like upload or request body, chunk by chunk, to a new file in
+    BULK_REGISTER_SPOOL_DIR (the temp directory by default); returns its path.
+    """
+    fd, path = tempfile.mkstemp(
+        prefix='bulk-register-', suffix='.' + fmt, dir=getattr(settings, 'BULK_REGISTER_SPOOL_DIR', None),
+    )
+    with os.fdopen(fd, 'wb') as f:
+        shutil.copyfileobj(source, f)
+    return path
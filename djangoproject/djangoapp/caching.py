@@ -0,0 +1,128 @@
+import hashlib
+import os
+import threading
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.middleware.csrf import get_token
+from django.template import engines
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+
+# Rendered into cached pages in place of the CSRF token and swapped for the
+# real, per-request token when the page is served.
+CSRF_PLACEHOLDER = '__csrf_token_placeholder__'
+DEFAULT_TIMEOUT = 3600
+
+
+class CacheStats:
+    """Per-process hit/miss counters, by kind of cached object."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def record(self, kind, hit):
+        key = (kind, 'hits' if hit else 'misses')
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self._counts)
+        kinds = sorted({kind for kind, outcome in counts})
+        return {kind: {'hits': counts.get((kind, 'hits'), 0), 'misses': counts.get((kind, 'misses'), 0)} for kind in kinds}
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+stats = CacheStats()
+
+
+def get_cache():
+    return caches[getattr(settings, 'REGISTRATION_CACHE_ALIAS', 'default')]
+
+
+@lru_cache(maxsize=None)
+def template_stamp():
+    """
+    Short hash of the relative path, size and mtime of every template file,
+    taken once per process. A deploy that changes a template starts new
+    processes, and those no longer read pages rendered from the old files.
+    """
+    digest = hashlib.blake2b(digest_size=6)
+    for engine in engines.all():
+        for directory in engine.template_dirs:
+            for root, dirs, files in os.walk(directory):
+                dirs.sort()
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    digest.update(('%s:%d:%d\n' % (os.path.relpath(path, directory), stat.st_size, stat.st_mtime_ns)).encode())
+    return digest.hexdigest()
+
+
+def _key(kind, name):
+    # REGISTRATION_CACHE_VERSION invalidates everything at once, e.g. per deploy.
+    version = getattr(settings, 'REGISTRATION_CACHE_VERSION', '')
+    return 'djangoapp:%s:%s:%s:%s:%s' % (version, template_stamp(), kind, name, get_language())
+
+
+def get_or_render(kind, name, render):
+    cache = get_cache()
+    key = _key(kind, name)
+    value = cache.get(key)
+    stats.record(kind, value is not None)
+    if value is None:
+        value = render()
+        cache.set(key, value, getattr(settings, 'REGISTRATION_CACHE_TIMEOUT', DEFAULT_TIMEOUT))
+    return value
+
+
+async def aget_or_render(kind, name, render):
+    """get_or_render() for async views, through the cache's async API."""
+    cache = get_cache()
+    key = _key(kind, name)
+    value = await cache.aget(key)
+    stats.record(kind, value is not None)
+    if value is None:
+        # Rendering may read the cache itself ({% form_fragment %}), so it
+        # runs in a thread rather than on the event loop.
+        value = await sync_to_async(render)()
+        await cache.aset(key, value, getattr(settings, 'REGISTRATION_CACHE_TIMEOUT', DEFAULT_TIMEOUT))
+    return value
+
+
+def render_form_fragment(form):
+    """form.as_p(), cached while the form is unbound."""
+    if form.is_bound:
+        return form.as_p()
+    return mark_safe(get_or_render('form', type(form).__qualname__, form.as_p))
+
+
+def render_unbound_page(request, template_name, form):
+    """
+    Render template_name for an unbound form, from the cache when possible.
+
+    The page is rendered without a request, so the template may use only the
+    form and {% csrf_token %}; each response gets the requester's own token.
+    """
+    name = '%s:%s' % (template_name, type(form).__qualname__)
+    html = get_or_render(
+        'page', name, lambda: render_to_string(template_name, {'form': form, 'csrf_token': CSRF_PLACEHOLDER}),
+    )
+    return html.replace(CSRF_PLACEHOLDER, get_token(request))
+
+
+async def arender_unbound_page(request, template_name, form):
+    """render_unbound_page() for async views."""
+    name = '%s:%s' % (template_name, type(form).__qualname__)
+    html = await aget_or_render(
+        'page', name, lambda: render_to_string(template_name, {'form': form, 'csrf_token': CSRF_PLACEHOLDER}),
+    )
+    return html.replace(CSRF_PLACEHOLDER, get_token(request))
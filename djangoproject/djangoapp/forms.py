@@ -1,7 +1,46 @@
+from asgiref.sync import sync_to_async
 from django import forms
+from django.contrib.auth.forms import AdminUserCreationForm, UserChangeForm
 from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from .tasks import enqueue_registration_followups
+from .uniqueness import afind_taken, find_taken
 
-class UserRegistrationForm(forms.ModelForm):
+UNIQUE_MESSAGES = {
+    'username': User._meta.get_field('username').error_messages['unique'],
+    'email': 'A user with that email address already exists.',
+}
+
+
+class UserIdentityFormMixin:
+    """
+    Case-insensitive username and email checks against the indexed
+    UserIdentity table, in place of ModelForm's exact username query. Only
+    fields the form changes are checked, so editing a user whose legacy name
+    already collides does not fail on the name it keeps.
+    """
+
+    def validate_unique(self):
+        values = {
+            field: self.cleaned_data.get(field) if field in self.changed_data or self.instance._state.adding else None
+            for field in ('username', 'email')
+        }
+        self._add_unique_errors(find_taken(values['username'], values['email'], exclude_user=self.instance.pk))
+
+    def _add_unique_errors(self, fields):
+        for field in fields:
+            self.add_error(field, forms.ValidationError(UNIQUE_MESSAGES[field], code='unique'))
+
+
+class UserAdminCreationForm(UserIdentityFormMixin, AdminUserCreationForm):
+    pass
+
+
+class UserAdminChangeForm(UserIdentityFormMixin, UserChangeForm):
+    pass
+
+
+class UserRegistrationForm(UserIdentityFormMixin, forms.ModelForm):
     password = forms.CharField(label='Password', widget=forms.PasswordInput)
     password2 = forms.CharField(label='Repeat password', widget=forms.PasswordInput)
     class Meta:
@@ -12,4 +51,41 @@ class UserRegistrationForm(forms.ModelForm):
         cd = self.cleaned_data
         if cd.get('password') != cd.get('password2'):
             raise forms.ValidationError('Passwords don\'t match.')
-        return cd.get('password2')
\ No newline at end of file
+        return cd.get('password2')
+
+    def save_user(self, user):
+        """
+        Insert the user built from this form and queue its follow-up tasks.
+        The unique indexes decide races with concurrent registrations: the
+        loser gets the form error and False.
+        """
+        try:
+            with transaction.atomic():
+                user.save()
+                enqueue_registration_followups(user)
+        except IntegrityError:
+            user.pk = None
+            taken = find_taken(user.username, user.email, use_bloom=False)
+            self._add_unique_errors(taken or ['username'])
+            return False
+        return True
+
+
+class AsyncUserRegistrationForm(UserRegistrationForm):
+    """
+    UserRegistrationForm for async views: is_valid() skips the unique checks,
+    which are done by avalidate_unique() through the async ORM.
+    """
+
+    def validate_unique(self):
+        pass
+
+    async def avalidate_unique(self):
+        self._add_unique_errors(await afind_taken(self.cleaned_data.get('username'), self.cleaned_data.get('email')))
+        return not self.errors
+
+    async def asave_user(self, user):
+        # The async ORM has no atomic(), and Model.asave() is itself
+        # sync_to_async(save), so the whole transaction (user, identity via
+        # post_save, follow-up tasks) takes one explicit hop to a thread.
+        return await sync_to_async(self.save_user)(user)
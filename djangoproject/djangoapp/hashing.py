@@ -0,0 +1,35 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+from . import perf
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_hash_executor():
+    """
+    Return the shared thread pool used to hash passwords off the event loop.
+
+    hashlib releases the GIL while running PBKDF2, so threads give real
+    parallelism; the pool size (REGISTRATION_HASH_WORKERS, default one per
+    CPU) bounds how many hashes can run at once.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = getattr(settings, 'REGISTRATION_HASH_WORKERS', None) or os.cpu_count() or 1
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hash')
+    return _executor
+
+
+async def amake_password(raw_password):
+    loop = asyncio.get_running_loop()
+    with perf.timed('hash'):
+        return await loop.run_in_executor(get_hash_executor(), make_password, raw_password)
@@ -0,0 +1,46 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from djangoapp.bulk import DEFAULT_BATCH_SIZE, BulkRegistration, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Register users in bulk from a CSV or JSONL file ("-" reads stdin).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=None, help='Hashing processes (default: one per CPU).')
+        parser.add_argument('--max-errors', type=int, default=20, help='How many row errors to print.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        if path == '-':
+            stream = sys.stdin
+        else:
+            try:
+                stream = open(path, newline='', encoding='utf-8-sig')
+            except OSError as exc:
+                raise CommandError(exc)
+        try:
+            job = BulkRegistration(batch_size=options['batch_size'], workers=options['workers'])
+            report = job.run(read_rows(stream, fmt))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        for error in report.errors[:options['max_errors']]:
+            messages = '; '.join(
+                '%s: %s' % (field, ' '.join(e['message'] for e in errs))
+                for field, errs in error['errors'].items()
+            )
+            self.stderr.write('line %d: %s' % (error['line'], messages))
+        if len(report.errors) > options['max_errors']:
+            self.stderr.write('... %d more errors' % (len(report.errors) - options['max_errors']))
+        self.stdout.write(self.style.SUCCESS(
+            'Created %d of %d users in %.1fs (%.0f rows/s), %d failed.'
+            % (report.created, report.rows, report.elapsed, report.rate, len(report.errors))
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from djangoapp.tasks import Worker
+
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks (welcome emails, audit log, ...).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help='Worker threads.')
+        parser.add_argument('--batch-size', type=int, default=50, help='Tasks claimed per round trip.')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--drain', action='store_true', help='Exit once the queue is empty.')
+
+    def handle(self, *args, **options):
+        worker = Worker(concurrency=options['concurrency'], batch_size=options['batch_size'])
+        try:
+            count = worker.run(poll_interval=options['poll_interval'], drain=options['drain'])
+        except KeyboardInterrupt:
+            return
+        self.stdout.write(self.style.SUCCESS('Ran %d tasks.' % count))
@@ -0,0 +1,71 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.functional import empty
+
+from . import perf
+
+
+class PerfMiddleware:
+    """
+    Record wall, DB, template and password-hashing time per view for a
+    sample of requests (PERF_SAMPLE_RATE). The Server-Timing header tells
+    clients how long the hashing and queries took, so it is only sent when
+    PERF_SERVER_TIMING allows it: True, 'staff' (staff users only) or False;
+    it defaults to DEBUG. 'staff' only looks at a user the request has
+    already loaded, so sampling never costs a session or user query. Keep it
+    first in MIDDLEWARE so the whole stack is timed.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = perf.start_request()
+        if token is None:
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            timings = perf.end_request(token)
+        return self.process_timings(request, response, timings, self.server_timing_for(request))
+
+    async def __acall__(self, request):
+        token = perf.start_request()
+        if token is None:
+            return await self.get_response(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            timings = perf.end_request(token)
+        return self.process_timings(request, response, timings, self.server_timing_for(request))
+
+    def server_timing_for(self, request):
+        setting = getattr(settings, 'PERF_SERVER_TIMING', settings.DEBUG)
+        if setting == 'staff':
+            user = self.loaded_user(request)
+            return user is not None and user.is_staff
+        return bool(setting)
+
+    def loaded_user(self, request):
+        """
+        The user if the view already loaded it (request.user or
+        request.auser()), else None; never queries the session or user.
+        """
+        if hasattr(request, '_acached_user'):
+            return request._acached_user
+        user = getattr(request, 'user', None)
+        return None if user is None or getattr(user, '_wrapped', None) is empty else user
+
+    def process_timings(self, request, response, timings, show):
+        match = request.resolver_match
+        perf.collector.record(match.view_name if match else 'unresolved', timings)
+        if show:
+            response['Server-Timing'] = timings.server_timing()
+        return response
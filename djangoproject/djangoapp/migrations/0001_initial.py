@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_identities(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    UserIdentity = apps.get_model('djangoapp', 'UserIdentity')
+    batch = []
+    owners = {}  # ('username' | 'email', folded value) -> first user holding it
+    conflicts = []
+    for user in User.objects.only('username', 'email').order_by('pk').iterator(chunk_size=2000):
+        email = (user.email or '').strip().casefold() or None
+        identity = UserIdentity(user_id=user.pk, username=user.username.casefold(), email=email)
+        clashes = []
+        for field, value in (('username', identity.username), ('email', identity.email)):
+            if value is None:
+                continue
+            owner = owners.setdefault((field, value), (user.pk, user.username))
+            if owner[0] != user.pk:
+                clashes.append('%s %r also belongs to user %s (%r)' % (field, value, *owner))
+        if clashes:
+            conflicts.append('user %s (%r): %s' % (user.pk, user.username, '; '.join(clashes)))
+            continue
+        batch.append(identity)
+        if len(batch) >= 2000:
+            UserIdentity.objects.bulk_create(batch)
+            batch = []
+    # The migration runs in a transaction, so failing here undoes the batches.
+    if conflicts:
+        raise RuntimeError(
+            'Cannot add case-insensitive uniqueness: %d users collide with an earlier one once '
+            'usernames and emails are case-folded. Rename or merge them, then migrate again.\n  %s'
+            % (len(conflicts), '\n  '.join(conflicts))
+        )
+    UserIdentity.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserIdentity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(max_length=150, unique=True)),
+                ('email', models.CharField(blank=True, max_length=254, null=True, unique=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='identity', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'user identities',
+            },
+        ),
+        migrations.RunPython(backfill_identities, migrations.RunPython.noop),
+    ]
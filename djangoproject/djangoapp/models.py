@@ -1,3 +1,48 @@
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class UserIdentity(models.Model):
+    """
+    Case-folded username and email of a user. The unique indexes on these
+    columns give case-insensitive uniqueness checks an index to use on every
+    backend, and make the database the arbiter when two registrations for
+    the same name race.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='identity')
+    username = models.CharField(max_length=150, unique=True)
+    # NULL for users without an email, so that they do not collide.
+    email = models.CharField(max_length=254, unique=True, null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'user identities'
+
+    def __str__(self):
+        return self.username
+
+
+class Task(models.Model):
+    """A unit of background work, run by the run_tasks management command."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField()
+    claim = models.CharField(max_length=32, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+    def __str__(self):
+        return '%s #%s (%s)' % (self.name, self.pk, self.status)
@@ -0,0 +1,129 @@
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+DEFAULT_WINDOW = 1000
+METRICS = ('total', 'db', 'queries', 'template', 'hash')
+
+_current = ContextVar('djangoapp_perf_timings', default=None)
+
+
+class RequestTimings:
+    """Wall time of one sampled request, split by where it was spent (seconds)."""
+
+    __slots__ = ('start', 'total', 'db', 'queries', 'template', 'hash')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.total = self.db = self.template = self.hash = 0.0
+        self.queries = 0
+
+    def finish(self):
+        self.total = time.perf_counter() - self.start
+
+    def server_timing(self):
+        return 'total;dur=%.1f, db;dur=%.1f;desc="%d queries", tpl;dur=%.1f, hash;dur=%.1f' % (
+            self.total * 1000, self.db * 1000, self.queries, self.template * 1000, self.hash * 1000,
+        )
+
+
+def current():
+    return _current.get()
+
+
+def start_request():
+    """Begin timing the current request if it is sampled; returns a token for end_request()."""
+    rate = getattr(settings, 'PERF_SAMPLE_RATE', 1.0)
+    if rate <= 0 or (rate < 1 and random.random() >= rate):
+        return None
+    return _current.set(RequestTimings())
+
+
+def end_request(token):
+    timings = _current.get()
+    _current.reset(token)
+    timings.finish()
+    return timings
+
+
+@contextmanager
+def timed(metric):
+    """Add the time spent in the block to `metric` of the current request, if sampled."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(timings, metric, getattr(timings, metric) + time.perf_counter() - start)
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    # Installed on every connection (see apps.py); a no-op for unsampled requests.
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db += time.perf_counter() - start
+        timings.queries += 1
+
+
+def install_execute_wrapper(sender, connection, **kwargs):
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
+
+
+def _percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Collector:
+    """
+    Rolling window of the last PERF_WINDOW samples of every metric, per view.
+    Recording is an append under a lock; percentiles are computed on read.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, view, timings):
+        window = getattr(settings, 'PERF_WINDOW', DEFAULT_WINDOW)
+        with self._lock:
+            entry = self._views.get(view)
+            if entry is None:
+                entry = self._views[view] = {'count': 0, 'samples': deque(maxlen=window)}
+            entry['count'] += 1
+            entry['samples'].append(tuple(getattr(timings, metric) for metric in METRICS))
+
+    def snapshot(self):
+        with self._lock:
+            views = {view: (entry['count'], list(entry['samples'])) for view, entry in self._views.items()}
+        result = {}
+        for view, (count, samples) in sorted(views.items()):
+            metrics = {}
+            for index, metric in enumerate(METRICS):
+                ordered = sorted(sample[index] for sample in samples)
+                scale = 1 if metric == 'queries' else 1000
+                metrics[metric] = {
+                    'p%d' % pct: round(_percentile(ordered, pct) * scale, 3) for pct in (50, 95, 99)
+                }
+            result[view] = {'count': count, 'window': len(samples), 'metrics': metrics}
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+collector = Collector()
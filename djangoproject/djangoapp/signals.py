@@ -0,0 +1,71 @@
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+
+from .models import UserIdentity
+from .uniqueness import find_taken, identity_for, identity_index, normalize_email, normalize_username
+
+
+def _identity_changes(instance, raw, update_fields, using):
+    """
+    Whether this save creates a user or gives it a new case-folded username
+    or email. Saves that keep them (e.g. a profile edit of a user whose
+    legacy name collides) leave the identity alone.
+    """
+    if raw:
+        return False
+    if update_fields is not None and not {'username', 'email'} & set(update_fields):
+        return False
+    if instance._state.adding:
+        return True
+    stored = User.objects.using(using).filter(pk=instance.pk).values_list('username', 'email').first()
+    if stored is None:
+        return True
+    return (normalize_username(stored[0]), normalize_email(stored[1])) != (
+        normalize_username(instance.username), normalize_email(instance.email)
+    )
+
+
+@receiver(pre_save, sender=User)
+def check_user_identity(sender, instance, raw, update_fields, using, **kwargs):
+    """
+    Refuse a user whose new case-folded username or email belongs to another
+    user before the User row is written. Outside a transaction (e.g.
+    create_user() from createsuperuser) that row commits on its own, so
+    finding the duplicate only when post_save inserts the identity would
+    leave a user without one. Forms report these conflicts as field errors
+    first (UserIdentityFormMixin); this is the backstop for other saves.
+    """
+    instance._identity_changed = _identity_changes(instance, raw, update_fields, using)
+    if not instance._identity_changed:
+        return
+    taken = find_taken(instance.username, instance.email, exclude_user=instance.pk)
+    if taken:
+        raise IntegrityError('UserIdentity %s is already taken' % ' and '.join(taken))
+
+
+@receiver(post_save, sender=User)
+def sync_user_identity(sender, instance, created, raw, update_fields, using, **kwargs):
+    """
+    Keep UserIdentity in step with User. check_user_identity has already
+    turned away known duplicates; a registration racing this one can still
+    win the unique index, and then the new user is removed again if it was
+    committed outside a transaction.
+    """
+    if not instance.__dict__.pop('_identity_changed', False):
+        return
+    identity = identity_for(instance)
+    if created:
+        try:
+            with transaction.atomic(using=using):
+                identity.save(using=using)
+        except IntegrityError:
+            if not transaction.get_connection(using).in_atomic_block:
+                instance.delete(using=using)
+            raise
+    else:
+        UserIdentity.objects.using(using).update_or_create(
+            user=instance, defaults={'username': identity.username, 'email': identity.email},
+        )
+    identity_index.add(identity.username, identity.email)
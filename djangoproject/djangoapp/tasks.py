@@ -0,0 +1,303 @@
+import logging
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger('djangoapp.tasks')
+audit_logger = logging.getLogger('djangoapp.audit')
+
+DEFAULT_LEASE = 300
+RETRY_BASE_DELAY = 10
+# Seconds between the claim renewals of heartbeat().
+HEARTBEAT_INTERVAL = 30
+
+# name -> function taking a list of payloads and returning, for each, None
+# on success or the exception it failed with.
+registry = {}
+# Tasks that can run for longer than a batch should wait: Worker.run gives
+# them a thread of their own, and they keep their lease with heartbeat().
+long_tasks = set()
+
+_running = threading.local()
+
+
+class LeaseLost(Exception):
+    """The running tasks were claimed again by another worker."""
+
+
+def task(name, long_running=False):
+    """Register a per-payload handler under `name`."""
+    def decorator(func):
+        def handler(payloads):
+            results = []
+            for payload in payloads:
+                try:
+                    func(payload)
+                    results.append(None)
+                except Exception as exc:
+                    results.append(exc)
+            return results
+        registry[name] = handler
+        if long_running:
+            long_tasks.add(name)
+        return func
+    return decorator
+
+
+def batch_task(name):
+    """Register a handler that receives every claimed payload for `name` at once."""
+    def decorator(func):
+        registry[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, delay=0, max_attempts=5):
+    return enqueue_many([(name, payload or {})], delay=delay, max_attempts=max_attempts)[0]
+
+
+def enqueue_many(items, delay=0, max_attempts=5):
+    """Queue (name, payload) pairs in one insert. Call inside the transaction whose work they follow."""
+    run_after = timezone.now() + timedelta(seconds=delay)
+    for name, payload in items:
+        if name not in registry:
+            raise ValueError('Unknown task: %s' % name)
+    return Task.objects.bulk_create([
+        Task(name=name, payload=payload, run_after=run_after, max_attempts=max_attempts) for name, payload in items
+    ])
+
+
+def registration_followups(user):
+    """The (name, payload) pairs queued after `user` registers."""
+    return [
+        ('welcome_email', {'user_id': user.pk}),
+        ('audit_registration', {'user_id': user.pk, 'username': user.username}),
+    ]
+
+
+def enqueue_registration_followups(user):
+    return enqueue_many(registration_followups(user))
+
+
+@batch_task('welcome_email')
+def send_welcome_emails(payloads):
+    users = User.objects.in_bulk([payload['user_id'] for payload in payloads])
+    results = []
+    # One SMTP connection for the whole batch.
+    with get_connection() as connection:
+        for payload in payloads:
+            user = users.get(payload['user_id'])
+            if user is None or not user.email:
+                results.append(None)
+                continue
+            message = EmailMessage(
+                subject='Welcome, %s!' % user.username,
+                body=render_to_string('registration/welcome_email.txt', {'user': user}),
+                to=[user.email],
+                connection=connection,
+            )
+            try:
+                message.send()
+                results.append(None)
+            except Exception as exc:
+                results.append(exc)
+    return results
+
+
+@task('audit_registration')
+def audit_registration(payload):
+    audit_logger.info('user registered: id=%s username=%s', payload['user_id'], payload['username'])
+
+
+@task('bulk_register', long_running=True)
+def bulk_register_upload(payload):
+    """Import a file spooled by the bulk_register view, then delete it."""
+    # Imported here: bulk imports the forms, which import this module.
+    from .bulk import register_file
+
+    try:
+        report = register_file(
+            payload['path'], payload['format'], workers=getattr(settings, 'BULK_REGISTER_WORKERS', None),
+            heartbeat=heartbeat,
+        )
+    finally:
+        os.remove(payload['path'])
+    logger.info(
+        'bulk registration of %s: created %d of %d users, %d failed',
+        payload.get('name') or payload['path'], report.created, report.rows, len(report.errors),
+    )
+
+
+def claim(batch_size, lease=DEFAULT_LEASE, names=None, exclude=()):
+    """
+    Mark up to batch_size due tasks as running under a fresh claim id and
+    return them. Tasks whose claim is older than `lease` seconds belong to a
+    worker that died (or a handler that hangs): that counts as a failed
+    attempt, and they are claimed again until they run out of attempts.
+    Only tasks named in `names` (if given) and not in `exclude` are taken.
+    """
+    now = timezone.now()
+    queued = Q(status=Task.QUEUED, run_after__lte=now)
+    expired = Q(status=Task.RUNNING, claimed_at__lt=now - timedelta(seconds=lease))
+    claim_id = uuid.uuid4().hex
+    due = Task.objects.filter(queued | expired).exclude(name__in=exclude)
+    if names is not None:
+        due = due.filter(name__in=names)
+    with transaction.atomic():
+        ids = list(
+            due.select_for_update(skip_locked=True).order_by('run_after', 'id').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return []
+        # Only rows that are still due are taken, so two workers racing for the
+        # same ids cannot both claim one.
+        failed = Task.objects.filter(expired, id__in=ids, attempts__gte=F('max_attempts') - 1).update(
+            status=Task.FAILED, attempts=F('attempts') + 1, finished_at=now, claim='',
+            last_error='Lease of %ss expired while running' % lease,
+        )
+        if failed:
+            logger.error('%d tasks failed permanently: their last attempt outlived its lease', failed)
+        Task.objects.filter(expired, id__in=ids).update(
+            status=Task.RUNNING, attempts=F('attempts') + 1, claim=claim_id, claimed_at=now,
+        )
+        Task.objects.filter(queued, id__in=ids).update(status=Task.RUNNING, claim=claim_id, claimed_at=now)
+    return list(Task.objects.filter(claim=claim_id, status=Task.RUNNING).order_by('id'))
+
+
+def _finish(tasks, results):
+    """
+    Record results, but only on tasks still held under the claim they ran
+    with: a task reclaimed after its lease expired belongs to another worker.
+    """
+    now = timezone.now()
+    done = {}
+    for t, error in zip(tasks, results):
+        if error is None:
+            done.setdefault(t.claim, []).append(t.pk)
+            continue
+        t.attempts += 1
+        t.last_error = ''.join(traceback.format_exception(error))[-4000:]
+        if t.attempts >= t.max_attempts:
+            t.status = Task.FAILED
+            t.finished_at = now
+            logger.error('task %s failed permanently: %r', t, error)
+        else:
+            t.status = Task.QUEUED
+            t.run_after = now + timedelta(seconds=RETRY_BASE_DELAY * 2 ** (t.attempts - 1))
+            logger.warning('task %s failed, retrying at %s: %r', t, t.run_after, error)
+        updated = Task.objects.filter(pk=t.pk, claim=t.claim, status=Task.RUNNING).update(
+            attempts=t.attempts, last_error=t.last_error, status=t.status, run_after=t.run_after,
+            finished_at=t.finished_at, claim='',
+        )
+        if not updated:
+            logger.warning('task %s lost its claim before it failed; result dropped', t)
+    for claim_id, pks in done.items():
+        updated = Task.objects.filter(pk__in=pks, claim=claim_id, status=Task.RUNNING).update(
+            status=Task.DONE, finished_at=now, claim='',
+        )
+        if updated < len(pks):
+            logger.warning('%d tasks lost their claim before they finished; results dropped', len(pks) - updated)
+
+
+def heartbeat():
+    """
+    Renew the claim of the tasks the calling handler runs, at most every
+    HEARTBEAT_INTERVAL seconds, so a handler that outlives the lease is not
+    taken for a dead one. Raises LeaseLost if another worker took them over.
+    """
+    tasks = getattr(_running, 'tasks', None)
+    if not tasks or time.monotonic() - _running.renewed < HEARTBEAT_INTERVAL:
+        return
+    held = Task.objects.filter(pk__in=[t.pk for t in tasks], claim=tasks[0].claim, status=Task.RUNNING).update(
+        claimed_at=timezone.now(),
+    )
+    if held < len(tasks):
+        raise LeaseLost('%d of %d tasks were claimed by another worker' % (len(tasks) - held, len(tasks)))
+    _running.renewed = time.monotonic()
+
+
+def run_group(name, tasks):
+    handler = registry.get(name)
+    _running.tasks, _running.renewed = tasks, time.monotonic()
+    try:
+        if handler is None:
+            raise LookupError('Unknown task: %s' % name)
+        results = handler([t.payload for t in tasks])
+    except Exception as exc:
+        results = [exc] * len(tasks)
+    finally:
+        _running.tasks = None
+    _finish(tasks, results)
+    return len(tasks)
+
+
+def run_batch(tasks, executor=None, concurrency=1):
+    """
+    Run claimed tasks grouped by name. Each group is split into up to
+    `concurrency` chunks, which run on the executor's threads.
+    """
+    groups = {}
+    for t in tasks:
+        groups.setdefault(t.name, []).append(t)
+    chunks = []
+    for name, group in groups.items():
+        size = -(-len(group) // max(1, concurrency))
+        chunks.extend((name, group[i:i + size]) for i in range(0, len(group), size))
+    if executor is None:
+        return sum(run_group(name, chunk) for name, chunk in chunks)
+    return sum(executor.map(lambda chunk: run_group(*chunk), chunks))
+
+
+class Worker:
+    def __init__(self, concurrency=4, batch_size=50, lease=None):
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.lease = lease or getattr(settings, 'TASK_LEASE', DEFAULT_LEASE)
+
+    def run_once(self, executor=None, names=None, exclude=()):
+        """Claim and run one batch; returns the number of tasks run."""
+        tasks = claim(self.batch_size, self.lease, names, exclude)
+        if not tasks:
+            return 0
+        return run_batch(tasks, executor, self.concurrency if executor else 1)
+
+    def run(self, poll_interval=1.0, drain=False):
+        """
+        Process batches until the queue is empty (drain) or forever; returns
+        the number of tasks run. Long-running tasks run one at a time on a
+        thread of their own, so the batches go on while they do.
+        """
+        total = 0
+        running = None
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='task') as executor, \
+                ThreadPoolExecutor(max_workers=1, thread_name_prefix='task-long') as long_executor:
+            while True:
+                if running is not None and running.done():
+                    total += running.result()
+                    running = None
+                if running is None and long_tasks:
+                    tasks = claim(1, self.lease, names=long_tasks)
+                    if tasks:
+                        running = long_executor.submit(run_batch, tasks)
+                count = self.run_once(executor, exclude=long_tasks)
+                total += count
+                if count:
+                    continue
+                if drain and running is None:
+                    return total
+                close_old_connections()
+                time.sleep(poll_interval)
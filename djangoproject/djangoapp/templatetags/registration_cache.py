@@ -0,0 +1,11 @@
+from django import template
+
+from ..caching import render_form_fragment
+
+register = template.Library()
+
+
+@register.simple_tag
+def form_fragment(form):
+    """Render form.as_p, reusing the cached HTML for unbound forms."""
+    return render_form_fragment(form)
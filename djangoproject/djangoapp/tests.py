@@ -1,3 +1,643 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core import mail
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.db.utils import ConnectionHandler
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import caching, perf, tasks, throttling
+from .bulk import bulk_register, hash_password, read_rows
+from .forms import UserRegistrationForm
+from .middleware import PerfMiddleware
+from .models import Task, UserIdentity
+from .uniqueness import BloomFilter, find_taken, identity_index
+
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, REGISTRATION_THROTTLE_ENABLED=False)
+class BulkRegistrationTests(TestCase):
+    csv_data = (
+        'username,first_name,email,password\n'
+        'alice,Alice,alice@example.com,s3cret-pass\n'
+        'bob,Bob,bob@example.com,an0ther-pass\n'
+        'alice,Dup,dup@example.com,whatever-pass\n'
+        ',NoName,noname@example.com,whatever-pass\n'
+    )
+
+    def test_csv_rows_are_validated_and_created(self):
+        report = bulk_register(read_rows(io.StringIO(self.csv_data), 'csv'), batch_size=2, workers=1)
+        self.assertEqual(report.rows, 4)
+        self.assertEqual(report.created, 2)
+        self.assertEqual([e['line'] for e in report.errors], [4, 5])
+        alice = User.objects.get(username='alice')
+        self.assertTrue(alice.check_password('s3cret-pass'))
+
+    def test_existing_username_is_rejected(self):
+        User.objects.create_user('bob')
+        report = bulk_register(read_rows(io.StringIO(self.csv_data), 'csv'), workers=1)
+        self.assertEqual(report.created, 1)
+        self.assertIn('username', report.errors[0]['errors'])
+
+    def test_rows_that_lose_a_race_get_the_form_errors(self):
+        def racing_hash(raw_password):
+            if not User.objects.filter(username='ALICE').exists():
+                User.objects.create_user('ALICE')
+            return hash_password(raw_password)
+
+        with mock.patch('djangoapp.bulk.hash_password', racing_hash):
+            report = bulk_register(read_rows(io.StringIO(self.csv_data), 'csv'), workers=1)
+        self.assertEqual(report.created, 1)
+        errors = {error['line']: error['errors'] for error in report.errors}
+        self.assertEqual(errors[2], {'username': [{'message': 'A user with that username already exists.', 'code': 'unique'}]})
+        self.assertTrue(User.objects.filter(username='bob').exists())
+
+    def test_jsonl_with_process_pool(self):
+        lines = [json.dumps({'username': 'user%d' % i, 'password': 'pw-%d' % i}) for i in range(20)]
+        lines.append('{not json')
+        report = bulk_register(read_rows(io.StringIO('\n'.join(lines)), 'jsonl'), batch_size=8, workers=2)
+        self.assertEqual(report.created, 20)
+        self.assertEqual(report.errors[0]['line'], 21)
+        self.assertTrue(User.objects.get(username='user7').check_password('pw-7'))
+
+    def test_jsonl_lines_that_are_not_objects_are_row_errors(self):
+        lines = ['{"username": "ann", "password": "pw-1"}', '123', '[1]', '"abc"', 'null',
+                 '{"username": "ben", "password": "pw-2"}']
+        report = bulk_register(read_rows(io.StringIO('\n'.join(lines)), 'jsonl'), workers=1)
+        self.assertEqual(report.created, 2)
+        self.assertEqual([e['line'] for e in report.errors], [2, 3, 4, 5])
+        self.assertEqual(report.errors[0]['errors']['__all__'][0]['message'], 'expected a JSON object')
+
+    def test_management_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write(self.csv_data)
+        self.addCleanup(os.unlink, f.name)
+        out = io.StringIO()
+        call_command('bulk_register', f.name, '--workers', '1', stdout=out, stderr=io.StringIO())
+        self.assertIn('Created 2 of 4 users', out.getvalue())
+
+    def test_endpoint_requires_staff(self):
+        response = self.client.post(reverse('bulk_register'), self.csv_data, content_type='text/csv')
+        self.assertEqual(response.status_code, 302)
+
+    def test_endpoint(self):
+        staff = User.objects.create_user('admin', password='pw', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.post(reverse('bulk_register'), self.csv_data, content_type='text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['created'], 2)
+        self.assertEqual(response.json()['failed'], 2)
+
+    @override_settings(BULK_REGISTER_WORKERS=2)
+    def test_endpoint_hashes_on_the_pool(self):
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        with mock.patch('djangoapp.bulk.ProcessPoolExecutor', wraps=ProcessPoolExecutor) as pool:
+            response = self.client.post(reverse('bulk_register'), self.csv_data, content_type='text/csv')
+        self.assertEqual(response.json()['created'], 2)
+        self.assertEqual(pool.call_args.kwargs['max_workers'], 2)
+
+    def test_created_users_get_followup_tasks(self):
+        bulk_register(read_rows(io.StringIO(self.csv_data), 'csv'), workers=1)
+        alice = User.objects.get(username='alice')
+        self.assertEqual(
+            sorted(Task.objects.filter(payload__user_id=alice.pk).values_list('name', flat=True)),
+            ['audit_registration', 'welcome_email'],
+        )
+        self.assertEqual(Task.objects.filter(name='welcome_email').count(), 2)
+
+    @override_settings(BULK_REGISTER_INLINE_ROWS=3, BULK_REGISTER_WORKERS=1)
+    def test_large_upload_is_queued(self):
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        upload = io.BytesIO(self.csv_data.encode())
+        upload.name = 'users.csv'
+        response = self.client.post(reverse('bulk_register'), {'file': upload})
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(User.objects.filter(username='alice').exists())
+        path = Task.objects.get(pk=response.json()['task']).payload['path']
+        with self.assertLogs('djangoapp.tasks', 'INFO') as logs:
+            self.assertEqual(tasks.Worker().run_once(), 1)
+        self.assertIn('created 2 of 4 users, 2 failed', logs.output[0])
+        self.assertTrue(User.objects.get(username='alice').check_password('s3cret-pass'))
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(Task.objects.get(name='bulk_register').status, Task.DONE)
+        self.assertEqual(Task.objects.filter(name='welcome_email', status=Task.QUEUED).count(), 2)
+
+    @override_settings(BULK_REGISTER_INLINE_ROWS=3, BULK_REGISTER_WORKERS=1)
+    def test_queued_import_outlives_its_lease(self):
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        self.client.post(reverse('bulk_register'), self.csv_data, content_type='text/csv')
+        taken = []
+
+        def slow_hash(raw_password):
+            # Another worker polls, then a lease's worth of time goes by.
+            taken.extend(tasks.claim(10, names=['bulk_register']))
+            Task.objects.filter(status=Task.RUNNING).update(
+                claimed_at=timezone.now() - timedelta(seconds=2 * settings.TASK_LEASE),
+            )
+            return hash_password(raw_password)
+
+        # Batches leave it to the worker's long-running thread.
+        self.assertEqual(tasks.Worker().run_once(exclude=tasks.long_tasks), 0)
+        with mock.patch('djangoapp.bulk.hash_password', slow_hash), mock.patch.object(tasks, 'HEARTBEAT_INTERVAL', 0):
+            with self.assertLogs('djangoapp.tasks', 'INFO') as logs:
+                self.assertEqual(tasks.Worker().run_once(names=tasks.long_tasks), 1)
+        self.assertEqual(taken, [])
+        self.assertIn('created 2 of 4 users, 2 failed', logs.output[0])
+        self.assertEqual(Task.objects.get(name='bulk_register').status, Task.DONE)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, REGISTRATION_THROTTLE_ENABLED=False)
+class AsyncRegisterTests(TestCase):
+    data = {'username': 'carol', 'email': 'carol@example.com', 'password': 'pw-123456', 'password2': 'pw-123456'}
+
+    async def test_get_renders_form(self):
+        response = await self.async_client.get(reverse('register_async'))
+        self.assertContains(response, 'name="username"')
+
+    async def test_post_creates_user(self):
+        response = await self.async_client.post(reverse('register_async'), self.data)
+        self.assertContains(response, 'Welcome, carol!')
+        user = await User.objects.aget(username='carol')
+        self.assertTrue(user.check_password('pw-123456'))
+
+    async def test_cache_is_not_used_on_the_event_loop(self):
+        on_loop = []
+        cache_class = type(caching.get_cache())
+        get, set_ = cache_class.get, cache_class.set
+
+        def watch(method):
+            def wrapper(*args, **kwargs):
+                try:
+                    asyncio.get_running_loop()
+                    on_loop.append(method.__name__)
+                except RuntimeError:
+                    pass
+                return method(*args, **kwargs)
+            return wrapper
+
+        caching.get_cache().clear()
+        with mock.patch.object(cache_class, 'get', watch(get)), mock.patch.object(cache_class, 'set', watch(set_)), \
+                self.settings(REGISTRATION_THROTTLE_ENABLED=True, REGISTRATION_THROTTLE_STORE='cache'):
+            await self.async_client.get(reverse('register_async'))
+            await self.async_client.get(reverse('register_async'))
+            await self.async_client.post(reverse('register_async'), self.data)
+        self.assertEqual(on_loop, [])
+
+    async def test_duplicate_username_is_rejected(self):
+        await User.objects.acreate(username='carol')
+        response = await self.async_client.post(reverse('register_async'), self.data)
+        self.assertContains(response, 'A user with that username already exists.')
+        self.assertEqual(await User.objects.filter(username='carol').acount(), 1)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, REGISTRATION_THROTTLE_ENABLED=False)
+class UniquenessTests(TestCase):
+    def setUp(self):
+        identity_index.reset()
+        User.objects.create_user('Dave', email='Dave@Example.com')
+
+    def form(self, **data):
+        data = {'username': 'erin', 'email': 'erin@example.com', 'password': 'pw', 'password2': 'pw', **data}
+        return UserRegistrationForm(data)
+
+    def test_identity_row_follows_user(self):
+        user = User.objects.get(username='Dave')
+        self.assertEqual((user.identity.username, user.identity.email), ('dave', 'dave@example.com'))
+        user.email = ''
+        user.save()
+        self.assertIsNone(UserIdentity.objects.get(user=user).email)
+
+    def test_case_insensitive_username_and_email(self):
+        form = self.form(username='DAVE', email='dave@EXAMPLE.com')
+        self.assertFalse(form.is_valid())
+        self.assertEqual(set(form.errors), {'username', 'email'})
+        self.assertTrue(self.form().is_valid())
+
+    def test_free_names_skip_the_database(self):
+        identity_index.ensure_loaded()
+        with self.assertNumQueries(0):
+            self.assertEqual(find_taken('somebody-new', 'new@example.com'), [])
+        with self.assertNumQueries(1):
+            self.assertEqual(find_taken('dave', None), ['username'])
+
+    def test_race_is_resolved_by_the_constraint(self):
+        form = self.form()
+        self.assertTrue(form.is_valid())
+        User.objects.create_user('ERIN')
+        user = form.save(commit=False)
+        user.set_password('pw')
+        self.assertFalse(form.save_user(user))
+        self.assertIn('username', form.errors)
+        self.assertEqual(User.objects.filter(username__iexact='erin').count(), 1)
+
+    def test_duplicate_is_refused_before_the_user_row_is_written(self):
+        with self.assertRaises(IntegrityError):
+            User.objects.create_user('DAVE')
+        with self.assertRaises(IntegrityError):
+            User.objects.create_user('zoe', email='dave@example.COM')
+        self.assertEqual(list(User.objects.values_list('username', flat=True)), ['Dave'])
+        user = User.objects.create_user('zoe')
+        user.username = 'dAvE'
+        with self.assertRaises(IntegrityError):
+            user.save()
+        self.assertEqual(UserIdentity.objects.get(user=user).username, 'zoe')
+
+    def legacy_duplicate(self):
+        # Saved past the signals, as users from before UserIdentity were.
+        User.objects.bulk_create([User(username='dave', email='other@example.com')])
+        return User.objects.get(username='dave')
+
+    def test_legacy_duplicate_saves_when_its_identity_is_kept(self):
+        user = self.legacy_duplicate()
+        user.first_name = 'Legacy'
+        user.save()
+        user.email = 'OTHER@example.com'
+        user.save()
+        self.assertFalse(UserIdentity.objects.filter(user=user).exists())
+        user.username = 'DAVE'
+        user.save()
+        user.email = 'dave@example.com'
+        with self.assertRaises(IntegrityError):
+            user.save()
+
+    def test_admin_reports_identity_conflicts_as_form_errors(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        user = self.legacy_duplicate()
+        self.client.force_login(admin)
+        url = reverse('admin:auth_user_change', args=[user.pk])
+        data = {
+            'username': 'dave', 'email': 'other@example.com', 'first_name': 'Legacy', 'last_name': '',
+            'is_active': 'on', 'date_joined_0': '2024-01-01', 'date_joined_1': '00:00:00',
+        }
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(User.objects.get(pk=user.pk).first_name, 'Legacy')
+        response = self.client.post(url, {**data, 'email': 'dave@EXAMPLE.com'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['adminform'].form.errors.as_data()['email'][0].code, 'unique')
+
+    def test_backfill_reports_case_duplicates(self):
+        migration = importlib.import_module('djangoapp.migrations.0001_initial')
+        User.objects.bulk_create([User(username='dave'), User(username='Other', email='DAVE@example.com')])
+        UserIdentity.objects.all().delete()
+        with self.assertRaises(RuntimeError) as raised:
+            migration.backfill_identities(django_apps, None)
+        message = str(raised.exception)
+        self.assertIn('2 users collide', message)
+        self.assertIn("username 'dave' also belongs to user", message)
+        self.assertIn("email 'dave@example.com' also belongs to user", message)
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.01)
+        values = ['user%d' % i for i in range(1000)]
+        for value in values:
+            bloom.add(value)
+        self.assertTrue(all(bloom.might_contain(v) for v in values))
+        false_positives = sum(bloom.might_contain('other%d' % i) for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, REGISTRATION_THROTTLE_ENABLED=False)
+class IdentityRaceTests(TransactionTestCase):
+    def test_user_committed_outside_a_transaction_is_removed_when_it_loses(self):
+        identity_index.reset()
+        User.objects.create_user('Dave')
+        # A racing registration that check_user_identity could not see yet.
+        with mock.patch('djangoapp.signals.find_taken', return_value=[]):
+            with self.assertRaises(IntegrityError):
+                User.objects.create_user('DAVE')
+        self.assertEqual(list(User.objects.values_list('username', flat=True)), ['Dave'])
+        self.assertEqual(UserIdentity.objects.count(), 1)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, REGISTRATION_THROTTLE_ENABLED=False)
+class PageCacheTests(TestCase):
+    def setUp(self):
+        caching.get_cache().clear()
+        caching.stats.reset()
+
+    def test_unbound_page_is_cached(self):
+        first = self.client.get(reverse('register'))
+        second = self.client.get(reverse('register'))
+        self.assertEqual(first.status_code, 200)
+        self.assertContains(second, 'name="password2"')
+        self.assertNotContains(second, caching.CSRF_PLACEHOLDER)
+        self.assertEqual(caching.stats.snapshot()['page'], {'hits': 1, 'misses': 1})
+
+    def test_each_response_carries_a_usable_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.get(reverse('register'))
+        response = client.get(reverse('register'))
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', response.content.decode()).group(1)
+        data = {'username': 'frank', 'password': 'pw', 'password2': 'pw', 'csrfmiddlewaretoken': token}
+        response = client.post(reverse('register'), data)
+        self.assertContains(response, 'Welcome, frank!')
+
+    def test_version_and_template_changes_miss_the_cache(self):
+        self.client.get(reverse('register'))
+        with self.settings(REGISTRATION_CACHE_VERSION='next'):
+            self.client.get(reverse('register'))
+        self.assertEqual(caching.stats.snapshot()['page'], {'hits': 0, 'misses': 2})
+        stamp = caching.template_stamp()
+        template = os.path.join(os.path.dirname(__file__), 'templates', 'registration', 'register.html')
+        stat = os.stat(template)
+        self.addCleanup(os.utime, template, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.addCleanup(caching.template_stamp.cache_clear)
+        os.utime(template, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        caching.template_stamp.cache_clear()
+        self.assertNotEqual(caching.template_stamp(), stamp)
+        self.client.get(reverse('register'))
+        self.assertEqual(caching.stats.snapshot()['page'], {'hits': 0, 'misses': 3})
+
+    def test_bound_form_is_not_cached(self):
+        response = self.client.post(reverse('register'), {'username': '', 'password': 'a', 'password2': 'b'})
+        self.assertContains(response, "Passwords don&#x27;t match.")
+        self.assertNotIn('form', caching.stats.snapshot())
+
+
+class DatabaseProfileTests(SimpleTestCase):
+    def test_sqlite_wal_profile_applies_its_pragmas(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        profile = dict(settings.DATABASE_PROFILES['sqlite-wal'], NAME=os.path.join(directory.name, 'wal.sqlite3'))
+        connection = ConnectionHandler({'default': {}, 'wal': profile})['wal']
+        self.addCleanup(connection.close)
+        with connection.cursor() as cursor:
+            pragmas = {}
+            for name in ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'temp_store'):
+                cursor.execute('PRAGMA %s' % name)
+                pragmas[name] = cursor.fetchone()[0]
+        # synchronous 1 is NORMAL, temp_store 2 is MEMORY; busy_timeout comes from 'timeout'.
+        self.assertEqual(pragmas, {
+            'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 20000,
+            'cache_size': -20000, 'temp_store': 2,
+        })
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, REGISTRATION_THROTTLE_ENABLED=False)
+class PerfTests(TestCase):
+    data = {'username': 'gina', 'password': 'pw', 'password2': 'pw'}
+
+    def setUp(self):
+        perf.collector.reset()
+
+    def server_timing(self, response):
+        return dict(
+            (part.split(';')[0].strip(), part) for part in response['Server-Timing'].split(',')
+        )
+
+    @override_settings(PERF_SERVER_TIMING=True)
+    def test_server_timing_header(self):
+        response = self.client.post(reverse('register'), self.data)
+        timing = self.server_timing(response)
+        self.assertEqual(set(timing), {'total', 'db', 'tpl', 'hash'})
+        self.assertNotIn('desc="0 queries"', timing['db'])
+
+    @override_settings(PERF_SERVER_TIMING='staff')
+    def test_server_timing_is_for_staff_only(self):
+        response = self.client.post(reverse('register'), self.data)
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.client.force_login(User.objects.create_user('ops', is_staff=True))
+        self.assertTrue(self.client.get(reverse('perf_stats')).has_header('Server-Timing'))
+
+    @override_settings(PERF_SERVER_TIMING='staff')
+    def test_server_timing_does_not_load_the_user(self):
+        self.client.force_login(User.objects.create_user('ops', is_staff=True))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('register'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(PERF_SERVER_TIMING='staff')
+    async def test_async_server_timing_is_for_staff_only(self):
+        response = await self.async_client.post(reverse('register_async'), self.data)
+        self.assertFalse(response.has_header('Server-Timing'))
+        staff = await User.objects.acreate(username='ops', is_staff=True)
+        middleware = PerfMiddleware(lambda request: None)
+        request = RequestFactory().get('/')
+        request._acached_user = staff
+        self.assertTrue(middleware.server_timing_for(request))
+        request._acached_user = AnonymousUser()
+        self.assertFalse(middleware.server_timing_for(request))
+
+    def test_server_timing_defaults_to_debug(self):
+        with self.settings(DEBUG=False):
+            del settings.PERF_SERVER_TIMING
+            self.assertFalse(self.client.get(reverse('register')).has_header('Server-Timing'))
+
+    def test_sampling_off(self):
+        with self.settings(PERF_SAMPLE_RATE=0):
+            response = self.client.get(reverse('register'))
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertEqual(perf.collector.snapshot(), {})
+
+    async def test_async_view_queries_are_counted(self):
+        await self.async_client.post(reverse('register_async'), self.data)
+        stats = perf.collector.snapshot()['register_async']
+        self.assertGreater(stats['metrics']['queries']['p50'], 0)
+        self.assertGreater(stats['metrics']['hash']['p50'], 0)
+
+    def test_stats_endpoint(self):
+        self.client.get(reverse('register'))
+        self.client.force_login(User.objects.create_user('ops', is_staff=True))
+        stats = self.client.get(reverse('perf_stats')).json()
+        self.assertEqual((stats['pid'], stats['scope']), (os.getpid(), 'process'))
+        views = stats['views']
+        self.assertEqual(views['register']['count'], 1)
+        self.assertEqual(set(views['register']['metrics']['total']), {'p50', 'p95', 'p99'})
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, REGISTRATION_THROTTLE_ENABLED=False)
+class TaskQueueTests(TestCase):
+    data = {'username': 'hank', 'email': 'hank@example.com', 'password': 'pw', 'password2': 'pw'}
+
+    def test_register_queues_followups_without_sending(self):
+        self.client.post(reverse('register'), self.data)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(sorted(Task.objects.values_list('name', flat=True)), ['audit_registration', 'welcome_email'])
+        with self.assertLogs('djangoapp.audit', 'INFO'):
+            self.assertEqual(tasks.Worker().run_once(), 2)
+        self.assertEqual(mail.outbox[0].to, ['hank@example.com'])
+        self.assertFalse(Task.objects.exclude(status=Task.DONE).exists())
+
+    def test_rejected_registration_queues_nothing(self):
+        User.objects.create_user('HANK')
+        self.client.post(reverse('register'), self.data)
+        self.assertFalse(Task.objects.exists())
+
+    def test_failures_are_retried_then_given_up(self):
+        calls = []
+
+        @tasks.task('flaky')
+        def flaky(payload):
+            calls.append(payload)
+            raise RuntimeError('smtp down')
+
+        self.addCleanup(tasks.registry.pop, 'flaky')
+        t = tasks.enqueue('flaky', {'n': 1}, max_attempts=2)
+        with self.assertLogs('djangoapp.tasks', 'WARNING'):
+            tasks.Worker().run_once()
+        t.refresh_from_db()
+        self.assertEqual((t.status, t.attempts), (Task.QUEUED, 1))
+        self.assertEqual(tasks.Worker().run_once(), 0)  # backing off
+        Task.objects.update(run_after=t.created_at)
+        with self.assertLogs('djangoapp.tasks', 'ERROR'):
+            tasks.Worker().run_once()
+        t.refresh_from_db()
+        self.assertEqual((t.status, len(calls)), (Task.FAILED, 2))
+        self.assertIn('smtp down', t.last_error)
+
+    def test_expired_claims_are_reclaimed(self):
+        tasks.enqueue('audit_registration', {'user_id': 1, 'username': 'x'})
+        self.assertEqual(len(tasks.claim(10)), 1)
+        self.assertEqual(tasks.claim(10), [])
+        with self.assertLogs('djangoapp.audit', 'INFO'):
+            self.assertEqual(tasks.Worker(lease=-1).run_once(), 1)
+
+    def test_expired_claims_use_up_attempts(self):
+        t = tasks.enqueue('audit_registration', {'user_id': 1, 'username': 'x'}, max_attempts=2)
+        tasks.claim(10)
+        self.assertEqual([r.attempts for r in tasks.claim(10, lease=-1)], [1])
+        with self.assertLogs('djangoapp.tasks', 'ERROR'):
+            self.assertEqual(tasks.claim(10, lease=-1), [])
+        t.refresh_from_db()
+        self.assertEqual((t.status, t.attempts, t.claim), (Task.FAILED, 2, ''))
+
+    def test_results_of_a_lost_claim_are_dropped(self):
+        tasks.enqueue('audit_registration', {'user_id': 1, 'username': 'x'})
+        stale = tasks.claim(10)
+        fresh = tasks.claim(10, lease=-1)
+        with self.assertLogs('djangoapp.tasks', 'WARNING'):
+            tasks._finish(stale, [RuntimeError('too late')])
+            tasks._finish(stale, [None])
+        t = Task.objects.get()
+        self.assertEqual((t.status, t.claim, t.last_error), (Task.RUNNING, fresh[0].claim, ''))
+        tasks._finish(fresh, [None])
+        t.refresh_from_db()
+        self.assertEqual(t.status, Task.DONE)
+
+    def test_run_gives_long_running_tasks_their_own_thread(self):
+        queue = {'bulk_register': [Task(pk=1, name='bulk_register')], 'audit_registration': [Task(pk=2, name='audit_registration')]}
+        threads = {}
+
+        def claim(batch_size, lease, names=None, exclude=()):
+            claimed = []
+            for name in list(queue):
+                if (names is None or name in names) and name not in exclude:
+                    claimed += queue.pop(name)
+            return claimed
+
+        def run_batch(batch, executor=None, concurrency=1):
+            threads[batch[0].name] = threading.current_thread().name
+            return len(batch)
+
+        with mock.patch.object(tasks, 'claim', claim), mock.patch.object(tasks, 'run_batch', run_batch):
+            self.assertEqual(tasks.Worker().run(poll_interval=0, drain=True), 2)
+        self.assertTrue(threads['bulk_register'].startswith('task-long'))
+        self.assertEqual(threads['audit_registration'], threading.current_thread().name)
+
+    def test_heartbeat_raises_once_the_claim_is_lost(self):
+        beats = []
+
+        @tasks.task('long_job', long_running=True)
+        def long_job(payload):
+            tasks.heartbeat()
+            beats.append(Task.objects.get().claimed_at)
+            tasks.claim(10, lease=-1)
+            tasks.heartbeat()
+
+        self.addCleanup(tasks.registry.pop, 'long_job')
+        self.addCleanup(tasks.long_tasks.discard, 'long_job')
+        tasks.enqueue('long_job')
+        with mock.patch.object(tasks, 'HEARTBEAT_INTERVAL', 0), self.assertLogs('djangoapp.tasks', 'WARNING') as logs:
+            self.assertEqual(tasks.Worker().run_once(names=['long_job']), 1)
+        self.assertEqual(len(beats), 1)
+        self.assertIn('lost its claim', logs.output[-1])
+        self.assertEqual(Task.objects.get().attempts, 1)
+
+
+@override_settings(
+    PASSWORD_HASHERS=FAST_HASHERS,
+    REGISTRATION_THROTTLE_ENABLED=True,
+    REGISTRATION_THROTTLE_RATES={'ip': (1, 2), 'global': (1, 3)},
+)
+class ThrottleTests(TestCase):
+    def setUp(self):
+        throttling._local_store.clear()
+
+    def post(self, ip, n, url='register'):
+        return self.client.post(reverse(url), {'username': 'ivy%d' % n, 'password': 'pw', 'password2': 'pw'}, REMOTE_ADDR=ip)
+
+    def test_per_ip_bucket(self):
+        self.assertEqual(self.post('10.0.0.1', 1).status_code, 200)
+        self.assertEqual(self.post('10.0.0.1', 2).status_code, 200)
+        response = self.post('10.0.0.1', 3)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(User.objects.filter(username='ivy3').exists())
+
+    def test_global_bucket(self):
+        statuses = [self.post('10.0.1.%d' % n, n).status_code for n in range(4)]
+        self.assertEqual(statuses, [200, 200, 200, 429])
+
+    def test_get_is_not_throttled(self):
+        for n in range(5):
+            self.assertEqual(self.client.get(reverse('register'), REMOTE_ADDR='10.0.0.1').status_code, 200)
+
+    async def test_async_view(self):
+        for n in range(2):
+            await self.async_client.post(reverse('register_async'), {}, REMOTE_ADDR='10.0.0.9')
+        response = await self.async_client.post(reverse('register_async'), {}, REMOTE_ADDR='10.0.0.9')
+        self.assertEqual(response.status_code, 429)
+
+    def test_bucket_refills(self):
+        store = throttling.LocalBucketStore()
+        self.assertEqual(store.take('k', 2, 1, now=0), 0)
+        self.assertAlmostEqual(store.take('k', 2, 1, now=0.25), 0.25)
+        self.assertEqual(store.take('k', 2, 1, now=0.5), 0)
+
+    def test_store_past_max_keys(self):
+        store = throttling.LocalBucketStore(max_keys=4)
+        store.take('global', 20, 40, now=0)
+        store.take('ip:slow', 1 / 60, 5, now=0)
+        store.take('ip:a', 1, 1, now=0)
+        store.take('ip:b', 1, 1, now=0.5)
+        # Each bucket is judged at its own rate: 'global' and 'ip:a' have
+        # refilled by now, 'ip:slow' and 'ip:b' have not.
+        store.take('ip:c', 1, 1, now=1)
+        self.assertEqual(list(store._buckets), ['ip:slow', 'ip:b', 'ip:c'])
+        store.take('ip:d', 1, 1, now=1.1)
+        self.assertGreater(store.take('ip:b', 1, 1, now=1.2), 0)
+        # None has refilled: the least recently used go, down to max_keys / 2.
+        store.take('ip:e', 1, 1, now=1.3)
+        self.assertEqual(list(store._buckets), ['ip:d', 'ip:b', 'ip:e'])
+        self.assertGreater(store.take('ip:b', 1, 1, now=1.3), 0)
+
+    def test_rejected_request_keeps_no_ip_token(self):
+        with self.settings(REGISTRATION_THROTTLE_RATES={'ip': (1 / 60, 2), 'global': (1 / 60, 1)}):
+            self.assertEqual(self.post('10.0.2.1', 1).status_code, 200)
+            self.assertEqual(self.post('10.0.2.2', 2).status_code, 429)
+            self.assertEqual(self.post('10.0.2.2', 3).status_code, 429)
+        self.assertEqual(throttling._local_store._buckets['ip:10.0.2.2'][0], 2)
+
+    def test_cache_store(self):
+        with self.settings(REGISTRATION_THROTTLE_STORE='cache'):
+            caching.get_cache().clear()
+            self.post('10.0.0.2', 1)
+            self.post('10.0.0.2', 2)
+            self.assertEqual(self.post('10.0.0.2', 3).status_code, 429)
@@ -0,0 +1,205 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+DEFAULT_RATES = {
+    # (tokens added per second, bucket size)
+    'ip': (5 / 60, 5),
+    'global': (20, 40),
+}
+
+
+class LocalBucketStore:
+    """
+    Token buckets in this process's memory, shared by all its threads, in
+    least recently used order. A new key past max_keys prunes the store to
+    half of that, so pruning runs once per max_keys / 2 new keys: buckets
+    that have refilled go first, then the least recently used (whose
+    clients start again with a full bucket).
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # key -> (tokens, stamp, rate, capacity)
+
+    def take(self, key, rate, capacity, now):
+        with self._lock:
+            tokens, stamp = self._buckets.get(key, (capacity, now))[:2]
+            tokens = min(capacity, tokens + (now - stamp) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            if key in self._buckets:
+                self._buckets.move_to_end(key)
+            elif len(self._buckets) >= self.max_keys:
+                self._prune(now)
+            self._buckets[key] = (tokens, now, rate, capacity)
+            return wait
+
+    async def atake(self, key, rate, capacity, now):
+        # Only memory and a briefly held lock: safe on the event loop.
+        return self.take(key, rate, capacity, now)
+
+    def give_back(self, key, rate, capacity):
+        """Return a token taken by a request that another bucket turned away."""
+        with self._lock:
+            if key in self._buckets:
+                tokens, stamp = self._buckets[key][:2]
+                self._buckets[key] = (min(capacity, tokens + 1), stamp, rate, capacity)
+
+    async def agive_back(self, key, rate, capacity):
+        self.give_back(key, rate, capacity)
+
+    def _prune(self, now):
+        refilled = [
+            key for key, (tokens, stamp, rate, capacity) in self._buckets.items()
+            if tokens + (now - stamp) * rate >= capacity
+        ]
+        for key in refilled:
+            del self._buckets[key]
+        while len(self._buckets) > self.max_keys // 2:
+            self._buckets.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBucketStore:
+    """
+    Token buckets in a Django cache, so that every worker process sharing the
+    cache (e.g. Redis) shares the limits. The read-modify-write is not atomic;
+    under a race a few extra requests may get through, which is acceptable
+    for throttling.
+    """
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+
+    def _refill(self, state, rate, capacity, now):
+        """The bucket's new (tokens, stamp) and the wait, from its cached state."""
+        tokens, stamp = state or (capacity, now)
+        tokens = min(capacity, tokens + (now - stamp) * rate)
+        if tokens >= 1:
+            return (tokens - 1, now), 0.0
+        return (tokens, now), (1 - tokens) / rate
+
+    def take(self, key, rate, capacity, now):
+        cache = caches[self.alias]
+        cache_key = 'djangoapp:throttle:%s' % key
+        state, wait = self._refill(cache.get(cache_key), rate, capacity, now)
+        cache.set(cache_key, state, math.ceil(capacity / rate) + 1)
+        return wait
+
+    async def atake(self, key, rate, capacity, now):
+        cache = caches[self.alias]
+        cache_key = 'djangoapp:throttle:%s' % key
+        state, wait = self._refill(await cache.aget(cache_key), rate, capacity, now)
+        await cache.aset(cache_key, state, math.ceil(capacity / rate) + 1)
+        return wait
+
+    def give_back(self, key, rate, capacity):
+        cache = caches[self.alias]
+        cache_key = 'djangoapp:throttle:%s' % key
+        state = cache.get(cache_key)
+        if state is not None:
+            cache.set(cache_key, (min(capacity, state[0] + 1), state[1]), math.ceil(capacity / rate) + 1)
+
+    async def agive_back(self, key, rate, capacity):
+        cache = caches[self.alias]
+        cache_key = 'djangoapp:throttle:%s' % key
+        state = await cache.aget(cache_key)
+        if state is not None:
+            await cache.aset(cache_key, (min(capacity, state[0] + 1), state[1]), math.ceil(capacity / rate) + 1)
+
+
+_local_store = LocalBucketStore()
+
+
+def get_store():
+    if getattr(settings, 'REGISTRATION_THROTTLE_STORE', 'local') == 'cache':
+        return CacheBucketStore(getattr(settings, 'REGISTRATION_THROTTLE_CACHE', 'default'))
+    return _local_store
+
+
+def client_ip(request):
+    if getattr(settings, 'REGISTRATION_THROTTLE_TRUST_FORWARDED_FOR', False):
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _buckets(request):
+    rates = {**DEFAULT_RATES, **getattr(settings, 'REGISTRATION_THROTTLE_RATES', {})}
+    store = get_store()
+    now = time.monotonic() if store is _local_store else time.time()
+    buckets = [(key, rate) for key, rate in (('ip:' + client_ip(request), rates['ip']), ('global', rates['global']))
+               if rate is not None]
+    return store, now, buckets
+
+
+def check(request):
+    """
+    Take a token from the client's and the global bucket; return the seconds
+    to wait, or 0. A request turned away keeps none of its tokens, so a
+    spike on the global limit does not use up the clients' own.
+    """
+    store, now, buckets = _buckets(request)
+    for n, (key, rate) in enumerate(buckets):
+        wait = store.take(key, rate[0], rate[1], now)
+        if wait:
+            for key, rate in buckets[:n]:
+                store.give_back(key, rate[0], rate[1])
+            return wait
+    return 0.0
+
+
+async def acheck(request):
+    """check() for async views, without blocking the event loop on the cache."""
+    store, now, buckets = _buckets(request)
+    for n, (key, rate) in enumerate(buckets):
+        wait = await store.atake(key, rate[0], rate[1], now)
+        if wait:
+            for key, rate in buckets[:n]:
+                await store.agive_back(key, rate[0], rate[1])
+            return wait
+    return 0.0
+
+
+def too_many_requests(wait):
+    response = HttpResponse('Too many registration attempts, try again later.', status=429, content_type='text/plain')
+    response['Retry-After'] = str(math.ceil(wait))
+    return response
+
+
+def throttle_registration(view):
+    """
+    Reject POSTs over the REGISTRATION_THROTTLE_RATES limits with 429 before
+    the view validates the form or hashes a password.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method == 'POST' and getattr(settings, 'REGISTRATION_THROTTLE_ENABLED', True):
+                wait = await acheck(request)
+                if wait:
+                    return too_many_requests(wait)
+            return await view(request, *args, **kwargs)
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method == 'POST' and getattr(settings, 'REGISTRATION_THROTTLE_ENABLED', True):
+                wait = check(request)
+                if wait:
+                    return too_many_requests(wait)
+            return view(request, *args, **kwargs)
+    return wrapper
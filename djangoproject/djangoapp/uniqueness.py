@@ -0,0 +1,155 @@
+import hashlib
+import math
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+
+from .models import UserIdentity
+
+DEFAULT_BLOOM_CAPACITY = 1000000
+DEFAULT_BLOOM_ERROR_RATE = 0.01
+
+
+def normalize_username(username):
+    return username.casefold()
+
+
+def normalize_email(email):
+    email = (email or '').strip()
+    return email.casefold() or None
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings. might_contain() never returns
+    False for a value that was added, so a negative answer is definitive.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for pos in self._positions(value):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def might_contain(self, value):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+
+class IdentityIndex:
+    """
+    Per-process prefilter in front of the UserIdentity table.
+
+    The filter is filled from the table on first use and updated as users are
+    saved in this process. Names registered by other processes since then are
+    missed, which is harmless: the unique indexes still reject the insert.
+    """
+
+    def __init__(self):
+        self._bloom = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        capacity = getattr(settings, 'REGISTRATION_BLOOM_CAPACITY', DEFAULT_BLOOM_CAPACITY)
+        error_rate = getattr(settings, 'REGISTRATION_BLOOM_ERROR_RATE', DEFAULT_BLOOM_ERROR_RATE)
+        bloom = BloomFilter(capacity, error_rate)
+        rows = UserIdentity.objects.values_list('username', 'email').iterator(chunk_size=10000)
+        for username, email in rows:
+            bloom.add('u:' + username)
+            if email:
+                bloom.add('e:' + email)
+        return bloom
+
+    def _get(self):
+        if self._bloom is None:
+            with self._lock:
+                if self._bloom is None:
+                    self._bloom = self._load()
+        return self._bloom
+
+    def add(self, username, email):
+        if self._bloom is None:
+            return
+        self._bloom.add('u:' + username)
+        if email:
+            self._bloom.add('e:' + email)
+
+    def reset(self):
+        with self._lock:
+            self._bloom = None
+
+    def candidates(self, username, email):
+        """Return the lookup filter for the values that may already be taken."""
+        bloom = self._get()
+        query = Q()
+        if username and bloom.might_contain('u:' + username):
+            query |= Q(username=username)
+        if email and bloom.might_contain('e:' + email):
+            query |= Q(email=email)
+        return query
+
+    @property
+    def loaded(self):
+        return self._bloom is not None
+
+    def ensure_loaded(self):
+        self._get()
+
+
+identity_index = IdentityIndex()
+
+
+def _taken(rows, username, email):
+    taken = []
+    for row_username, row_email in rows:
+        if username and row_username == username and 'username' not in taken:
+            taken.append('username')
+        if email and row_email == email and 'email' not in taken:
+            taken.append('email')
+    return taken
+
+
+def find_taken(username, email, use_bloom=True, exclude_user=None):
+    """
+    Return the names of the fields ('username', 'email') whose case-folded
+    value is already registered, to a user other than exclude_user (a pk).
+    Values the Bloom filter has never seen are free and cost no query.
+    """
+    username = normalize_username(username) if username else None
+    email = normalize_email(email)
+    if use_bloom:
+        query = identity_index.candidates(username, email)
+        if not query:
+            return []
+    else:
+        query = Q(username=username) | Q(email=email) if email else Q(username=username)
+    rows = UserIdentity.objects.filter(query)
+    if exclude_user is not None:
+        rows = rows.exclude(user_id=exclude_user)
+    return _taken(rows.values_list('username', 'email'), username, email)
+
+
+async def afind_taken(username, email):
+    username = normalize_username(username) if username else None
+    email = normalize_email(email)
+    if not identity_index.loaded:
+        await sync_to_async(identity_index.ensure_loaded)()
+    query = identity_index.candidates(username, email)
+    if not query:
+        return []
+    rows = [row async for row in UserIdentity.objects.filter(query).values_list('username', 'email')]
+    return _taken(rows, username, email)
+
+
+def identity_for(user):
+    return UserIdentity(user=user, username=normalize_username(user.username), email=normalize_email(user.email))
@@ -3,4 +3,7 @@ from . import views
 
 urlpatterns = [
     path('register/', views.register, name='register'),
+    path('register/async/', views.aregister, name='register_async'),
+    path('register/bulk/', views.bulk_register, name='bulk_register'),
+    path('internal/perf/', views.perf_stats, name='perf_stats'),
 ]
\ No newline at end of file
@@ -1,14 +1,89 @@
+import os
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render, redirect
-from .forms import UserRegistrationForm
+from django.views.decorators.http import require_POST
+from . import caching, perf
+from .bulk import DEFAULT_INLINE_ROWS, count_rows, register_file, spool
+from .forms import AsyncUserRegistrationForm, UserRegistrationForm
+from .hashing import amake_password
+from .tasks import enqueue
+from .throttling import throttle_registration
 
+@throttle_registration
 def register(request):
     if request.method == 'POST':
         form = UserRegistrationForm(request.POST)
         if form.is_valid():
             new_user = form.save(commit=False)
-            new_user.set_password(form.cleaned_data['password'])
-            new_user.save()
-            return render(request, 'registration/register_done.html', {'user': new_user})
+            with perf.timed('hash'):
+                new_user.set_password(form.cleaned_data['password'])
+            if form.save_user(new_user):
+                return render(request, 'registration/register_done.html', {'user': new_user})
+    else:
+        return HttpResponse(caching.render_unbound_page(request, 'registration/register.html', UserRegistrationForm()))
+    return render(request, 'registration/register.html', {'form': form})
+
+@throttle_registration
+async def aregister(request):
+    """The register flow for ASGI deployments, without a thread hop per request."""
+    if request.method == 'POST':
+        form = AsyncUserRegistrationForm(request.POST)
+        if form.is_valid() and await form.avalidate_unique():
+            new_user = form.save(commit=False)
+            new_user.password = await amake_password(form.cleaned_data['password'])
+            if await form.asave_user(new_user):
+                return render(request, 'registration/register_done.html', {'user': new_user})
     else:
-        form = UserRegistrationForm()
+        return HttpResponse(await caching.arender_unbound_page(request, 'registration/register.html', AsyncUserRegistrationForm()))
     return render(request, 'registration/register.html', {'form': form})
+
+@staff_member_required
+@require_POST
+def bulk_register(request):
+    """
+    Import users from an uploaded "file" (multipart) or from the raw request
+    body. The format is taken from ?format=, the upload name or the content type.
+
+    The upload is spooled to disk. Up to BULK_REGISTER_INLINE_ROWS rows are
+    imported while the request waits, hashed on the process pool; anything
+    larger is imported by the run_tasks worker (202, with the task id).
+    """
+    upload = request.FILES.get('file')
+    if upload is not None:
+        name, source = upload.name, upload
+    else:
+        name, source = '', request
+    fmt = request.GET.get('format')
+    if fmt is None:
+        jsonl = name.endswith(('.jsonl', '.ndjson')) or request.content_type in ('application/jsonl', 'application/x-ndjson')
+        fmt = 'jsonl' if jsonl else 'csv'
+    if fmt not in ('csv', 'jsonl'):
+        return JsonResponse({'error': 'Unknown format: %s' % fmt}, status=400)
+    path = spool(source, fmt)
+    rows = count_rows(path, fmt, getattr(settings, 'BULK_REGISTER_INLINE_ROWS', DEFAULT_INLINE_ROWS))
+    if rows > getattr(settings, 'BULK_REGISTER_INLINE_ROWS', DEFAULT_INLINE_ROWS):
+        # Imported once, even if the worker dies part way.
+        task = enqueue('bulk_register', {'path': path, 'format': fmt, 'name': name}, max_attempts=1)
+        return JsonResponse({'task': task.pk, 'status': task.status}, status=202)
+    workers = getattr(settings, 'BULK_REGISTER_WORKERS', None) or os.cpu_count() or 1
+    try:
+        report = register_file(path, fmt, workers=min(workers, rows))
+    finally:
+        os.remove(path)
+    status = 400 if report.errors and not report.created else 200
+    return JsonResponse(report.as_dict(), status=status)
+
+@staff_member_required
+def perf_stats(request):
+    """
+    Rolling p50/p95/p99 per view (ms, queries as a count) and cache hit
+    rates. Each worker process keeps its own, so these describe only the
+    process (pid) that served this request.
+    """
+    return JsonResponse({
+        'pid': os.getpid(), 'scope': 'process',
+        'views': perf.collector.snapshot(), 'cache': caching.stats.snapshot(),
+    })
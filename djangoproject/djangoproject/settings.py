@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'djangoapp.middleware.PerfMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,7 +56,8 @@ ROOT_URLCONF = 'djangoproject.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # The stock backend, with render time reported by PerfMiddleware.
+        'BACKEND': 'djangoapp.template_backend.DjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -73,13 +76,134 @@ WSGI_APPLICATION = 'djangoproject.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# DJANGO_DB_PROFILE selects one of DATABASE_PROFILES:
+#   dev         plain SQLite, a new connection per request
+#   sqlite-wal  persistent connections, WAL journaling, busy timeout and
+#               IMMEDIATE transactions so concurrent writers queue instead
+#               of failing with "database is locked"
+#   postgres    PostgreSQL through a psycopg connection pool (needs
+#               psycopg[pool]); configured with the POSTGRES_* variables
+
+DATABASE_PROFILES = {
+    'dev': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+    },
+    'sqlite-wal': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Run on every new connection.
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA cache_size=-20000;'
+                'PRAGMA temp_store=MEMORY;'
+            ),
+            'transaction_mode': 'IMMEDIATE',
+            # Seconds a writer waits for the lock; sets SQLite's busy timeout,
+            # so the init_command must not set busy_timeout as well.
+            'timeout': 20,
+        },
+    },
+    'postgres': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('POSTGRES_DB', 'djangoproject'),
+        'USER': os.environ.get('POSTGRES_USER', 'postgres'),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': os.environ.get('POSTGRES_HOST', '127.0.0.1'),
+        'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        # The pool replaces persistent connections, so CONN_MAX_AGE stays 0.
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'pool': {
+                'min_size': int(os.environ.get('POSTGRES_POOL_MIN', 2)),
+                'max_size': int(os.environ.get('POSTGRES_POOL_MAX', 20)),
+                'timeout': 10,
+            },
+        },
+    },
+}
+
+DATABASES = {
+    'default': DATABASE_PROFILES[os.environ.get('DJANGO_DB_PROFILE', 'dev')],
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# DJANGO_CACHE selects the backend: locmem (default), file or redis.
+# DJANGO_CACHE_LOCATION overrides its location.
+
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'djangoapp'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / '.cache')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+_cache_backend, _cache_location = CACHE_BACKENDS[os.environ.get('DJANGO_CACHE', 'locmem')]
+
+CACHES = {
+    'default': {
+        'BACKEND': _cache_backend,
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', _cache_location),
     }
 }
 
+# Rendered registration pages and form fragments (djangoapp.caching).
+REGISTRATION_CACHE_ALIAS = 'default'
+REGISTRATION_CACHE_TIMEOUT = 3600
+# Part of every cache key, along with a stamp of the template files; change
+# it to drop all cached pages at once.
+REGISTRATION_CACHE_VERSION = ''
+
+
+# Request instrumentation (djangoapp.middleware.PerfMiddleware).
+# Fraction of requests timed, samples kept per view, and who gets a
+# Server-Timing header on sampled responses: everyone (True), staff users
+# ('staff') or nobody (False). The header exposes hashing and query times, a
+# side channel on public pages, so only DEBUG sends it to everyone.
+PERF_SAMPLE_RATE = 1.0
+PERF_WINDOW = 1000
+PERF_SERVER_TIMING = True if DEBUG else 'staff'
+
+
+# Registration throttling (djangoapp.throttling), checked before the form
+# is validated or a password hashed. Rates are (tokens per second, burst);
+# None disables a bucket. The 'local' store is per process, 'cache' shares
+# the buckets through REGISTRATION_THROTTLE_CACHE.
+REGISTRATION_THROTTLE_ENABLED = True
+REGISTRATION_THROTTLE_RATES = {
+    'ip': (5 / 60, 5),
+    'global': (20, 40),
+}
+REGISTRATION_THROTTLE_STORE = 'local'
+REGISTRATION_THROTTLE_CACHE = 'default'
+REGISTRATION_THROTTLE_TRUST_FORWARDED_FOR = False
+
+
+# Email
+# https://docs.djangoproject.com/en/5.2/topics/email/
+# Sent by the run_tasks worker, never inside a request.
+
+EMAIL_BACKEND = os.environ.get('DJANGO_EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = 'noreply@localhost'
+
+# Seconds after which a running task whose worker went away is run again.
+# Long-running tasks (bulk imports) renew their claim as they go.
+TASK_LEASE = 300
+
+# Bulk registration (djangoapp.bulk). Uploads to the bulk_register view are
+# spooled to BULK_REGISTER_SPOOL_DIR (None: the temp directory). Those of up
+# to BULK_REGISTER_INLINE_ROWS rows are imported during the request, larger
+# ones by run_tasks, with BULK_REGISTER_WORKERS hashing processes either way
+# (None: one per CPU). Each row costs a password hash, so keep the inline
+# budget to what a request can wait for.
+BULK_REGISTER_INLINE_ROWS = 25
+BULK_REGISTER_SPOOL_DIR = None
+BULK_REGISTER_WORKERS = None
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
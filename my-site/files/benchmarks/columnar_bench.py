@@ -0,0 +1,92 @@
+"""
+Benchmark reading an export cold against reopening its columnar cache.
+
+Scales the bundled pre-release export up to N rows (fresh User IDs and
+Session IDs per copy, so the high-cardinality columns stay that way),
+writes it as CSV and .xlsx, builds the
+columnar cache of each and times reading it as a match run would:
+
+  csv cold      csv.DictReader, then parse_literal() on the dict columns
+  xlsx cold     openpyxl, then parse_literal() on the dict columns
+  ingest        building the cache (once per export)
+  mmap reopen   ColumnarExport, dict columns already parsed
+
+for every column of the spec, and for just the join keys plus Request
+Payload.
+
+Usage: python benchmarks/columnar_bench.py [--rows N] [--xlsx-rows N]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+
+from common import scaled_rows, timed, write_csv
+from txmatch import columnar, rules
+from txmatch.engine import Matcher
+from txmatch.records import export_size, iter_rows
+from txmatch.spec import DEFAULT_SPEC, load_spec
+
+LITERAL_COLUMNS = ("Request Headers", "Request Payload", "Response Body")
+
+
+def write_xlsx(path, rows):
+    import openpyxl
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    for i, row in enumerate(rows):
+        if not i:
+            sheet.append(list(row))
+        sheet.append(list(row.values()))
+    workbook.save(path)
+
+
+def read(path, columns):
+    """Read like a match run: every value, with the dict columns parsed."""
+    rules.parse_literal.cache_clear()
+    literal = [column for column in columns if column in LITERAL_COLUMNS]
+    count = 0
+    for number, row in iter_rows(path, columns):
+        for column in literal:
+            rules.parse_literal(row[column])
+        count += 1
+    return count
+
+
+def bench(label, path, column_sets):
+    cache, ingest_time = timed(lambda: columnar.ingest(path, force=True))
+    print("%s: %.1f MB, cache %.1f MB, ingest %.3fs"
+          % (label, os.path.getsize(path) / 2**20, export_size(cache) / 2**20, ingest_time))
+    for name, columns in column_sets:
+        count, cold = timed(lambda: read(path, columns))
+        count, warm = timed(lambda: read(cache, columns))
+        print("  %-22s cold %8.3fs   mmap reopen %8.3fs   %6.1fx" % (name, cold, warm, cold / warm))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--xlsx-rows", type=int, default=20000)
+    args = parser.parse_args()
+
+    matcher = Matcher(load_spec(DEFAULT_SPEC))
+    column_sets = [
+        ("spec (%d columns)" % len(matcher.columns), matcher.columns),
+        ("keys + Request Payload", [*matcher.join_keys, "Request Payload"]),
+    ]
+    directory = tempfile.mkdtemp(prefix="txmatch-bench-")
+    try:
+        path = os.path.join(directory, "pre.csv")
+        write_csv(path, scaled_rows("splunk_log_data_pre.csv", args.rows))
+        bench("csv, %d rows" % args.rows, path, column_sets)
+        path = os.path.join(directory, "pre.xlsx")
+        write_xlsx(path, scaled_rows("splunk_log_data_pre.csv", args.xlsx_rows))
+        bench("xlsx, %d rows" % args.xlsx_rows, path, column_sets)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Helpers shared by the txmatch benchmarks."""
+
+import csv
+import os
+import sys
+import time
+import uuid
+
+FILES = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, FILES)
+
+from txmatch.records import iter_rows  # noqa: E402
+
+
+def scaled_rows(name, count):
+    """
+    The rows of a bundled export repeated up to `count`. Every copy gets its
+    own User IDs and Session IDs (also inside Request Payload), derived from
+    the originals, so pre and post copies still pair up.
+    """
+    source = [row for number, row in iter_rows(os.path.join(FILES, name))]
+    for i in range(count):
+        row = dict(source[i % len(source)])
+        copy = i // len(source)
+        if copy:
+            session = row["Session ID"]
+            row["Session ID"] = str(uuid.uuid5(uuid.NAMESPACE_OID, "%d:%s" % (copy, session)))
+            row["User ID"] = "%s_%d" % (row["User ID"], copy)
+            row["Request Payload"] = row["Request Payload"].replace(session, row["Session ID"])
+        yield row
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = None
+        for row in rows:
+            if writer is None:
+                writer = csv.DictWriter(f, list(row))
+                writer.writeheader()
+            writer.writerow(row)
+
+
+def timed(func):
+    """(func(), seconds it took)."""
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
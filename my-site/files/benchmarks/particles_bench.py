@@ -0,0 +1,102 @@
+"""
+Headless benchmark for spartan.py's particle system.
+
+Keeps N particles alive (spawning bursts of 18 to replace those that die,
+as enemy explosions do) and times one frame of update + draw for the
+NumPy ParticleSystem against the list-of-dicts version it replaced, which
+is reproduced here as `DictParticles`.
+
+Usage: python benchmarks/particles_bench.py [--frames N] [--counts N ...]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame  # noqa: E402
+import spartan  # noqa: E402
+
+BURST = 18
+COLORS = [(255,220,80), (255,80,80), (255,255,255)]
+# The dict version's list.remove() makes it quadratic; skip it above this.
+DICT_LIMIT = 20000
+
+
+class DictParticles:
+    """spartan.py's original particles: one dict each, a new Surface per draw."""
+
+    def __init__(self):
+        self.items = []
+
+    def __len__(self):
+        return len(self.items)
+
+    def spawn(self, x, y, amount=12, color=(255,200,50)):
+        for _ in range(amount):
+            vel = [random.uniform(-3,3), random.uniform(-3,3)]
+            life = random.randint(20,50)
+            self.items.append({"pos":[x,y], "vel":vel, "life":life, "color":color})
+
+    def update(self):
+        for p in self.items[:]:
+            p["life"] -= 1
+            if p["life"] <= 0:
+                self.items.remove(p)
+                continue
+            p["pos"][0] += p["vel"][0]
+            p["pos"][1] += p["vel"][1]
+
+    def draw(self, surf):
+        for p in self.items:
+            alpha = max(0, int(255 * (p["life"]/50)))
+            r,g,b = p["color"]
+            s = pygame.Surface((4,4), pygame.SRCALPHA)
+            s.fill((r,g,b,alpha))
+            surf.blit(s, (p["pos"][0], p["pos"][1]))
+
+
+def run(system, count, frames):
+    rng = random.Random(0)
+    screen = spartan.screen
+    times = []
+    for i in range(frames + 50):
+        while len(system) < count:
+            system.spawn(rng.randint(0, spartan.WIDTH), rng.randint(0, spartan.HEIGHT), BURST, rng.choice(COLORS))
+        start = time.perf_counter()
+        system.update()
+        screen.fill((8, 8, 24))
+        system.draw(screen)
+        if i >= 50:  # let the lifetimes spread out first
+            times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return times[len(times) // 2], times[int(len(times) * 0.95)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--counts", type=int, nargs="+", default=[1000, 5000, 20000, 50000])
+    args = parser.parse_args()
+    spartan.init_display()
+
+    budget = 1000 / spartan.FPS
+    print("frame budget %.1f ms (%d FPS)" % (budget, spartan.FPS))
+    for count in args.counts:
+        systems = [("numpy", spartan.ParticleSystem(max(count * 2, spartan.PARTICLE_CAPACITY), seed=0))]
+        if count <= DICT_LIMIT:
+            systems.insert(0, ("dicts", DictParticles()))
+        for name, system in systems:
+            p50, p95 = run(system, count, args.frames)
+            print("%6d particles  %-5s  p50 %8.2f ms  p95 %8.2f ms  %s" % (
+                count, name, p50, p95, "holds %d FPS" % spartan.FPS if p95 <= budget else "misses %d FPS" % spartan.FPS,
+            ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Headless frame-time benchmark for spartan.py's drawing.
+
+Plays the same seeded stretch of game twice, drawing it once the way
+spartan.py used to (fill, grid lines, SysFont lookup per text, flip) and
+once through render.py (cached text, pre-rendered background, dirty
+rectangles), checks that the final frames are pixel-identical and reports
+the drawing time per frame. With the dummy video driver flip() and
+update() copy nothing to a window, so on a real display the dirty path
+saves more than this shows.
+
+Usage: python benchmarks/render_bench.py [--frames N]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import pygame  # noqa: E402
+import spartan  # noqa: E402
+from spartan import HEIGHT, WIDTH  # noqa: E402
+
+spartan.init_display()
+screen = spartan.screen
+
+
+def old_text(surf, text, x, y, size=20, color=(255,255,255)):
+    f = pygame.font.SysFont("Consolas", size)
+    surf.blit(f.render(text, True, color), (x,y))
+
+
+def old_frame():
+    s = spartan
+    screen.fill((8,8,24))
+    for i in range(0, WIDTH, 40):
+        pygame.draw.line(screen, (10,10,40), (i,0), (i, HEIGHT), 1)
+    for j in range(0, HEIGHT, 40):
+        pygame.draw.line(screen, (10,10,40), (0,j), (WIDTH, j), 1)
+    screen.blit(s.player.surf, s.player.rect)
+    for b in s.bullets:
+        screen.blit(b.image, b.rect)
+    for e in s.enemies:
+        screen.blit(e.image, e.rect)
+    for p in s.powerups:
+        screen.blit(p.image, p.rect)
+    s.particles.draw(screen)
+    old_text(screen, f"Score: {s.player.score}", 8, 8, 18)
+    old_text(screen, f"Lives: {'∞' if s.god_mode else s.player.lives}", WIDTH-140, 8, 18)
+    old_text(screen, f"Level: {s.level}", WIDTH//2-40, 8, 18)
+    old_text(screen, f"High: {s.highscore}", WIDTH-240, 8, 18)
+    pygame.display.flip()
+
+
+def new_frame():
+    s = spartan
+    display = s.display
+    display.clear()
+    display.blit(s.player.surf, s.player.rect)
+    display.blits([(b.image, b.rect) for b in s.bullets])
+    display.blits([(e.image, e.rect) for e in s.enemies])
+    display.blits([(p.image, p.rect) for p in s.powerups])
+    display.add(s.particles.draw(screen))
+    s.draw_hud()
+    display.update()
+
+
+def play(draw, frames):
+    """Run `frames` seeded game frames; returns draw ms per frame and the last frame."""
+    s = spartan
+    random.seed(1)
+    s.reset_game()
+    s.particles.rng = np.random.default_rng(1)
+    s.god_mode = True
+    s.display.repaint(s.play_background)
+    times = []
+    for frame in range(1, frames + 1):
+        s.frame = frame
+        if frame % 8 == 0:
+            s.player.shoot()
+        s.player.rect.centerx = WIDTH // 2 + int(250 * np.sin(frame / 40))
+        s.bullets.update()
+        s.enemies.update()
+        s.powerups.update()
+        s.particles.update()
+        if frame % 45 == 1:
+            s.spawn_enemy_wave(3)
+        s.handle_collisions()
+        start = time.perf_counter()
+        draw()
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return times[len(times) // 2], times[int(len(times) * 0.95)], pygame.surfarray.array3d(screen)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=600)
+    args = parser.parse_args()
+
+    old_p50, old_p95, old_pixels = play(old_frame, args.frames)
+    new_p50, new_p95, new_pixels = play(new_frame, args.frames)
+    print("%d frames, %d enemies and %d bullets on screen at the end" % (
+        args.frames, len(spartan.enemies), len(spartan.bullets)))
+    print("full redraw + flip    p50 %6.2f ms  p95 %6.2f ms" % (old_p50, old_p95))
+    print("dirty rects + update  p50 %6.2f ms  p95 %6.2f ms  (%.1fx)" % (new_p50, new_p95, old_p50 / new_p50))
+    print("final frames identical: %s" % (old_pixels == new_pixels).all())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark the sharded join against the number of worker processes.
+
+Scales both bundled exports up to N rows each, then matches them with the
+AD-TransactionAnalysis-Fields.csv weighting (or --spec, whose fields and
+join keys must be columns of the exports) over a fixed number of
+partitions with 1, 2, 4, ... workers up to the core count, and reports the
+wall time, the speedup over one worker and whether the summary is
+identical to the one-worker run, after the one-worker run's pairing and
+group scores. Reading and partitioning the exports is done by the parent
+process alone, so its share of the one-worker run caps the speedup
+(Amdahl's law); that cap is printed first.
+
+Usage: python benchmarks/scaling_bench.py [--rows N] [--partitions P] [--max-workers W] [--join-key FIELD]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+
+from common import scaled_rows, timed, write_csv
+from txmatch.engine import Matcher, match_files
+from txmatch.records import iter_rows
+from txmatch.spec import DEFAULT_SPEC, load_spec
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--partitions", type=int, default=32, help="raised to --max-workers if below it")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--spec", default=DEFAULT_SPEC)
+    parser.add_argument("--join-key", action="append", default=[], metavar="FIELD")
+    args = parser.parse_args()
+
+    matcher = Matcher(load_spec(args.spec), join_keys=args.join_key)
+    columns = next(iter_rows(os.path.join(os.path.dirname(DEFAULT_SPEC), "splunk_log_data_pre.csv")))[1]
+    missing = [field for field in matcher.join_keys if field not in columns]
+    if missing or not any(field in columns for field in matcher.fields):
+        parser.error("the exports have no %s column, so every record would be unmatched"
+                     % ", ".join(missing or matcher.fields))
+    directory = tempfile.mkdtemp(prefix="txmatch-bench-")
+    try:
+        pre = os.path.join(directory, "pre.csv")
+        post = os.path.join(directory, "post.csv")
+        write_csv(pre, scaled_rows("splunk_log_data_pre.csv", args.rows))
+        write_csv(post, scaled_rows("splunk_log_data_post.csv", args.rows))
+        partitions = max(args.partitions, args.max_workers)
+        print("%d rows each, %d partitions, %d cores" % (args.rows, partitions, os.cpu_count() or 1))
+        workers, baseline, expected = 1, None, None
+        while workers <= max(1, args.max_workers):
+            summary, elapsed = timed(lambda: match_files(pre, post, matcher, partitions=partitions, workers=workers))
+            result = json.dumps(summary.as_dict(), sort_keys=True)
+            if baseline is None:
+                baseline, expected = elapsed, result
+                totals = summary.as_dict()
+                print("%(paired)d of %(post_rows)d post rows paired, %(matched)d matched; group means %(group_means)s"
+                      % totals)
+                print("partitioning in the parent: %.3fs of %.3fs, so at most %.1fx faster with any number of workers"
+                      % (summary.partition_seconds, elapsed, elapsed / max(summary.partition_seconds, 1e-9)))
+            print("%3d workers %8.3fs  %5.2fx  %s" % (
+                workers, elapsed, baseline / elapsed, "same summary" if result == expected else "SUMMARY DIFFERS",
+            ))
+            workers *= 2
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark the batched fuzzy rules against per-pair difflib.
+
+Builds N (pre, post) string pairs from the Error Description and Response
+Body columns of the bundled exports, with random character edits so the
+pool of distinct strings grows with N, then times, for the fuzzy and the
+structure rule:
+
+  per pair      the rules.py comparator called pair by pair, caches cleared
+  batch cold    the similarity.py batch comparator, caches cleared
+  batch warm    the same batch again, with the caches it filled
+
+and checks that the batch and per-pair decisions agree. It then blocks
+M post strings against M pre strings with MinHash LSH and reports the
+candidate pairs against the M * M a full comparison scores, and the share
+of the pairs difflib calls a match that LSH found.
+
+Usage: python benchmarks/similarity_bench.py [--pairs N] [--block M]
+"""
+
+import argparse
+import os
+import random
+from difflib import SequenceMatcher
+
+from common import FILES, timed
+from txmatch import rules, similarity
+from txmatch.records import iter_rows
+
+COLUMNS = ("Error Description", "Response Body")
+THRESHOLD = 0.85
+
+
+def load_values():
+    values = []
+    for name in ("splunk_log_data_pre.csv", "splunk_log_data_post.csv"):
+        for number, row in iter_rows(os.path.join(FILES, name)):
+            values.extend(row[column] for column in COLUMNS if row.get(column))
+    return values
+
+
+def mutate(rng, text, edits):
+    chars = list(text)
+    for _ in range(edits):
+        i = rng.randrange(len(chars) + 1)
+        op = rng.random()
+        if op < 0.4 and i < len(chars):
+            chars[i] = rng.choice("abcdefghijklmnopqrstuvwxyz_0123456789")
+        elif op < 0.7 and i < len(chars):
+            del chars[i]
+        else:
+            chars.insert(i, rng.choice("abcdefghijklmnopqrstuvwxyz_"))
+    return "".join(chars)
+
+
+def make_pairs(values, count, seed=0):
+    rng = random.Random(seed)
+    pairs = []
+    for _ in range(count):
+        a = rng.choice(values)
+        if rng.random() < 0.5:
+            b = mutate(rng, a, rng.randrange(4))
+        else:
+            b = mutate(rng, rng.choice(values), rng.randrange(3))
+        pairs.append((mutate(rng, a, rng.randrange(2)), b))
+    return pairs
+
+
+def difflib_match(a, b):
+    a, b = a.strip().lower(), b.strip().lower()
+    return a == b or SequenceMatcher(None, a, b, autojunk=False).ratio() >= THRESHOLD
+
+
+def clear_caches():
+    rules.similarity.cache_clear()
+    rules.parse_literal.cache_clear()
+    similarity.counts = similarity.CharCounts()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pairs", type=int, default=50000)
+    parser.add_argument("--block", type=int, default=2000)
+    args = parser.parse_args()
+
+    values = load_values()
+    pairs = make_pairs(values, args.pairs)
+    left, right = [a for a, b in pairs], [b for a, b in pairs]
+    print("%d pairs, %d distinct strings" % (len(pairs), len(set(left) | set(right))))
+
+    for name in ("fuzzy", "structure"):
+        compare, batch = rules.COMPARATORS[name], similarity.BATCH_COMPARATORS[name]
+        clear_caches()
+        naive, naive_time = timed(lambda: [compare(a, b, THRESHOLD) for a, b in pairs])
+        clear_caches()
+        result, cold_time = timed(lambda: batch(left, right, THRESHOLD))
+        result, warm_time = timed(lambda: batch(left, right, THRESHOLD))
+        mismatches = sum(1 for x, y in zip(naive, result.tolist()) if x != y)
+        print("%s rule, %d matches, %d decisions differ" % (name, sum(naive), mismatches))
+        for label, elapsed in (("per pair", naive_time), ("batch cold", cold_time), ("batch warm", warm_time)):
+            print("  %-12s %8.3fs  %10.0f pairs/s  %6.1fx" % (label, elapsed, len(pairs) / elapsed, naive_time / elapsed))
+
+    rng = random.Random(1)
+    pre = [mutate(rng, rng.choice(values), rng.randrange(3)) for _ in range(args.block)]
+    post = [mutate(rng, rng.choice(values), rng.randrange(3)) for _ in range(args.block)]
+    lsh = similarity.MinHashLSH()
+    candidates, lsh_time = timed(lambda: [lsh.add(i, text) for i, text in enumerate(pre)]
+                                 and [set(lsh.query(text)) for text in post])
+    found = sum(len(c) for c in candidates)
+    sample = range(0, len(post), max(1, len(post) // 200))
+    wanted = [(j, i) for j in sample for i in range(len(pre)) if difflib_match(pre[i], post[j])]
+    recall = sum(1 for j, i in wanted if i in candidates[j]) / len(wanted) if wanted else 1.0
+    print("lsh blocking: %d candidate pairs of %d (%.2f%%) in %.3fs, recall %.2f%% of difflib matches (%d sampled)"
+          % (found, len(pre) * len(post), 100 * found / (len(pre) * len(post)), lsh_time, 100 * recall, len(wanted)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Headless benchmark for snake_game.py's board.
+
+Plays the game on auto-pilot (following snake_game.hamiltonian_cycle)
+until the snake fills the whole board, once with snake_game.Board and once
+with the list the game used before (`in` on the body, insert(0), re-rolling
+random positions until the meal misses the body), reproduced here as
+`ListSnake`. Meals land on different cells in the two runs, since they
+are drawn differently, so the move counts differ a little.
+
+Usage: python benchmarks/snake_bench.py [--sizes 30x20 ...]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import snake_game  # noqa: E402
+from snake_game import Board, hamiltonian_cycle  # noqa: E402
+
+
+class ListSnake:
+    """snake_game.py's original body list, on a cols x rows board of cells."""
+
+    def __init__(self, cols, rows, rng):
+        self.cols, self.rows = cols, rows
+        self.rng = rng
+        self.snake = [(cols // 2, rows // 2)]
+        self.meal = self.random_position()
+        while self.meal in self.snake:
+            self.meal = self.random_position()
+
+    def random_position(self):
+        return (self.rng.randrange(0, self.cols), self.rng.randrange(0, self.rows))
+
+    def move(self, direction):
+        head = self.snake[0]
+        new_head = ((head[0] + direction[0]) % self.cols, (head[1] + direction[1]) % self.rows)
+        if new_head in self.snake:
+            return "dead"
+        self.snake.insert(0, new_head)
+        if new_head == self.meal:
+            if len(self.snake) == self.cols * self.rows:
+                self.meal = None
+                return "ate"
+            self.meal = self.random_position()
+            while self.meal in self.snake:
+                self.meal = self.random_position()
+            return "ate"
+        self.snake.pop()
+        return "moved"
+
+
+def fill(cols, rows, use_board, seed=0):
+    """Auto-play until the board is full; returns (moves, meals, seconds, µs per move that ate)."""
+    cycle = hamiltonian_cycle(cols, rows)
+    rng = random.Random(seed)
+    moves = meals = 0
+    eating = 0.0
+    clock = time.perf_counter
+    start = clock()
+    if use_board:
+        game = Board(cols, rows, rng=rng)
+        head = lambda: game.body[0]  # noqa: E731
+    else:
+        game = ListSnake(cols, rows, rng)
+        head = lambda: game.snake[0][1] * cols + game.snake[0][0]  # noqa: E731
+    while True:
+        t = clock()
+        result = game.move(cycle[head()])
+        took = clock() - t
+        moves += 1
+        if result == "dead":
+            raise AssertionError("the auto-pilot ran into itself")
+        if result == "ate":
+            meals += 1
+            eating += took
+            if game.meal is None:
+                break
+    return moves, meals, clock() - start, eating / meals * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["%dx%d" % (snake_game.COLS, snake_game.ROWS), "60x40"])
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        cols, rows = map(int, size.split("x"))
+        runs = {}
+        for name, use_board in (("list", False), ("board", True)):
+            moves, meals, seconds, eating = runs[name] = fill(cols, rows, use_board)
+            print("%-7s %-5s  filled in %8d moves, %5d meals: %7.2fs  %5.2f µs/move  %7.1f µs/move that ate" % (
+                size, name, moves, meals, seconds, seconds / moves * 1e6, eating,
+            ))
+        print("%-7s speedup %.1fx" % (size, runs["list"][2] / runs["board"][2]))
+
+
+if __name__ == "__main__":
+    main()
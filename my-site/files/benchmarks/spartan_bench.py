@@ -0,0 +1,114 @@
+"""
+Headless frame-time benchmark for spartan.py's entities and collisions.
+
+Runs the game's per-frame work (move bullets and enemies, collide them,
+draw every sprite) with the SDL dummy video driver, keeping E enemies and
+B bullets on screen by respawning what dies, and reports the frame time
+for the NumPy grid collision test against pygame.sprite.groupcollide, and
+the cost of spawning a sprite with its shared, cached image against
+building it with its own surface as before.
+
+Usage: python benchmarks/spartan_bench.py [--frames N] [--sizes E:B ...]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame  # noqa: E402
+import spartan  # noqa: E402
+
+FRAME_BUDGET = 1000 / spartan.FPS
+
+
+def spawn_enemy(rng):
+    size = rng.choice((20, 22, 40))
+    return spartan.Enemy(rng.randint(0, spartan.WIDTH), rng.randint(-40, spartan.HEIGHT // 2),
+                         rng.uniform(-1, 1), rng.uniform(0.5, 2), hp=1000000, size=size)
+
+
+def spawn_bullet(rng):
+    return spartan.Bullet(rng.randint(0, spartan.WIDTH), rng.randint(0, spartan.HEIGHT),
+                          -spartan.BULLET_SPEED, power=rng.randint(1, 3))
+
+
+def naive_hits():
+    return pygame.sprite.groupcollide(spartan.enemies, spartan.bullets, False, True)
+
+
+def run(enemy_count, bullet_count, frames, hits, seed=0):
+    rng = random.Random(seed)
+    spartan.enemies.empty()
+    spartan.bullets.empty()
+    screen = spartan.screen
+    times = []
+    hit_total = 0
+    for _ in range(frames):
+        while len(spartan.enemies) < enemy_count:
+            spartan.enemies.add(spawn_enemy(rng))
+        while len(spartan.bullets) < bullet_count:
+            spartan.bullets.add(spawn_bullet(rng))
+        start = time.perf_counter()
+        spartan.bullets.update()
+        spartan.enemies.update()
+        for e, blist in hits().items():
+            hit_total += len(blist)
+        screen.fill((8, 8, 24))
+        screen.blits([(b.image, b.rect) for b in spartan.bullets], doreturn=False)
+        screen.blits([(e.image, e.rect) for e in spartan.enemies], doreturn=False)
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return times[len(times) // 2], times[int(len(times) * 0.95)], hit_total
+
+
+def old_bullet(x, y, power):
+    """A bullet as spartan.py built it before the shared images: new sprite, new surface."""
+    sprite = pygame.sprite.Sprite()
+    sprite.image = pygame.Surface((4 + power*2, 8 + power*2), pygame.SRCALPHA)
+    pygame.draw.rect(sprite.image, (255, 255, 100), sprite.image.get_rect())
+    sprite.rect = sprite.image.get_rect(center=(x, y))
+    return sprite
+
+
+def spawn_cost(count):
+    start = time.perf_counter()
+    for i in range(count):
+        old_bullet(i % spartan.WIDTH, 100, 1 + i % 3)
+    fresh = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(count):
+        spartan.Bullet(i % spartan.WIDTH, 100, -spartan.BULLET_SPEED, power=1 + i % 3)
+    shared = time.perf_counter() - start
+    return fresh, shared
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=120)
+    parser.add_argument("--sizes", nargs="+", default=["200:200", "1000:1000", "2000:3000"],
+                        help="enemies:bullets on screen")
+    args = parser.parse_args()
+    spartan.init_display()
+
+    print("frame budget %.1f ms (%d FPS)" % (FRAME_BUDGET, spartan.FPS))
+    for size in args.sizes:
+        enemy_count, bullet_count = map(int, size.split(":"))
+        for name, hits in (("groupcollide", naive_hits), ("numpy grid", spartan.bullet_hits)):
+            p50, p95, hit_total = run(enemy_count, bullet_count, args.frames, hits)
+            print("%5d enemies %5d bullets  %-12s  p50 %7.2f ms  p95 %7.2f ms  %s  (%d hits)" % (
+                enemy_count, bullet_count, name, p50, p95,
+                "holds %d FPS" % spartan.FPS if p95 <= FRAME_BUDGET else "misses %d FPS" % spartan.FPS, hit_total,
+            ))
+    fresh, shared = spawn_cost(20000)
+    print("spawn 20000 bullets: new surface each %.1f ms, shared image %.1f ms (%.1fx)"
+          % (fresh * 1000, shared * 1000, fresh / shared))
+
+
+if __name__ == "__main__":
+    main()
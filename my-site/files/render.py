@@ -0,0 +1,113 @@
+"""
+Drawing helpers shared by the Pygame games (spartan.py, ../snake_game.py).
+
+ - get_font / text_surface: LRU caches of loaded fonts and of rendered
+   text, keyed by (text, size, color), so a HUD that shows the same score
+   for many frames renders it once instead of every frame.
+ - prerender: draws a static background once into its own surface.
+ - DirtyScreen: wraps the display surface, records every area drawn in a
+   frame, restores only those areas from the background next frame and
+   pushes them with pygame.display.update(rects) instead of flip().
+"""
+
+from functools import lru_cache
+
+import pygame
+
+FONT_CACHE = 32
+TEXT_CACHE = 512
+# Past this many dirty rectangles (or this share of the screen) one
+# full-screen blit and update are cheaper than the rectangles.
+MAX_RECTS = 512
+MAX_DIRTY_AREA = 0.5
+
+
+@lru_cache(maxsize=FONT_CACHE)
+def get_font(name, size, bold=False):
+    return pygame.font.SysFont(name, size, bold=bold)
+
+
+@lru_cache(maxsize=TEXT_CACHE)
+def text_surface(text, size, color, name="Consolas", bold=False):
+    """`text` rendered antialiased; color must be a tuple to be cached."""
+    return get_font(name, size, bold).render(text, True, color)
+
+
+def prerender(size, draw):
+    """A display-format surface of `size`, painted once by draw(surface)."""
+    surface = pygame.Surface(size)
+    draw(surface)
+    return surface.convert()
+
+
+class DirtyScreen:
+    """
+    The display surface, drawn through blit/blits/fill so the changed areas
+    are known. Each frame: clear() erases what the last frame drew, draw,
+    then update() pushes last frame's areas and this frame's together.
+    """
+
+    def __init__(self, surface, background):
+        self.surface = surface
+        self.background = background
+        self.drawn = []
+        self.previous = []
+        self.everything = True  # the first frame repaints the whole screen
+
+    def get_size(self):
+        return self.surface.get_size()
+
+    def get_width(self):
+        return self.surface.get_width()
+
+    def get_height(self):
+        return self.surface.get_height()
+
+    def blit(self, source, dest, area=None, special_flags=0):
+        rect = self.surface.blit(source, dest, area, special_flags)
+        self.drawn.append(rect)
+        return rect
+
+    def blits(self, sequence):
+        self.drawn.extend(self.surface.blits(sequence))
+
+    def fill(self, color, rect=None):
+        rect = self.surface.fill(color, rect)
+        self.drawn.append(rect)
+        return rect
+
+    def add(self, rect):
+        """Mark an area drawn directly on self.surface."""
+        if rect:
+            self.drawn.append(pygame.Rect(rect))
+
+    def repaint(self, background=None):
+        """Start over from a (new) background: the next frame redraws everything."""
+        if background is not None:
+            self.background = background
+        self.everything = True
+
+    def _too_many(self, rects):
+        if len(rects) > MAX_RECTS:
+            return True
+        w, h = self.surface.get_size()
+        return sum(r.w * r.h for r in rects) > MAX_DIRTY_AREA * w * h
+
+    def clear(self):
+        """Restore the background where the last frame drew."""
+        if self.everything or self._too_many(self.drawn):
+            self.surface.blit(self.background, (0, 0))
+            self.everything = True
+        else:
+            background = self.background
+            self.surface.blits([(background, r, r) for r in self.drawn], doreturn=False)
+        self.previous = self.drawn
+        self.drawn = []
+
+    def update(self):
+        rects = self.previous + self.drawn
+        if self.everything or self._too_many(rects):
+            pygame.display.update()
+        else:
+            pygame.display.update(rects)
+        self.everything = False
@@ -14,7 +14,11 @@ import pygame
 import random
 import math
 import os
+import numpy as np
 from collections import deque
+from functools import lru_cache
+
+from render import DirtyScreen, prerender, text_surface
 
 # -------- CONFIG -----------
 WIDTH, HEIGHT = 800, 600
@@ -23,16 +27,18 @@ PLAYER_SPEED = 5
 BULLET_SPEED = 10
 ENEMY_SPEED_BASE = 1.0
 SPAWN_BASE_INTERVAL = 120  # frames
+LEVEL_INTERVAL = FPS * 20  # frames per level
+MAX_CATCHUP = 5  # most simulation steps run to catch up before a redraw
 HIGH_SCORE_FILE = "highscore.txt"
 SECRET_CODE = "spartan"
+GRID_CELL = 64  # collision grid cell size (px), larger than most sprites
+GRID_PAIRS = 20000  # past this many enemy x bullet pairs, collide on the NumPy grid
 # ---------------------------
 
-pygame.init()
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Spartan")
-clock = pygame.time.Clock()
-font = pygame.font.SysFont("Consolas", 20)
-bigfont = pygame.font.SysFont("Consolas", 48)
+# The window and what is drawn on it, set by init_display() so that importing
+# the game (for simulate(), the tests and benchmarks) opens no window.
+screen = clock = display = None
+play_background = menu_background = gameover_background = None
 
 # Utility functions
 def load_highscore():
@@ -50,31 +56,255 @@ def save_highscore(score):
         pass
 
 def draw_text(surf, text, x, y, size=20, color=(255,255,255)):
-    f = pygame.font.SysFont("Consolas", size)
-    surf.blit(f.render(text, True, color), (x,y))
+    return surf.blit(text_surface(text, size, color), (x,y))
+
+def draw_grid(surf):
+    surf.fill((8,8,24))
+    for i in range(0, WIDTH, 40):
+        pygame.draw.line(surf, (10,10,40), (i,0), (i, HEIGHT), 1)
+    for j in range(0, HEIGHT, 40):
+        pygame.draw.line(surf, (10,10,40), (0,j), (WIDTH, j), 1)
+
+def init_display():
+    """Open the window and draw the static backgrounds once; `display` redraws only what changes on top."""
+    global screen, clock, display, play_background, menu_background, gameover_background
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("Spartan")
+    clock = pygame.time.Clock()
+    play_background = prerender((WIDTH, HEIGHT), draw_grid)
+    menu_background = prerender((WIDTH, HEIGHT), lambda surf: surf.fill((12,12,30)))
+    gameover_background = prerender((WIDTH, HEIGHT), lambda surf: surf.fill((0,0,0)))
+    display = DirtyScreen(screen, menu_background)
+
+def display_format(image):
+    """`image` converted for fast blits to the window; as it is while there is none (simulate())."""
+    return image.convert_alpha() if pygame.display.get_surface() else image
+
+# Particle system: every particle lives in preallocated NumPy arrays and
+# the whole set is moved and aged in one vectorized step per frame.
+PARTICLE_CAPACITY = 65536
+PARTICLE_LIFE = 50  # frames; a particle's alpha is 255 * life / PARTICLE_LIFE
+PARTICLE_SIZE = 4
+PARTICLE_BLIT_LIMIT = 1024  # above this many on screen, draw through one RGBA layer
+# A particle's alpha (0-1) by remaining life, and log(1 - alpha), how much of
+# what is under it shows through, kept above 0 so the log is finite.
+PARTICLE_ALPHA = np.array([max(0, int(255 * (life/PARTICLE_LIFE))) for life in range(PARTICLE_LIFE + 1)]) / 255
+PARTICLE_LOG_KEEP = np.log(np.maximum(1 - PARTICLE_ALPHA, 1e-6))
+
+class ParticleSystem:
+    """
+    Particles in fixed-size arrays. Dead slots go on a free-list stack so
+    spawning never searches, and spawns beyond capacity are dropped.
+    """
+    def __init__(self, capacity=PARTICLE_CAPACITY, seed=None):
+        self.capacity = capacity
+        self.pos = np.zeros((capacity, 2), dtype=np.float32)
+        self.vel = np.zeros((capacity, 2), dtype=np.float32)
+        self.life = np.zeros(capacity, dtype=np.int16)
+        self.color = np.zeros(capacity, dtype=np.int16)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.free = np.arange(capacity - 1, -1, -1, dtype=np.int32)
+        self.top = capacity  # free[:top] are the free slots
+        self.colors = {}  # rgb -> palette index
+        self.sprites = []  # palette index -> surface per remaining life
+        self.rng = np.random.default_rng(seed)
+        self.rgb = np.zeros((0, 3))  # palette index -> color, for the layer
+        self.layer = None
+
+    def __len__(self):
+        return self.capacity - self.top
+
+    def _palette(self, color):
+        index = self.colors.get(color)
+        if index is None:
+            index = self.colors[color] = len(self.sprites)
+            self.sprites.append([particle_image(color, life) for life in range(PARTICLE_LIFE + 1)])
+        return index
+
+    def spawn(self, x, y, amount=12, color=(255,200,50)):
+        amount = min(amount, self.top)
+        if amount <= 0:
+            return
+        slots = self.free[self.top - amount:self.top]
+        self.top -= amount
+        self.pos[slots] = (x, y)
+        self.vel[slots] = self.rng.uniform(-3, 3, (amount, 2))
+        self.life[slots] = self.rng.integers(20, PARTICLE_LIFE, amount, endpoint=True)
+        self.color[slots] = self._palette(tuple(color))
+        self.alive[slots] = True
 
-# Simple particle system (small circles)
-particles = []
+    def update(self):
+        live = np.flatnonzero(self.alive)
+        if not len(live):
+            return
+        self.life[live] -= 1
+        dead = live[self.life[live] <= 0]
+        if len(dead):
+            self.alive[dead] = False
+            self.free[self.top:self.top + len(dead)] = dead
+            self.top += len(dead)
+            live = live[self.life[live] > 0]
+        self.pos[live] += self.vel[live]
+
+    def draw(self, surf):
+        """Draw the live particles; returns the area drawn, or None."""
+        live = np.flatnonzero(self.alive)
+        pos = self.pos[live]
+        w, h = surf.get_size()
+        shown = (pos[:, 0] > -PARTICLE_SIZE) & (pos[:, 0] < w) & (pos[:, 1] > -PARTICLE_SIZE) & (pos[:, 1] < h)
+        live = live[shown]
+        xy = pos[shown].astype(np.int32)
+        if not len(live):
+            return None
+        x0, y0 = np.maximum(xy.min(axis=0), 0)
+        x1, y1 = np.minimum(xy.max(axis=0) + PARTICLE_SIZE, (w, h))
+        area = pygame.Rect(int(x0), int(y0), int(x1 - x0), int(y1 - y0))
+        if len(live) > PARTICLE_BLIT_LIMIT:
+            self._draw_layer(surf, live, xy, area)
+            return area
+        sprites = self.sprites
+        surf.blits(list(zip(
+            [sprites[c][l] for c, l in zip(self.color[live].tolist(), self.life[live].tolist())],
+            xy.tolist(),
+        )), doreturn=False)
+        return area
+
+    def _draw_layer(self, surf, live, xy, area):
+        # One blit per particle costs about a microsecond, so past
+        # PARTICLE_BLIT_LIMIT the particles are composited into one RGBA
+        # layer, one of their PARTICLE_SIZE**2 pixels at a time, and that is
+        # blitted once. Each pixel goes over what the layer already holds, as
+        # a blit would, so overlaps build up as they do when blitted; only
+        # the order can differ, which shows where colors overlap.
+        w, h = surf.get_size()
+        if self.layer is None or self.layer.get_size() != (w, h):
+            self.layer = display_format(pygame.Surface((w, h), pygame.SRCALPHA))
+        if len(self.rgb) != len(self.sprites):
+            self.rgb = np.zeros((len(self.sprites), 3))
+            for color, index in self.colors.items():
+                self.rgb[index] = color
+        # Pixels are numbered column by column, as surfarray lays them out,
+        # over the area with a PARTICLE_SIZE margin so that none falls outside.
+        size = PARTICLE_SIZE
+        gh = area.height + 2*size
+        origin = (xy[:, 0] - area.left + size) * gh + (xy[:, 1] - area.top + size)
+        life = self.life[live]
+        alpha = PARTICLE_ALPHA[life]
+        rgb = self.rgb[self.color[live]] * alpha[:, None]  # premultiplied
+        # A pass writes each pixel once, so particles at the same place are
+        # merged: 1 - alpha is the product of theirs, and the color their
+        # alpha-weighted mean.
+        origin, merged = np.unique(origin, return_inverse=True)
+        if len(origin) < len(live):
+            weight = np.bincount(merged, alpha, len(origin))
+            rgb = np.stack([np.bincount(merged, rgb[:, c], len(origin)) for c in range(3)], axis=1) / weight[:, None]
+            alpha = 1 - np.exp(np.bincount(merged, PARTICLE_LOG_KEEP[life], len(origin)))
+            rgb *= alpha[:, None]
+        opaque = (255 * alpha).astype(np.float32)
+        clear = (1 - alpha).astype(np.float32)
+        rs, gs, bs, as_ = self.layer.get_shifts()
+        channels = [((255 * rgb[:, c]).astype(np.float32), shift) for c, shift in enumerate((rs, gs, bs))]
+        pixels = np.zeros((area.width + 2*size) * gh, dtype=np.uint32)
+        for dx in range(size):
+            for dy in range(size):
+                at = origin + (dx*gh + dy)
+                under = pixels[at]
+                kept = (under >> as_ & 255).astype(np.float32)
+                kept *= clear
+                total = opaque + kept
+                scale = 1 / total
+                total += 0.5
+                over = total.astype(np.uint32) << as_
+                for value, shift in channels:
+                    mixed = (under >> shift & 255).astype(np.float32)
+                    mixed *= kept
+                    mixed += value
+                    mixed *= scale
+                    mixed += 0.5
+                    over |= mixed.astype(np.uint32) << shift
+                pixels[at] = over
+        layer = pygame.surfarray.pixels2d(self.layer)
+        layer[area.left:area.right, area.top:area.bottom] = pixels.reshape(-1, gh)[size:size + area.width, size:size + area.height]
+        del layer  # unlocks the surface for blitting
+        surf.blit(self.layer, area, area)
+
+    def clear(self):
+        self.alive[:] = False
+        self.free[:] = np.arange(self.capacity - 1, -1, -1, dtype=np.int32)
+        self.top = self.capacity
+
+@lru_cache(maxsize=None)
+def particle_image(color, life):
+    image = pygame.Surface((PARTICLE_SIZE, PARTICLE_SIZE), pygame.SRCALPHA)
+    r,g,b = color
+    image.fill((r, g, b, max(0, int(255 * (life/PARTICLE_LIFE)))))
+    return display_format(image)
+
+particles = ParticleSystem()
 def spawn_particles(x,y,amount=12,color=(255,200,50)):
-    for _ in range(amount):
-        vel = [random.uniform(-3,3), random.uniform(-3,3)]
-        life = random.randint(20,50)
-        particles.append({"pos":[x,y], "vel":vel, "life":life, "color":color})
-
-def update_particles():
-    for p in particles[:]:
-        p["life"] -= 1
-        if p["life"] <= 0:
-            particles.remove(p)
-            continue
-        p["pos"][0] += p["vel"][0]
-        p["pos"][1] += p["vel"][1]
-        # fade
-        alpha = max(0, int(255 * (p["life"]/50)))
-        r,g,b = p["color"]
-        surf = pygame.Surface((4,4), pygame.SRCALPHA)
-        surf.fill((r,g,b,alpha))
-        screen.blit(surf, (p["pos"][0], p["pos"][1]))
+    particles.spawn(x, y, amount, color)
+
+# Shared pre-rendered surfaces: one per entity type, size and color
+@lru_cache(maxsize=None)
+def bullet_image(power, owner):
+    image = pygame.Surface((4 + power*2, 8 + power*2), pygame.SRCALPHA)
+    color = (255,255,100) if owner=="player" else (255,100,100)
+    pygame.draw.rect(image, color, image.get_rect())
+    return display_format(image)
+
+@lru_cache(maxsize=None)
+def enemy_image(size, color):
+    image = pygame.Surface((size, size), pygame.SRCALPHA)
+    pygame.draw.circle(image, color, (size//2, size//2), size//2)
+    return display_format(image)
+
+@lru_cache(maxsize=None)
+def powerup_image(kind):
+    image = pygame.Surface((18,18), pygame.SRCALPHA)
+    color = (100,255,100) if kind=="life" else (255,255,100)
+    pygame.draw.rect(image, color, image.get_rect())
+    return display_format(image)
+
+def sprite_rects(sprites):
+    """The left, top, right and bottom edges of the sprites' rects, as four arrays."""
+    x, y, w, h = np.fromiter((v for s in sprites for v in s.rect), dtype=np.int32,
+                             count=4 * len(sprites)).reshape(-1, 4).T.copy()
+    return x, y, x + w, y + h
+
+def grid_cells(rects, cell=GRID_CELL):
+    """(cell key, index) for every grid cell each rect covers, as two arrays."""
+    left, top, right, bottom = rects
+    x0, y0 = left // cell, top // cell
+    nx = (right - 1) // cell - x0 + 1
+    ny = (bottom - 1) // cell - y0 + 1
+    index = np.arange(len(left))
+    keys, owners = [], []
+    for dx in range(int(nx.max(initial=1))):
+        for dy in range(int(ny.max(initial=1))):
+            covered = (dx < nx) & (dy < ny)
+            keys.append(((x0[covered] + dx).astype(np.int64) << 32) + (y0[covered] + dy))
+            owners.append(index[covered])
+    return np.concatenate(keys), np.concatenate(owners)
+
+def grid_collide(a, b, cell=GRID_CELL):
+    """
+    Every overlapping (i, j) of rects a[i] and b[j] (as colliderect() decides),
+    found by joining the grid cells they cover: two arrays i and j, with a
+    pair that shares several cells listed once per cell. Rects are given
+    as sprite_rects() returns them.
+    """
+    a_keys, a_index = grid_cells(a, cell)
+    b_keys, b_index = grid_cells(b, cell)
+    order = np.argsort(b_keys, kind="stable")
+    b_keys, b_index = b_keys[order], b_index[order]
+    lo = np.searchsorted(b_keys, a_keys, "left")
+    counts = np.searchsorted(b_keys, a_keys, "right") - lo
+    i = np.repeat(a_index, counts)
+    j = b_index[np.repeat(lo - (np.cumsum(counts) - counts), counts) + np.arange(len(i))]
+    (al, at, ar, ab), (bl, bt, br, bb) = a, b
+    overlap = (al[i] < br[j]) & (bl[j] < ar[i]) & (at[i] < bb[j]) & (bt[j] < ab[i])
+    return i[overlap], j[overlap]
 
 # Entities
 class Player(pygame.sprite.Sprite):
@@ -117,9 +347,7 @@ class Bullet(pygame.sprite.Sprite):
         self.owner = owner
         self.power = power
         self.vy = vy
-        self.image = pygame.Surface((4 + power*2, 8 + power*2), pygame.SRCALPHA)
-        color = (255,255,100) if owner=="player" else (255,100,100)
-        pygame.draw.rect(self.image, color, self.image.get_rect())
+        self.image = bullet_image(power, owner)
         self.rect = self.image.get_rect(center=(x,y))
     def update(self):
         self.rect.y += self.vy
@@ -133,8 +361,7 @@ class Enemy(pygame.sprite.Sprite):
         self.vx = vx
         self.vy = vy
         self.score_value = score_value
-        self.image = pygame.Surface((size, size), pygame.SRCALPHA)
-        pygame.draw.circle(self.image, color, (size//2, size//2), size//2)
+        self.image = enemy_image(size, color)
         self.rect = self.image.get_rect(center=(x,y))
     def update(self):
         self.rect.x += self.vx
@@ -146,9 +373,7 @@ class Powerup(pygame.sprite.Sprite):
     def __init__(self, x, y, kind="life"):
         super().__init__()
         self.kind = kind
-        self.image = pygame.Surface((18,18), pygame.SRCALPHA)
-        color = (100,255,100) if kind=="life" else (255,255,100)
-        pygame.draw.rect(self.image, color, self.image.get_rect())
+        self.image = powerup_image(kind)
         self.rect = self.image.get_rect(center=(x,y))
         self.vy = 2
     def update(self):
@@ -200,10 +425,44 @@ def spawn_powerup(x,y):
     powerups.add(pu)
 
 # Collision handling
+def bullet_hits():
+    """
+    Like groupcollide(enemies, bullets, False, True): each bullet hits the
+    first enemy it overlaps, and the hits come in enemy then bullet order.
+    Few sprites are tested pair by pair in C (collidelistall); past
+    GRID_PAIRS pairs the rects are tested in bulk with NumPy, only those
+    sharing a grid cell, as the arrays cost about 0.2 ms to set up.
+    """
+    es, bs = enemies.sprites(), bullets.sprites()
+    if not es or not bs:
+        return {}
+    if len(es) * len(bs) <= GRID_PAIRS:
+        rects = [b.rect for b in bs]
+        hits = {}
+        for e in es:
+            blist = [bs[i] for i in e.rect.collidelistall(rects) if bs[i].alive()]
+            if blist:
+                for b in blist:
+                    b.kill()
+                hits[e] = blist
+        return hits
+    e, b = grid_collide(sprite_rects(es), sprite_rects(bs))
+    first = np.full(len(bs), len(es))
+    np.minimum.at(first, b, e)
+    hit = np.flatnonzero(first < len(es))
+    owner = first[hit]
+    order = np.lexsort((hit, owner))
+    hits = {}
+    for ei, bi in zip(owner[order].tolist(), hit[order].tolist()):
+        hits.setdefault(es[ei], []).append(bs[bi])
+    for bi in hit.tolist():
+        bs[bi].kill()
+    return hits
+
 def handle_collisions():
     global god_mode
     # player bullets hit enemies
-    hits = pygame.sprite.groupcollide(enemies, bullets, False, True, collided=pygame.sprite.collide_mask if False else None)
+    hits = bullet_hits()
     for e, blist in hits.items():
         for b in blist:
             if b.owner == "player":
@@ -237,95 +496,35 @@ def handle_collisions():
 
 # Menu draw helpers
 def draw_hud():
-    draw_text(screen, f"Score: {player.score}", 8, 8, 18)
-    draw_text(screen, f"Lives: {'∞' if god_mode else player.lives}", WIDTH-140, 8, 18)
-    draw_text(screen, f"Level: {level}", WIDTH//2-40, 8, 18)
-    draw_text(screen, f"High: {highscore}", WIDTH-240, 8, 18)
+    draw_text(display, f"Score: {player.score}", 8, 8, 18)
+    draw_text(display, f"Lives: {'∞' if god_mode else player.lives}", WIDTH-140, 8, 18)
+    draw_text(display, f"Level: {level}", WIDTH//2-40, 8, 18)
+    draw_text(display, f"High: {highscore}", WIDTH-240, 8, 18)
 
 def reset_game():
     global level, spawn_timer, frame, player, enemies, bullets, powerups, highscore
-    enemies.empty(); bullets.empty(); powerups.empty()
+    enemies.empty(); bullets.empty(); powerups.empty(); particles.clear()
     player.rect.center = (WIDTH//2, HEIGHT-80)
     player.lives = 3
     player.score = 0
     player.power = 1
     player.invuln = 0
+    player.cooldown = 0
     level = 1
     spawn_timer = SPAWN_BASE_INTERVAL
     frame = 0
 
-# Main loop
-while running:
-    dt = clock.tick(FPS)
+# Simulation: one fixed 1/FPS step of the game, independent of drawing
+def step(keys, shoot=False):
+    """Advance the game one frame with `keys` held; returns handle_collisions()'s status."""
+    global frame, level
     frame += 1
-
-    # Events
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        if event.type == pygame.KEYDOWN:
-            # global keys
-            if event.key == pygame.K_ESCAPE:
-                if state == "playing":
-                    paused = not paused
-                else:
-                    running = False
-            # secret code handling (letters only)
-            if event.unicode and event.unicode.isalpha():
-                secret_buffer.append(event.unicode.lower())
-                if "".join(secret_buffer).endswith(SECRET_CODE):
-                    god_mode = not god_mode
-                    # brief on-screen message via simple print and HUD change
-                    # reward: if god_mode turned on, set lives to very large
-                    if god_mode:
-                        player.lives = 9999
-                    else:
-                        if player.lives > 5:
-                            player.lives = 3
-            # menu/start controls
-            if state == "menu":
-                if event.key == pygame.K_RETURN:
-                    reset_game()
-                    state = "playing"
-            elif state == "playing":
-                if event.key == pygame.K_SPACE:
-                    player.shoot()
-            elif state == "gameover":
-                if event.key == pygame.K_RETURN:
-                    state = "menu"
-
-    keys = pygame.key.get_pressed()
-
-    # State handling
-    if state == "menu":
-        screen.fill((12,12,30))
-        draw_text(screen, "SPARTAN", WIDTH//2-120, HEIGHT//2 - 120, size=64)
-        draw_text(screen, "Press ENTER to Start", WIDTH//2-140, HEIGHT//2 - 10, size=28)
-        draw_text(screen, f"High Score: {highscore}", WIDTH//2-90, HEIGHT//2 + 40)
-        draw_text(screen, "Secret: type 'spartan' to toggle unlimited lives", WIDTH//2-230, HEIGHT//2 + 90, size=16)
-        pygame.display.flip()
-        continue
-
-    if state == "gameover":
-        screen.fill((0,0,0))
-        draw_text(screen, "GAME OVER", WIDTH//2-130, HEIGHT//2-80, size=64)
-        draw_text(screen, f"Score: {player.score}", WIDTH//2-80, HEIGHT//2-10, size=28)
-        draw_text(screen, f"High Score: {highscore}", WIDTH//2-110, HEIGHT//2+30, size=22)
-        draw_text(screen, "Press ENTER to return to Menu", WIDTH//2-170, HEIGHT//2+90)
-        pygame.display.flip()
-        continue
-
-    if paused:
-        draw_text(screen, "PAUSED - ESC to resume", WIDTH//2-140, HEIGHT//2-20, size=28)
-        pygame.display.flip()
-        continue
-
-    # Update game objects
+    if shoot:
+        player.shoot()
     player.update(keys)
     bullets.update()
     enemies.update()
     powerups.update()
-    update_particles()
 
     # Enemy spawning and difficulty scaling
     if frame % max(30, SPAWN_BASE_INTERVAL - level*2) == 0:
@@ -340,41 +539,153 @@ while running:
 
     # collisions
     status = handle_collisions()
-    if status == "dead":
-        # game over handling
-        if player.score > highscore:
-            highscore = player.score
-            save_highscore(highscore)
-        state = "gameover"
 
     # level up logic
-    if frame % (FPS * 20) == 0:
+    if frame % LEVEL_INTERVAL == 0:
         level += 1
+    return status
+
+def simulate(bot, seed=0, max_steps=FPS * 60 * 10):
+    """
+    Play one game headless, without drawing or waiting, as fast as the
+    steps run. bot() is asked for (keys, shoot) before every step, and the
+    particles are moved and aged after it as main() does each frame, so
+    they cost what they do in play (they are only not drawn). Returns
+    (score, level, steps); the game is the same for the same seed.
+    """
+    random.seed(seed)
+    particles.rng = np.random.default_rng(seed)
+    reset_game()
+    while frame < max_steps:
+        keys, shoot = bot()
+        status = step(keys, shoot)
+        particles.update()
+        if status == "dead":
+            break
+    return player.score, level, frame
 
-    # draw
-    screen.fill((8,8,24))
-    # background grid
-    for i in range(0, WIDTH, 40):
-        pygame.draw.line(screen, (10,10,40), (i,0), (i, HEIGHT), 1)
-    for j in range(0, HEIGHT, 40):
-        pygame.draw.line(screen, (10,10,40), (0,j), (WIDTH, j), 1)
-
-    # draw sprites
-    screen.blit(player.surf, player.rect)
-    for b in bullets:
-        screen.blit(b.image, b.rect)
-    for e in enemies:
-        screen.blit(e.image, e.rect)
-    for p in powerups:
-        screen.blit(p.image, p.rect)
-    update_particles()
-    draw_hud()
-
-    # Secret mode banner
-    if god_mode:
-        s = bigfont.render("GOD MODE", True, (255,215,0))
-        screen.blit(s, (WIDTH//2 - s.get_width()//2, 40))
-
-    pygame.display.flip()
-
-pygame.quit()
+# Main loop
+def main():
+    global running, paused, state, highscore, god_mode
+    init_display()
+    shown = None  # the screen last drawn, to repaint fully when it changes
+    lag = 0.0  # real time not yet simulated, in ms
+    while running:
+        lag += clock.tick(FPS)
+
+        # Events
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            if event.type == pygame.KEYDOWN:
+                # global keys
+                if event.key == pygame.K_ESCAPE:
+                    if state == "playing":
+                        paused = not paused
+                    else:
+                        running = False
+                # secret code handling (letters only)
+                if event.unicode and event.unicode.isalpha():
+                    secret_buffer.append(event.unicode.lower())
+                    if "".join(secret_buffer).endswith(SECRET_CODE):
+                        god_mode = not god_mode
+                        # brief on-screen message via simple print and HUD change
+                        # reward: if god_mode turned on, set lives to very large
+                        if god_mode:
+                            player.lives = 9999
+                        else:
+                            if player.lives > 5:
+                                player.lives = 3
+                # menu/start controls
+                if state == "menu":
+                    if event.key == pygame.K_RETURN:
+                        reset_game()
+                        state = "playing"
+                elif state == "playing":
+                    if event.key == pygame.K_SPACE:
+                        player.shoot()
+                elif state == "gameover":
+                    if event.key == pygame.K_RETURN:
+                        state = "menu"
+
+        keys = pygame.key.get_pressed()
+
+        # State handling
+        if state == "menu":
+            if shown != "menu":
+                display.repaint(menu_background)
+                shown = "menu"
+            display.clear()
+            draw_text(display, "SPARTAN", WIDTH//2-120, HEIGHT//2 - 120, size=64)
+            draw_text(display, "Press ENTER to Start", WIDTH//2-140, HEIGHT//2 - 10, size=28)
+            draw_text(display, f"High Score: {highscore}", WIDTH//2-90, HEIGHT//2 + 40)
+            draw_text(display, "Secret: type 'spartan' to toggle unlimited lives", WIDTH//2-230, HEIGHT//2 + 90, size=16)
+            display.update()
+            lag = 0.0
+            continue
+
+        if state == "gameover":
+            if shown != "gameover":
+                display.repaint(gameover_background)
+                shown = "gameover"
+            display.clear()
+            draw_text(display, "GAME OVER", WIDTH//2-130, HEIGHT//2-80, size=64)
+            draw_text(display, f"Score: {player.score}", WIDTH//2-80, HEIGHT//2-10, size=28)
+            draw_text(display, f"High Score: {highscore}", WIDTH//2-110, HEIGHT//2+30, size=22)
+            draw_text(display, "Press ENTER to return to Menu", WIDTH//2-170, HEIGHT//2+90)
+            display.update()
+            lag = 0.0
+            continue
+
+        if paused:
+            # Drawn once over the frozen frame, which stays on screen.
+            if shown != "paused":
+                draw_text(display, "PAUSED - ESC to resume", WIDTH//2-140, HEIGHT//2-20, size=28)
+                display.update()
+                shown = "paused"
+            lag = 0.0
+            continue
+
+        # Run the simulation in fixed steps for the real time that passed,
+        # then draw once. If it falls too far behind, the game slows down
+        # instead of skipping ahead.
+        for _ in range(MAX_CATCHUP):
+            if lag < 1000 / FPS:
+                break
+            lag -= 1000 / FPS
+            if step(keys) == "dead":
+                # game over handling
+                if player.score > highscore:
+                    highscore = player.score
+                    save_highscore(highscore)
+                state = "gameover"
+                break
+        else:
+            lag = 0.0
+        particles.update()
+
+        # draw: erase last frame's sprites from the background grid
+        if shown != "playing":
+            display.repaint(play_background)
+            shown = "playing"
+        display.clear()
+
+        # draw sprites
+        display.blit(player.surf, player.rect)
+        display.blits([(b.image, b.rect) for b in bullets])
+        display.blits([(e.image, e.rect) for e in enemies])
+        display.blits([(p.image, p.rect) for p in powerups])
+        display.add(particles.draw(screen))
+        draw_hud()
+
+        # Secret mode banner
+        if god_mode:
+            s = text_surface("GOD MODE", 48, (255,215,0))
+            display.blit(s, (WIDTH//2 - s.get_width()//2, 40))
+
+        display.update()
+
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Batch self-play for spartan.py, for tuning its difficulty.
+
+Plays many seeded games headless with a scripted bot at the controls,
+spread over worker processes, and reports the distribution of final scores
+and levels reached and how many simulation steps ran per second. The game's
+difficulty constants can be overridden for the run, e.g.
+
+    python spartan_selfplay.py --games 2000 --workers 4 --spawn-interval 90
+
+Game n of a run is played with seed --seed + n, so results only depend on
+the seeds and overrides, not on the number of workers.
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame  # noqa: E402
+import spartan  # noqa: E402
+
+CHUNKS_PER_WORKER = 4
+# Enemies this close above the player, horizontally, are dodged.
+DODGE_RANGE = 160
+DODGE_MARGIN = 24
+
+
+class Keys:
+    """The held keys, indexable like pygame.key.get_pressed()."""
+
+    def __init__(self, *held):
+        self.held = frozenset(held)
+
+    def __getitem__(self, key):
+        return key in self.held
+
+
+NONE, LEFT, RIGHT = Keys(), Keys(pygame.K_LEFT), Keys(pygame.K_RIGHT)
+
+
+def bot():
+    """
+    Always shoot; step aside from the nearest enemy coming down on the
+    player, otherwise line up under the lowest enemy on screen.
+    """
+    player = spartan.player.rect
+    threat = target = None
+    for e in spartan.enemies:
+        rect = e.rect
+        if rect.bottom > player.top + 10:
+            continue
+        if player.top - rect.bottom < DODGE_RANGE and rect.right + DODGE_MARGIN > player.left and rect.left - DODGE_MARGIN < player.right:
+            if threat is None or rect.bottom > threat.bottom:
+                threat = rect
+        elif target is None or rect.bottom > target.bottom:
+            target = rect
+    if threat is not None:
+        if threat.centerx >= player.centerx:
+            return (LEFT if player.left > 0 else RIGHT), True
+        return (RIGHT if player.right < spartan.WIDTH else LEFT), True
+    if target is not None and abs(target.centerx - player.centerx) > spartan.PLAYER_SPEED:
+        return (LEFT if target.centerx < player.centerx else RIGHT), True
+    return NONE, True
+
+
+def configure(overrides):
+    for name, value in overrides.items():
+        setattr(spartan, name, value)
+
+
+def play(seeds, max_steps):
+    """Play one game per seed; returns [(seed, score, level, steps)] and the seconds spent."""
+    start = time.perf_counter()
+    results = [(seed,) + spartan.simulate(bot, seed, max_steps) for seed in seeds]
+    return results, time.perf_counter() - start
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def report(results, elapsed, busy):
+    scores = sorted(score for seed, score, level, steps in results)
+    steps = sum(steps for seed, score, level, steps in results)
+    print("%d games, %d steps in %.1fs: %.0f steps/s (%.0fx real time), %.0f steps/s per worker" % (
+        len(results), steps, elapsed, steps / elapsed, steps / elapsed / spartan.FPS, steps / busy,
+    ))
+    print("score  mean %.0f  min %d  p10 %d  p50 %d  p90 %d  max %d" % (
+        sum(scores) / len(scores), scores[0], percentile(scores, 0.1), percentile(scores, 0.5),
+        percentile(scores, 0.9), scores[-1],
+    ))
+    lengths = sorted(steps for seed, score, level, steps in results)
+    print("game length  p50 %.0fs  p90 %.0fs (at %d FPS)" % (
+        percentile(lengths, 0.5) / spartan.FPS, percentile(lengths, 0.9) / spartan.FPS, spartan.FPS,
+    ))
+    levels = {}
+    for seed, score, level, steps in results:
+        levels[level] = levels.get(level, 0) + 1
+    print("level reached")
+    for level in sorted(levels):
+        share = levels[level] / len(results)
+        print("  %3d  %6d  %5.1f%%  %s" % (level, levels[level], 100 * share, "#" * round(50 * share)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("--max-minutes", type=float, default=10, help="game time after which a game is stopped")
+    parser.add_argument("--spawn-interval", type=int, help="SPAWN_BASE_INTERVAL, frames between waves at level 0")
+    parser.add_argument("--enemy-speed", type=float, help="ENEMY_SPEED_BASE")
+    parser.add_argument("--level-interval", type=int, help="LEVEL_INTERVAL, frames per level")
+    args = parser.parse_args()
+
+    overrides = {}
+    for option, name in (("spawn_interval", "SPAWN_BASE_INTERVAL"), ("enemy_speed", "ENEMY_SPEED_BASE"),
+                         ("level_interval", "LEVEL_INTERVAL")):
+        if getattr(args, option) is not None:
+            overrides[name] = getattr(args, option)
+    max_steps = int(args.max_minutes * 60 * spartan.FPS)
+    seeds = list(range(args.seed, args.seed + args.games))
+    chunk = max(1, -(-len(seeds) // (args.workers * CHUNKS_PER_WORKER)))
+    chunks = [seeds[i:i + chunk] for i in range(0, len(seeds), chunk)]
+
+    start = time.perf_counter()
+    results, busy = [], 0.0
+    if args.workers == 1:
+        configure(overrides)
+        for seeds in chunks:
+            played, seconds = play(seeds, max_steps)
+            results += played
+            busy += seconds
+    else:
+        with ProcessPoolExecutor(args.workers, initializer=configure, initargs=(overrides,)) as pool:
+            for played, seconds in pool.map(play, chunks, [max_steps] * len(chunks)):
+                results += played
+                busy += seconds
+    report(results, time.perf_counter() - start, busy)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+"""
+Tests for the games; run from my-site/files with
+
+    python -m unittest discover -s tests -t .
+"""
+
+import os
+import sys
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+# snake_game.py is in my-site, next to files/, and imports files.render.
+MY_SITE = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if MY_SITE not in sys.path:
+    sys.path.append(MY_SITE)
@@ -0,0 +1,92 @@
+import random
+import unittest
+from unittest import mock
+
+import pygame
+
+import render
+
+WIDTH, HEIGHT = 200, 150
+
+
+def setUpModule():
+    pygame.init()
+    pygame.display.set_mode((WIDTH, HEIGHT))
+
+
+def draw_grid(surf):
+    surf.fill((8, 8, 24))
+    for i in range(0, WIDTH, 40):
+        pygame.draw.line(surf, (10, 10, 40), (i, 0), (i, HEIGHT), 1)
+    for j in range(0, HEIGHT, 40):
+        pygame.draw.line(surf, (10, 10, 40), (0, j), (WIDTH, j), 1)
+
+
+def sprite(size, color):
+    image = pygame.Surface((size, size), pygame.SRCALPHA)
+    pygame.draw.circle(image, color, (size // 2, size // 2), size // 2)
+    return image.convert_alpha()
+
+
+class DirtyScreenTests(unittest.TestCase):
+    def frames(self, count=30):
+        """Seeded frames of moving sprites and a changing score: [(image, pos)] each."""
+        rng = random.Random(0)
+        images = [sprite(rng.choice((6, 12, 24)), (rng.randint(0, 255), 200, 100)) for _ in range(12)]
+        pos = [[rng.randint(-20, WIDTH), rng.randint(-20, HEIGHT)] for _ in images]
+        vel = [(rng.randint(-5, 5), rng.randint(-5, 5)) for _ in images]
+        for frame in range(count):
+            for p, v in zip(pos, vel):
+                p[0] += v[0]
+                p[1] += v[1]
+            text = render.text_surface("Score: %d" % (frame // 4), 18, (255, 255, 255))
+            yield list(zip(images, [tuple(p) for p in pos])) + [(text, (4, 4))]
+
+    def assert_frames_equal_full_redraws(self):
+        screen = pygame.display.get_surface()
+        background = render.prerender((WIDTH, HEIGHT), draw_grid)
+        display = render.DirtyScreen(screen, background)
+        full = pygame.Surface((WIDTH, HEIGHT)).convert()
+        pushed = []
+        with mock.patch.object(pygame.display, "update", lambda rects=None: pushed.append(rects)):
+            for blits in self.frames():
+                display.clear()
+                display.blits(blits)
+                display.update()
+                full.blit(background, (0, 0))
+                full.blits(blits)
+                self.assertEqual(pygame.image.tobytes(screen, "RGB"), pygame.image.tobytes(full, "RGB"))
+        return pushed
+
+    def test_frame_equals_full_redraw(self):
+        pushed = self.assert_frames_equal_full_redraws()
+        self.assertIsNone(pushed[0])
+        self.assertTrue(all(rects is not None for rects in pushed[1:]))
+
+    def test_frame_equals_full_redraw_past_max_rects(self):
+        with mock.patch.object(render, "MAX_RECTS", 4):
+            pushed = self.assert_frames_equal_full_redraws()
+        self.assertEqual(pushed, [None] * len(pushed))
+
+    def test_repaint_redraws_everything(self):
+        screen = pygame.display.get_surface()
+        display = render.DirtyScreen(screen, render.prerender((WIDTH, HEIGHT), draw_grid))
+        display.clear()
+        display.update()
+        black = render.prerender((WIDTH, HEIGHT), lambda surf: surf.fill((0, 0, 0)))
+        display.repaint(black)
+        display.clear()
+        self.assertEqual(pygame.image.tobytes(screen, "RGB"), pygame.image.tobytes(black, "RGB"))
+
+
+class TextCacheTests(unittest.TestCase):
+    def test_same_key_returns_the_same_surface(self):
+        score = render.text_surface("Score: 10", 18, (255, 255, 255))
+        self.assertIs(render.text_surface("Score: 10", 18, (255, 255, 255)), score)
+        self.assertIsNot(render.text_surface("Score: 10", 18, (255, 215, 0)), score)
+        self.assertIsNot(render.text_surface("Score: 20", 18, (255, 255, 255)), score)
+        self.assertIs(render.get_font("Consolas", 18), render.get_font("Consolas", 18))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import random
+import unittest
+
+import snake_game
+from snake_game import DOWN, LEFT, RIGHT, UP, Board, hamiltonian_cycle
+
+
+class BoardTests(unittest.TestCase):
+    def assert_consistent(self, board):
+        cells = board.cols * board.rows
+        body = set(board.body)
+        self.assertEqual(len(body), len(board.body))
+        self.assertEqual([cell for cell in range(cells) if board.occupied[cell]], sorted(body))
+        self.assertEqual(sorted(board.free), sorted(set(range(cells)) - body))
+        for index, cell in enumerate(board.free):
+            self.assertEqual(board.slot[cell], index)
+        if board.meal is not None:
+            self.assertNotIn(board.meal, body)
+
+    def test_cells_stay_consistent_while_eating_and_moving(self):
+        rng = random.Random(0)
+        board = Board(8, 6, rng=rng)
+        results = {"ate": 0, "moved": 0}
+        for step in range(400):
+            safe = [d for d in (UP, DOWN, LEFT, RIGHT) if not board.occupied[board.next_cell(d)]]
+            if not safe:
+                break
+            direction = rng.choice(safe)
+            if step % 3 == 0:
+                board.meal = board.next_cell(direction)  # eat every third move
+            head, tail, length = board.next_cell(direction), board.body[-1], len(board.body)
+            result = board.move(direction)
+            results[result] += 1
+            self.assertEqual(board.body[0], head)
+            self.assertEqual(len(board.body), length + (result == "ate"))
+            self.assertEqual(board.occupied[tail], result == "ate")
+            self.assert_consistent(board)
+        self.assertGreater(results["ate"], 10)
+        self.assertGreater(results["moved"], 10)
+
+    def test_moving_into_the_body_is_death(self):
+        board = Board(6, 4, start=0)
+        for direction in (RIGHT, RIGHT, DOWN, LEFT):
+            board.meal = board.next_cell(direction)
+            self.assertEqual(board.move(direction), "ate")
+        self.assertEqual(board.move(UP), "dead")
+        self.assert_consistent(board)
+
+    def test_auto_play_fills_the_board(self):
+        for cols, rows in ((6, 4), (5, 4), (4, 5)):
+            with self.subTest(size="%dx%d" % (cols, rows)):
+                board = Board(cols, rows, rng=random.Random(cols))
+                cycle = hamiltonian_cycle(cols, rows)
+                for _ in range(cols * rows * cols * rows):
+                    self.assertNotEqual(board.move(cycle[board.body[0]]), "dead")
+                    if board.full():
+                        break
+                self.assertTrue(board.full())
+                self.assertEqual(len(board.body), cols * rows)
+                self.assertIsNone(board.meal)
+                self.assert_consistent(board)
+
+    def test_no_cycle_on_odd_by_odd_boards(self):
+        with self.assertRaises(ValueError):
+            hamiltonian_cycle(5, 3)
+
+    def test_import_opens_no_window(self):
+        self.assertIsNone(snake_game.screen)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+import os
+import random
+import subprocess
+import sys
+import unittest
+from collections import defaultdict
+from unittest import mock
+
+import numpy as np
+import pygame
+
+import spartan
+
+WIDTH, HEIGHT = 160, 120
+BACKGROUND = (8, 8, 24)
+
+
+def setUpModule():
+    spartan.init_display()
+
+
+def scene(colors, bursts=40, amount=30):
+    """Overlapping bursts, the last few still stacked where they spawned."""
+    system = spartan.ParticleSystem(4096, seed=0)
+    rng = random.Random(0)
+    for i in range(bursts):
+        system.spawn(rng.randint(0, WIDTH), rng.randint(0, HEIGHT), amount, colors[i % len(colors)])
+        if i < bursts - 4:
+            system.update()
+    return system
+
+
+def draw(system, limit):
+    surf = pygame.Surface((WIDTH, HEIGHT)).convert()
+    surf.fill(BACKGROUND)
+    with mock.patch.object(spartan, "PARTICLE_BLIT_LIMIT", limit):
+        system.draw(surf)
+    return pygame.surfarray.array3d(surf).astype(int)
+
+
+def coverage(system, color):
+    """Pixels covered by the live particles of one palette color."""
+    covered = np.zeros((WIDTH, HEIGHT), dtype=bool)
+    live = np.flatnonzero(system.alive & (system.color == color))
+    for x, y in system.pos[live].astype(np.int32).tolist():
+        covered[max(x, 0):max(x + spartan.PARTICLE_SIZE, 0), max(y, 0):max(y + spartan.PARTICLE_SIZE, 0)] = True
+    return covered
+
+
+class ParticleDrawTests(unittest.TestCase):
+    def test_layer_matches_blits(self):
+        system = scene([(255, 220, 80)])
+        blits, layer = draw(system, sys.maxsize), draw(system, 0)
+        self.assertGreater(np.abs(blits - BACKGROUND).max(), 200)
+        self.assertLessEqual(np.abs(blits - layer).max(), 3)
+
+    def test_layer_differs_only_where_colors_overlap(self):
+        system = scene([(255, 220, 80), (255, 80, 80), (80, 80, 255)])
+        blits, layer = draw(system, sys.maxsize), draw(system, 0)
+        mixed = sum(coverage(system, color).astype(int) for color in range(len(system.sprites))) > 1
+        differs = np.abs(blits - layer).max(axis=2) > 3
+        self.assertTrue(differs.any())
+        self.assertFalse((differs & ~mixed).any())
+
+
+def random_sprites(rng, enemy_count, bullet_count):
+    enemies = [spartan.Enemy(rng.randint(-40, spartan.WIDTH + 40), rng.randint(-40, spartan.HEIGHT + 40), 0, 0,
+                             size=rng.choice((20, 22, 40, 90))) for _ in range(enemy_count)]
+    bullets = [spartan.Bullet(rng.randint(-10, spartan.WIDTH + 10), rng.randint(-10, spartan.HEIGHT + 10), 0,
+                              power=rng.randint(1, 3)) for _ in range(bullet_count)]
+    return enemies, bullets
+
+
+def hit_indices(hits, enemies, bullets):
+    return [(enemies.index(e), [bullets.index(b) for b in blist]) for e, blist in hits.items()]
+
+
+def rect_arrays(rects):
+    return spartan.sprite_rects([mock.Mock(rect=rect) for rect in rects])
+
+
+class CollisionTests(unittest.TestCase):
+    def tearDown(self):
+        spartan.enemies.empty()
+        spartan.bullets.empty()
+
+    def assert_hits_match_groupcollide(self, enemy_count, bullet_count, grid):
+        es, bs = random_sprites(random.Random(enemy_count), enemy_count, bullet_count)
+        spartan.enemies.add(es)
+        spartan.bullets.add(bs)
+        with mock.patch.object(spartan, "grid_collide", wraps=spartan.grid_collide) as grid_collide:
+            hits = spartan.bullet_hits()
+        self.assertEqual(grid_collide.called, grid)
+        # The same sprites again, through pygame's own pairwise test.
+        es2, bs2 = random_sprites(random.Random(enemy_count), enemy_count, bullet_count)
+        expected = pygame.sprite.groupcollide(pygame.sprite.Group(es2), pygame.sprite.Group(bs2), False, True)
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(hit_indices(hits, es, bs), hit_indices(expected, es2, bs2))
+        self.assertEqual([b.alive() for b in bs], [b.alive() for b in bs2])
+
+    def test_few_sprites_collide_like_groupcollide(self):
+        self.assertLessEqual(40 * 60, spartan.GRID_PAIRS)
+        self.assert_hits_match_groupcollide(40, 60, grid=False)
+
+    def test_grid_collides_like_groupcollide(self):
+        self.assertGreater(300 * 400, spartan.GRID_PAIRS)
+        self.assert_hits_match_groupcollide(300, 400, grid=True)
+
+    def test_grid_collide_finds_every_overlapping_pair(self):
+        rng = random.Random(7)
+        a = [pygame.Rect(rng.randint(-200, 900), rng.randint(-200, 700), rng.randint(1, 200), rng.randint(1, 200))
+             for _ in range(300)]
+        b = [pygame.Rect(rng.randint(-200, 900), rng.randint(-200, 700), rng.randint(1, 30), rng.randint(1, 30))
+             for _ in range(300)]
+        i, j = spartan.grid_collide(rect_arrays(a), rect_arrays(b))
+        expected = {(n, m) for n, r in enumerate(a) for m, q in enumerate(b) if r.colliderect(q)}
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(set(zip(i.tolist(), j.tolist())), expected)
+
+
+class HeadlessTests(unittest.TestCase):
+    def test_import_opens_no_window(self):
+        code = "import pygame, spartan; print(pygame.display.get_init(), pygame.display.get_surface())"
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(spartan.__file__)))
+        self.assertEqual(result.stdout.split()[-2:], ["False", "None"])
+
+    def test_simulate_ages_the_particles_every_step(self):
+        with mock.patch.object(spartan.particles, "update", wraps=spartan.particles.update) as update:
+            score, level, steps = spartan.simulate(lambda: (defaultdict(bool), True), seed=3, max_steps=300)
+        self.assertEqual(update.call_count, steps)
+
+
+if __name__ == "__main__":
+    unittest.main()
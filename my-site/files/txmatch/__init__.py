@@ -0,0 +1,16 @@
+"""
+txmatch - match the pre- and post-release Splunk transaction exports.
+
+The field weights and validation rules come from a spec CSV such as
+AD-TransactionAnalysis-Fields.csv. Run it as
+
+    python -m txmatch splunk_log_data_pre.csv splunk_log_data_post.csv
+
+from my-site/files. Needs NumPy (and openpyxl for .xlsx exports).
+
+Exports that are matched repeatedly can be converted once into columnar
+caches (python -m txmatch.columnar EXPORT...), which later runs open
+through memory maps instead of re-parsing. For exports that grow between
+runs, --state PATH keeps the matches in a SQLite file and only re-scores
+what changed (see incremental.py).
+"""
@@ -0,0 +1,74 @@
+"""Command line: python -m txmatch PRE.csv POST.csv [--out matches.csv]"""
+
+import argparse
+import json
+import sys
+import time
+
+from . import incremental
+from .engine import DEFAULT_MEMORY_BUDGET, JOIN_KEYS, MATCH_THRESHOLD, SHARDS_PER_WORKER, Matcher, match_files
+from .spec import DEFAULT_SPEC, load_spec
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="txmatch", description="Match pre/post release Splunk exports.")
+    parser.add_argument("pre")
+    parser.add_argument("post")
+    parser.add_argument("--spec", default=DEFAULT_SPEC, help="Field weights and rules (default: %(default)s)")
+    parser.add_argument("--out", help="Write one CSV row per pair here ('-' for stdout)")
+    parser.add_argument("--threshold", type=float, default=MATCH_THRESHOLD, help="Score counted as a match")
+    parser.add_argument("--join-key", action="append", default=[], metavar="FIELD",
+                        help="Pair records by FIELD, tried in the order given (repeatable); default: the spec's"
+                        " Join Key column, or %s" % ", ".join(JOIN_KEYS))
+    parser.add_argument("--memory-mb", type=int, default=DEFAULT_MEMORY_BUDGET // 2**20,
+                        help="Memory budget; larger pre exports are partitioned on disk")
+    parser.add_argument("--partitions", type=int, help="Override the number of partitions")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Join partitions on this many processes; implies %d partitions per worker unless"
+                        " --partitions (at least one per worker) is given. Reading and partitioning the exports"
+                        " stays in one process" % SHARDS_PER_WORKER)
+    parser.add_argument("--state", metavar="PATH",
+                        help="Incremental mode (CSV exports): keep match state in this SQLite file, re-score only"
+                        " what changed since the last run and print the regression report with its diff")
+    parser.add_argument("--block-on", action="append", default=[], metavar="FIELD",
+                        help="Pair records with no join key by similar text in FIELD (repeatable; in-memory joins"
+                        " only, so not with --partitions, --workers or --state)")
+    args = parser.parse_args(argv)
+
+    matcher = Matcher(load_spec(args.spec), threshold=args.threshold, join_keys=args.join_key,
+                      block_fields=args.block_on)
+    if args.state:
+        if args.out:
+            parser.error("--out cannot be used with --state")
+        if args.block_on:
+            parser.error("--block-on cannot be used with --state")
+        start = time.perf_counter()
+        result = incremental.run(args.pre, args.post, matcher, args.state)
+        result["seconds"] = round(time.perf_counter() - start, 3)
+        json.dump(result, sys.stdout, indent=2)
+        print()
+        return
+    out = None
+    if args.out == "-":
+        out = sys.stdout
+    elif args.out:
+        out = open(args.out, "w", newline="", encoding="utf-8")
+    start = time.perf_counter()
+    try:
+        summary = match_files(args.pre, args.post, matcher, out=out, memory_budget=args.memory_mb * 2**20,
+                              partitions=args.partitions, chunk_size=args.chunk_size, workers=args.workers)
+    except ValueError as exc:
+        parser.error(str(exc))
+    finally:
+        if out not in (None, sys.stdout):
+            out.close()
+    result = summary.as_dict()
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    result["partition_seconds"] = round(summary.partition_seconds, 3)
+    json.dump(result, sys.stderr if out is sys.stdout else sys.stdout, indent=2)
+    print(file=sys.stderr if out is sys.stdout else sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
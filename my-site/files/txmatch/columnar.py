@@ -0,0 +1,289 @@
+"""
+Columnar cache of a parsed export, read back through memory maps.
+
+    python -m txmatch.columnar splunk_log_data_pre.csv splunk_log_data_post.xlsx
+
+writes a directory next to each export (splunk_log_data_pre.csv.txc, ...)
+that can be passed wherever an export path is accepted. Every column is
+stored on its own, so a run only reads the columns its spec needs:
+
+  meta.json               row count, the source's size and mtime, and the
+                          encoding of each column
+  NNN.codes.npy           dictionary-encoded column: one code per row, the
+                          values themselves listed in meta.json
+  NNN.offsets.npy         plain column: row i is the UTF-8 text
+  NNN.data                data[offsets[i]:offsets[i + 1]]
+  NNN.lit.offsets.npy     columns of Python-literal dicts: the parsed dict
+  NNN.lit.data            of each row (or dictionary value), marshalled, so
+                          it is not parsed again
+"""
+
+import argparse
+import json
+import marshal
+import mmap
+import os
+import sys
+import time
+from array import array
+
+import numpy as np
+
+from .records import iter_rows
+from .rules import LiteralText, parse_literal
+
+VERSION = 1
+SUFFIX = ".txc"
+# A column is dictionary-encoded when it has at most this many distinct
+# values and they are at most half its rows.
+DICTIONARY_LIMIT = 65535
+# A column is stored parsed when at least this share of its values are dicts.
+LITERAL_SHARE = 0.5
+BLOCK_ROWS = 65536
+# Offsets and codes are buffered in memory this many at a time while a
+# column is written.
+FLUSH_ITEMS = 65536
+
+
+def cache_path(path):
+    return path.rstrip(os.sep) + SUFFIX
+
+
+def source_stamp(path):
+    stat = os.stat(path)
+    return {"name": os.path.basename(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def is_fresh(path, target=None):
+    """Whether the cache of `path` exists and was built from its current contents."""
+    try:
+        with open(os.path.join(target or cache_path(path), "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return meta.get("version") == VERSION and meta.get("source") == source_stamp(path)
+
+
+class _Spool:
+    """
+    An integer array written to a raw file FLUSH_ITEMS at a time, then
+    saved as an .npy file, so that a column's offsets or codes are never
+    all in memory.
+    """
+
+    def __init__(self, path, typecode, dtype):
+        self.path = path
+        self.dtype = dtype
+        self.file = open(path, "wb")
+        self.buffer = array(typecode)
+        self.count = 0
+
+    def append(self, value):
+        self.buffer.append(value)
+        if len(self.buffer) >= FLUSH_ITEMS:
+            self.flush()
+
+    def flush(self):
+        self.buffer.tofile(self.file)
+        self.count += len(self.buffer)
+        del self.buffer[:]
+
+    def save(self, target, dtype=None):
+        """Write the array to the .npy file at target, converted to dtype on the way, and drop the raw file."""
+        self.flush()
+        self.file.close()
+        dtype = np.dtype(dtype or self.dtype)
+        with open(target, "wb") as out, open(self.path, "rb") as f:
+            np.lib.format.write_array_header_1_0(
+                out, {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False, "shape": (self.count,)},
+            )
+            while True:
+                chunk = np.fromfile(f, dtype=self.dtype, count=FLUSH_ITEMS)
+                if not chunk.size:
+                    break
+                chunk.astype(dtype).tofile(out)
+        os.remove(self.path)
+
+    def discard(self):
+        self.file.close()
+        os.remove(self.path)
+
+
+class _ColumnWriter:
+    """Streams one column to disk as plain text, tracking its dictionary while it stays small."""
+
+    def __init__(self, directory, index, name):
+        self.prefix = os.path.join(directory, "%03d" % index)
+        self.name = name
+        self.rows = 0
+        self.end = 0
+        self.offsets = _Spool(self.prefix + ".offsets.raw", "q", np.int64)
+        self.offsets.append(0)
+        self.data = open(self.prefix + ".data", "wb")
+        self.dictionary = {}
+        self.codes = _Spool(self.prefix + ".codes.raw", "I", np.uint32)
+
+    def add(self, value):
+        self.rows += 1
+        encoded = value.encode("utf-8")
+        self.data.write(encoded)
+        self.end += len(encoded)
+        self.offsets.append(self.end)
+        if self.dictionary is not None:
+            self.codes.append(self.dictionary.setdefault(value, len(self.dictionary)))
+            if len(self.dictionary) > DICTIONARY_LIMIT:
+                self.codes.discard()
+                self.dictionary = self.codes = None
+
+    def _texts(self):
+        read = _blobs(self.prefix)
+        for start in range(0, self.rows, BLOCK_ROWS):
+            for blob in read(start, min(self.rows, start + BLOCK_ROWS)):
+                yield blob.decode("utf-8")
+
+    def _write_literals(self, values):
+        """Marshal parse_literal() of each value; False (and no file) unless enough of them are dicts."""
+        offsets = _Spool(self.prefix + ".lit.offsets.raw", "q", np.int64)
+        offsets.append(0)
+        end = found = nonempty = 0
+        with open(self.prefix + ".lit.data", "wb") as f:
+            for value in values:
+                literal = parse_literal(value) if value else None
+                nonempty += bool(value)
+                found += literal is not None
+                try:
+                    encoded = marshal.dumps(literal)
+                except ValueError:
+                    encoded = marshal.dumps(None)
+                f.write(encoded)
+                end += len(encoded)
+                offsets.append(end)
+        if nonempty and found >= LITERAL_SHARE * nonempty:
+            offsets.save(self.prefix + ".lit.offsets.npy")
+            return True
+        offsets.discard()
+        os.remove(self.prefix + ".lit.data")
+        return False
+
+    def close(self):
+        self.data.close()
+        if self.dictionary is not None and len(self.dictionary) <= max(1, self.rows // 2):
+            dtype = np.uint8 if len(self.dictionary) <= 256 else np.uint16
+            self.codes.save(self.prefix + ".codes.npy", dtype)
+            self.offsets.discard()
+            os.remove(self.prefix + ".data")
+            values = list(self.dictionary)
+            return {"name": self.name, "encoding": "dictionary", "values": values,
+                    "literal": self._write_literals(values)}
+        if self.codes is not None:
+            self.codes.discard()
+        self.offsets.save(self.prefix + ".offsets.npy")
+        return {"name": self.name, "encoding": "plain", "literal": self._write_literals(self._texts())}
+
+
+def ingest(path, target=None, force=False):
+    """Write the columnar cache of an export (CSV or .xlsx) unless it is fresh; returns its path."""
+    target = target or cache_path(path)
+    if not force and is_fresh(path, target):
+        return target
+    stamp = source_stamp(path)
+    building = target + ".tmp"
+    if os.path.isdir(building):
+        for entry in os.scandir(building):
+            os.remove(entry.path)
+    else:
+        os.makedirs(building)
+    writers = None
+    rows = 0
+    for number, row in iter_rows(path):
+        if writers is None:
+            writers = [_ColumnWriter(building, i, name) for i, name in enumerate(row)]
+        for writer, value in zip(writers, row.values()):
+            writer.add(value or "")
+        rows += 1
+    columns = [writer.close() for writer in writers or ()]
+    with open(os.path.join(building, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"version": VERSION, "source": stamp, "rows": rows, "columns": columns}, f)
+    if os.path.isdir(target):
+        for entry in os.scandir(target):
+            os.remove(entry.path)
+        os.rmdir(target)
+    os.rename(building, target)
+    return target
+
+
+def _map(path):
+    with open(path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _blobs(prefix):
+    """Reader of the (offsets, data) pair at prefix: read(start, stop) -> list of bytes."""
+    offsets = np.load(prefix + ".offsets.npy", mmap_mode="r")
+    data = _map(prefix + ".data")
+
+    def read(start, stop):
+        bounds = offsets[start:stop + 1].tolist()
+        return [data[bounds[i]:bounds[i + 1]] for i in range(len(bounds) - 1)]
+    return read
+
+
+class ColumnarExport:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != VERSION:
+            raise ValueError("%s: unsupported columnar cache version %r" % (path, meta.get("version")))
+        self.rows = meta["rows"]
+        self.columns = {column["name"]: (i, column) for i, column in enumerate(meta["columns"])}
+
+    def _reader(self, name):
+        """read(start, stop) -> the column's values for rows [start, stop), numbered from 0."""
+        index, column = self.columns[name]
+        prefix = os.path.join(self.path, "%03d" % index)
+        literals = None
+        if column["literal"]:
+            literals = _blobs(prefix + ".lit")
+        if column["encoding"] == "dictionary":
+            codes = np.load(prefix + ".codes.npy", mmap_mode="r")
+            values = column["values"]
+            if literals is not None:
+                parsed = [marshal.loads(blob) for blob in literals(0, len(values))]
+                values = [LiteralText(value, literal) for value, literal in zip(values, parsed)]
+            return lambda start, stop: [values[code] for code in codes[start:stop].tolist()]
+        texts = _blobs(prefix)
+        if literals is None:
+            return lambda start, stop: [blob.decode("utf-8") for blob in texts(start, stop)]
+        return lambda start, stop: [
+            LiteralText(blob.decode("utf-8"), marshal.loads(literal))
+            for blob, literal in zip(texts(start, stop), literals(start, stop))
+        ]
+
+    def iter_rows(self, columns=None):
+        names = [name for name in (columns or self.columns) if name in self.columns]
+        readers = [self._reader(name) for name in names]
+        for start in range(0, self.rows, BLOCK_ROWS):
+            stop = min(self.rows, start + BLOCK_ROWS)
+            blocks = [read(start, stop) for read in readers]
+            for offset, values in enumerate(zip(*blocks)):
+                yield start + offset + 1, dict(zip(names, values))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="txmatch.columnar", description="Build columnar caches of exports.")
+    parser.add_argument("exports", nargs="+", help="CSV or .xlsx exports")
+    parser.add_argument("--force", action="store_true", help="Rebuild caches that are up to date")
+    args = parser.parse_args(argv)
+    for path in args.exports:
+        start = time.perf_counter()
+        fresh = not args.force and is_fresh(path)
+        target = ingest(path, force=args.force)
+        print("%s -> %s (%s, %.3fs)" % (path, target, "up to date" if fresh else "built", time.perf_counter() - start),
+              file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,507 @@
+"""
+Match post-release records to pre-release records and score each pair.
+
+Pre records are the build side of a hash join: they are indexed by every
+join key (the spec's Join Key column, by default Session ID first, then
+User ID) and post records are streamed past the index in chunks, so each
+post record is scored only against the pre records that share a key with
+it. When the pre export is too large for the memory budget the join
+becomes a grace hash join: one pass per join key, in which both sides
+are split into partition files by a hash of that key and joined a
+partition at a time. Post records without a candidate are carried over
+to the next key's pass. The partitions of a pass are independent shards,
+so with several workers they are joined on a process pool. Reading the
+exports and writing the partitions stays in the parent process (the pre
+export is read once for every pass); that share of the run,
+Summary.partition_seconds, bounds what more workers can gain.
+
+Candidates are scored a probe chunk at a time, so that the fuzzy rules
+can compare all of a chunk's strings in one vectorized batch (see
+similarity.py). With block fields set, an in-memory join also tries post
+records that share no key with any pre record against the pre records
+whose block field text is similar, found by MinHash LSH. Blocking needs
+every pre record at hand, so it cannot be combined with partitions.
+"""
+
+import csv
+import math
+import os
+import shutil
+import tempfile
+import time
+import zlib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+
+from .records import export_size, iter_rows, read_chunks
+from .rules import COMPARATORS
+from .similarity import BATCH_COMPARATORS, MinHashLSH
+from .spec import ranked_join_keys
+
+# Join keys of specs without a Join Key column.
+JOIN_KEYS = ("Session ID", "User ID")
+MATCH_THRESHOLD = 0.8
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+# Parsed rows take roughly this many times their size on disk.
+ROW_EXPANSION = 4
+# Most LSH candidates scored for one post record: the most similar ones
+# by their MinHash estimate, the rest are not scored.
+BLOCK_LIMIT = 50
+TOP_MISMATCHES = 20
+# With several workers, each gets about this many shards per join key, so
+# that an uneven shard does not leave the others idle.
+SHARDS_PER_WORKER = 4
+
+# post/pre are row numbers (None for a record without a counterpart) and
+# `join` names the key the pair was found by.
+Match = namedtuple("Match", "post pre join score fields")
+
+
+class Matcher:
+    def __init__(self, spec, threshold=MATCH_THRESHOLD, join_keys=None, block_fields=()):
+        """join_keys defaults to the spec's ranked Join Key fields, or JOIN_KEYS if it has none."""
+        self.spec = spec
+        self.threshold = threshold
+        self.join_keys = tuple(join_keys or ranked_join_keys(spec) or JOIN_KEYS)
+        self.block_fields = tuple(block_fields)
+        self.fields = [rule.field for rule in spec]
+        # Match group -> the (field position, weight) of its rules, in spec order.
+        self.groups = {}
+        for i, rule in enumerate(spec):
+            self.groups.setdefault(rule.group, []).append((i, rule.weight))
+        # Every column a run reads; exports are read with only these.
+        self.columns = list(dict.fromkeys([*self.join_keys, *self.fields, *self.block_fields]))
+        self._rules = [
+            (rule.field, rule.weight, BATCH_COMPARATORS.get(rule.rule), COMPARATORS[rule.rule], rule.threshold)
+            for rule in spec
+        ]
+
+    def score(self, pre, post):
+        """
+        Weighted score of a pair and the per-field scores. Fields missing
+        from either record are left out of the weighting (score None).
+        """
+        return self.score_pairs([(pre, post)])[0]
+
+    def score_pairs(self, pairs):
+        """score() of each (pre, post) pair; rules with a batch comparator score a field's pairs at once."""
+        columns = []
+        for field, weight, batch, compare, threshold in self._rules:
+            column = [None] * len(pairs)
+            present = [i for i, (pre, post) in enumerate(pairs) if pre.get(field) is not None and post.get(field) is not None]
+            if batch is not None and present:
+                values = batch([pairs[i][0][field] for i in present], [pairs[i][1][field] for i in present], threshold)
+                for i, value in zip(present, values.tolist()):
+                    column[i] = value
+            else:
+                for i in present:
+                    column[i] = compare(pairs[i][0][field], pairs[i][1][field], threshold)
+            columns.append((weight, column))
+        results = []
+        for i in range(len(pairs)):
+            total = weights = 0.0
+            for weight, column in columns:
+                if column[i] is not None:
+                    total += weight * column[i]
+                    weights += weight
+            results.append(((total / weights if weights else 0.0), [column[i] for weight, column in columns]))
+        return results
+
+    def build_index(self, pre_rows, keys=None):
+        index = {key: {} for key in keys or self.join_keys}
+        for number, row in pre_rows:
+            for key in index:
+                value = row.get(key)
+                if value:
+                    index[key].setdefault(value, []).append((number, row))
+        return index
+
+    def probe(self, index, post_rows, used, blocker=None):
+        """
+        Best pre candidate for each post row, trying the indexed join keys in
+        order and then the blocker, if given. Of candidates with the same
+        score the first wins, which for the index is the first in pre row
+        order.
+        """
+        pending = []
+        pairs = []
+        for number, row in post_rows:
+            candidates, join = (), ""
+            for key in index:
+                value = row.get(key)
+                candidates = index[key].get(value, ()) if value else ()
+                if candidates:
+                    join = key
+                    break
+            if not candidates and blocker is not None:
+                candidates, join = blocker.candidates(row), "lsh"
+            pending.append((number, join, len(pairs), len(candidates)))
+            pairs.extend((pre_number, pre, row) for pre_number, pre in candidates)
+        scores = self.score_pairs([(pre, row) for pre_number, pre, row in pairs])
+        for number, join, start, count in pending:
+            if not count:
+                yield Match(number, None, "", 0.0, [None] * len(self.fields))
+                continue
+            best = max(range(start, start + count), key=lambda i: scores[i][0])
+            used.add(pairs[best][0])
+            yield Match(number, pairs[best][0], join, scores[best][0], scores[best][1])
+
+    def join(self, pre_rows, post_rows, chunk_size=10000):
+        """Match in memory: pre_rows is materialized, post_rows streamed."""
+        pre_rows = list(pre_rows)
+        index = self.build_index(pre_rows)
+        blocker = Blocker(self.block_fields, pre_rows) if self.block_fields else None
+        used = RowSet()
+        for chunk in read_chunks(post_rows, chunk_size):
+            yield from self.probe(index, chunk, used, blocker)
+        for number, row in pre_rows:
+            if number not in used:
+                yield Match(None, number, "", 0.0, [None] * len(self.fields))
+
+
+class Blocker:
+    """Pre rows bucketed by MinHash LSH over the text of the block fields."""
+
+    def __init__(self, fields, pre_rows, limit=BLOCK_LIMIT):
+        self.fields = fields
+        self.limit = limit
+        self.lsh = MinHashLSH()
+        self.rows = {}
+        for number, row in pre_rows:
+            text = self.text(row)
+            if text:
+                self.lsh.add(number, text)
+                self.rows[number] = row
+
+    def text(self, row):
+        return " ".join(row.get(field) or "" for field in self.fields).strip()
+
+    def candidates(self, row):
+        text = self.text(row)
+        if not text:
+            return []
+        return [(number, self.rows[number]) for number in self.lsh.query(text, self.limit)]
+
+
+class RowSet:
+    """Set of row numbers as a bitmap: one bit per row of the export."""
+
+    def __init__(self):
+        self.bits = bytearray()
+
+    def add(self, number):
+        byte = number >> 3
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(max(byte + 1 - len(self.bits), len(self.bits))))
+        self.bits[byte] |= 1 << (number & 7)
+
+    def __contains__(self, number):
+        byte = number >> 3
+        return byte < len(self.bits) and bool(self.bits[byte] & (1 << (number & 7)))
+
+    def update(self, other):
+        if len(other.bits) > len(self.bits):
+            self.bits.extend(bytes(len(other.bits) - len(self.bits)))
+        for i, byte in enumerate(other.bits):
+            if byte:
+                self.bits[i] |= byte
+
+
+class SpillFile:
+    """Rows (with their row numbers) written to a CSV file and read back."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = None
+
+    def write(self, number, row):
+        if self._writer is None:
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(["__row__"] + list(row))
+        self._writer.writerow([number] + list(row.values()))
+
+    def close(self):
+        self._file.close()
+
+    def __iter__(self):
+        return read_spill(self.path)
+
+
+def read_spill(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            yield int(row.pop("__row__")), row
+
+
+def partition(rows, key, parts, directory, name, keyless=None):
+    """
+    Spill rows into `parts` files by a hash of `key`. Rows without a value
+    for the key go to `keyless` (a SpillFile) if given, else are dropped.
+    """
+    files = [SpillFile(os.path.join(directory, "%s-%04d.csv" % (name, i))) for i in range(parts)]
+    try:
+        for number, row in rows:
+            value = row.get(key)
+            if value:
+                files[zlib.crc32(value.encode()) % parts].write(number, row)
+            elif keyless is not None:
+                keyless.write(number, row)
+    finally:
+        for f in files:
+            f.close()
+    return files
+
+
+def partition_keys(rows, keys, parts, directory, name):
+    """
+    partition() of the same rows on each of `keys`, in one pass over them:
+    a list of files per key, and the number of rows read.
+    """
+    files = [
+        [SpillFile(os.path.join(directory, "%s-%d-%04d.csv" % (name, k, i))) for i in range(parts)]
+        for k in range(len(keys))
+    ]
+    count = 0
+    try:
+        for number, row in rows:
+            count += 1
+            for key, key_files in zip(keys, files):
+                value = row.get(key)
+                if value:
+                    key_files[zlib.crc32(value.encode()) % parts].write(number, row)
+    finally:
+        for key_files in files:
+            for f in key_files:
+                f.close()
+    return files, count
+
+
+class Summary:
+    def __init__(self, matcher, bins=10, top=TOP_MISMATCHES):
+        self.matcher = matcher
+        self.top = top
+        self.post_rows = self.pre_only = self.unmatched = self.matched = 0
+        self.joins = {}
+        self.histogram = [0] * bins
+        # Time the parent process spent reading and partitioning the exports.
+        self.partition_seconds = 0.0
+        self.field_totals = [0.0] * len(matcher.fields)
+        self.field_counts = [0] * len(matcher.fields)
+        # Sums and counts of each match group's weighted score, over the pairs
+        # that have at least one of its fields.
+        self.group_totals = dict.fromkeys(matcher.groups, 0.0)
+        self.group_counts = dict.fromkeys(matcher.groups, 0)
+        # The lowest-scoring pairs below the threshold, ordered by (score, post row).
+        self.mismatches = []
+
+    def add(self, match):
+        if match.post is None:
+            self.pre_only += 1
+            return
+        self.post_rows += 1
+        if match.pre is None:
+            self.unmatched += 1
+            return
+        self.joins[match.join] = self.joins.get(match.join, 0) + 1
+        if match.score >= self.matcher.threshold:
+            self.matched += 1
+        elif self.top:
+            self.mismatches.append(match)
+            if len(self.mismatches) > 2 * self.top:
+                self._trim()
+        self.histogram[min(len(self.histogram) - 1, int(match.score * len(self.histogram)))] += 1
+        for i, value in enumerate(match.fields):
+            if value is not None:
+                self.field_totals[i] += value
+                self.field_counts[i] += 1
+        for group, rules in self.matcher.groups.items():
+            total = weights = 0.0
+            for i, weight in rules:
+                if match.fields[i] is not None:
+                    total += weight * match.fields[i]
+                    weights += weight
+            if weights:
+                self.group_totals[group] += total / weights
+                self.group_counts[group] += 1
+
+    def _trim(self):
+        self.mismatches.sort(key=lambda match: (match.score, match.post))
+        del self.mismatches[self.top:]
+
+    def merge(self, other):
+        """Add another Summary's counts, e.g. one shard's."""
+        self.post_rows += other.post_rows
+        self.pre_only += other.pre_only
+        self.unmatched += other.unmatched
+        self.matched += other.matched
+        for join, count in other.joins.items():
+            self.joins[join] = self.joins.get(join, 0) + count
+        self.histogram = [a + b for a, b in zip(self.histogram, other.histogram)]
+        self.field_totals = [a + b for a, b in zip(self.field_totals, other.field_totals)]
+        self.field_counts = [a + b for a, b in zip(self.field_counts, other.field_counts)]
+        for group in self.group_totals:
+            self.group_totals[group] += other.group_totals[group]
+            self.group_counts[group] += other.group_counts[group]
+        self.mismatches.extend(other.mismatches)
+        self._trim()
+
+    def as_dict(self):
+        self._trim()
+        return {
+            "post_rows": self.post_rows,
+            "paired": self.post_rows - self.unmatched,
+            "matched": self.matched,
+            "post_without_pre": self.unmatched,
+            "pre_without_post": self.pre_only,
+            "joins": self.joins,
+            "histogram": self.histogram,
+            "group_means": {
+                group: round(total / self.group_counts[group], 4) if self.group_counts[group] else None
+                for group, total in self.group_totals.items()
+            },
+            "field_means": {
+                field: round(total / count, 4) if count else None
+                for field, total, count in zip(self.matcher.fields, self.field_totals, self.field_counts)
+            },
+            "top_mismatches": [
+                {
+                    "post_row": match.post,
+                    "pre_row": match.pre,
+                    "join": match.join,
+                    "score": round(match.score, 4),
+                    "fields": [field for field, value in zip(self.matcher.fields, match.fields)
+                               if value is not None and value < 1],
+                }
+                for match in self.mismatches
+            ],
+        }
+
+
+def write_header(writer, matcher):
+    writer.writerow(["post_row", "pre_row", "join", "score", "matched"] + matcher.fields)
+
+
+def write_match(writer, matcher, match):
+    writer.writerow(
+        [match.post or "", match.pre or "", match.join, "%.4f" % match.score, int(match.score >= matcher.threshold)]
+        + ["" if value is None else "%.4g" % value for value in match.fields]
+    )
+
+
+def join_shard(matcher, pre_path, post_path, key, last, chunk_size, out_path, leftover_path):
+    """
+    Join one partition pair on `key`: matches go to the CSV at out_path and,
+    except on the last pass, post rows without a candidate to the spill file
+    at leftover_path. Returns the shard's Summary and the pre rows it used.
+    """
+    summary = Summary(matcher)
+    used = RowSet()
+    leftover = None if last else SpillFile(leftover_path)
+    index = matcher.build_index(read_spill(pre_path), [key])
+    with open(out_path, "w", newline="", encoding="utf-8") as out:
+        writer = csv.writer(out)
+        for chunk in read_chunks(read_spill(post_path), chunk_size):
+            rows = dict(chunk)
+            for match in matcher.probe(index, chunk, used):
+                if match.pre is None and leftover is not None:
+                    leftover.write(match.post, rows[match.post])
+                else:
+                    summary.add(match)
+                    write_match(writer, matcher, match)
+    if leftover is not None:
+        leftover.close()
+    os.remove(pre_path)
+    os.remove(post_path)
+    return summary, used
+
+
+def match_files(pre_path, post_path, matcher, out=None, memory_budget=DEFAULT_MEMORY_BUDGET,
+                partitions=None, chunk_size=10000, workers=1):
+    """
+    Match two exports (CSV, .xlsx or columnar caches), writing one row per
+    pair (or unpaired record) to the `out` file object if given. Returns a
+    Summary.
+
+    With workers > 1 the partitions are joined on a process pool, so the
+    run is partitioned even if the pre export fits the budget: into at
+    least SHARDS_PER_WORKER partitions per worker by default, and a given
+    number of partitions must be at least `workers` (ValueError). Shard
+    results are merged in partition order, so the output and summary do
+    not depend on the number of workers. Matchers with block fields need
+    the in-memory join: ValueError if the run would be partitioned.
+    """
+    if partitions is None:
+        partitions = max(1, math.ceil(export_size(pre_path) * ROW_EXPANSION / memory_budget))
+        if workers > 1:
+            partitions = max(partitions, workers * SHARDS_PER_WORKER)
+    elif partitions < workers:
+        raise ValueError("%d workers need at least as many partitions, not %d" % (workers, partitions))
+    if matcher.block_fields and partitions > 1:
+        raise ValueError(
+            "blocking on %s needs an in-memory join, but this run uses %d partitions%s"
+            % (", ".join(matcher.block_fields), partitions, " for %d workers" % workers if workers > 1 else "")
+        )
+    summary = Summary(matcher)
+    writer = None
+    if out is not None:
+        writer = csv.writer(out)
+        write_header(writer, matcher)
+
+    def emit(matches):
+        for match in matches:
+            summary.add(match)
+            if writer is not None:
+                write_match(writer, matcher, match)
+
+    if partitions == 1:
+        emit(matcher.join(iter_rows(pre_path, matcher.columns), iter_rows(post_path, matcher.columns), chunk_size))
+        return summary
+
+    directory = tempfile.mkdtemp(prefix="txmatch-")
+    executor = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        used = RowSet()
+        start = time.perf_counter()
+        pre_files, pre_rows = partition_keys(iter_rows(pre_path, matcher.columns), matcher.join_keys, partitions,
+                                             directory, "pre")
+        summary.partition_seconds += time.perf_counter() - start
+        remaining = iter_rows(post_path, matcher.columns)
+        for i, (key, pre_parts) in enumerate(zip(matcher.join_keys, pre_files)):
+            last = i == len(matcher.join_keys) - 1
+            start = time.perf_counter()
+            keyless = SpillFile(os.path.join(directory, "keyless-%d.csv" % i))
+            post_parts = partition(remaining, key, partitions, directory, "post-%d" % i, keyless=keyless)
+            keyless.close()
+            summary.partition_seconds += time.perf_counter() - start
+            shards = [
+                (matcher, pre_part.path, post_part.path, key, last, chunk_size,
+                 os.path.join(directory, "out-%d-%04d.csv" % (i, n)), os.path.join(directory, "left-%d-%04d.csv" % (i, n)))
+                for n, (pre_part, post_part) in enumerate(zip(pre_parts, post_parts))
+            ]
+            if executor is None:
+                results = (join_shard(*shard) for shard in shards)
+            else:
+                results = executor.map(join_shard, *zip(*shards))
+            leftovers = [keyless.path]
+            for shard, (shard_summary, shard_used) in zip(shards, results):
+                summary.merge(shard_summary)
+                used.update(shard_used)
+                out_path, leftover_path = shard[-2:]
+                if writer is not None:
+                    with open(out_path, newline="", encoding="utf-8") as f:
+                        shutil.copyfileobj(f, out)
+                os.remove(out_path)
+                if not last and os.path.exists(leftover_path):
+                    leftovers.append(leftover_path)
+            remaining = chain.from_iterable(read_spill(path) for path in leftovers)
+        emit(Match(number, None, "", 0.0, [None] * len(matcher.fields)) for number, row in remaining)
+        # Pre rows are numbered 1..pre_rows, so the unused ones need no third read.
+        emit(Match(None, number, "", 0.0, [None] * len(matcher.fields))
+             for number in range(1, pre_rows + 1) if number not in used)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        shutil.rmtree(directory, ignore_errors=True)
+    return summary
@@ -0,0 +1,381 @@
+"""
+Incremental matching against the state of the previous run.
+
+The state is a SQLite file holding, for both CSV exports, a digest of
+every distinct row (over the columns the spec reads) with its count and
+byte offset, the rows' join key values, and for every post row digest
+the match it got: the pre row digest, the join key, the score and the
+field scores. A run then
+
+  * reads nothing of an export whose size and mtime did not change and
+    only the new tail of one that grew, provided the first and last
+    HASH_BLOCK bytes the previous run saw are still the same; any other
+    export is rescanned and its digests compared. The exports are
+    append-only logs: an edit that leaves those blocks alone and also
+    grows the file passes for an append, so start a new state after
+    rewriting an export in place;
+  * marks the join key values of pre rows that appeared or disappeared
+    as dirty;
+  * re-scores the new post rows and the post rows with a dirty key
+    value, against just the pre rows sharing their key values, re-reading
+    rows that did not change from their offsets. Candidates are probed in
+    export order, as match_files() does, so equal scores are broken the
+    same way;
+  * updates the regression report (error codes and release versions on
+    both sides, and how they shift between paired records) by the change
+    in each re-scored row's contribution, and diffs it with the report
+    of the previous run.
+
+Changing the spec, threshold or join keys starts the state over.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+from collections import Counter
+
+from .records import iter_csv_offsets, read_csv_at
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS pre (
+    digest TEXT PRIMARY KEY, count INTEGER, offset INTEGER, code TEXT, release TEXT
+);
+CREATE TABLE IF NOT EXISTS post (
+    digest TEXT PRIMARY KEY, count INTEGER, offset INTEGER, code TEXT, release TEXT,
+    pre TEXT, join_key TEXT, score REAL, fields TEXT, pre_code TEXT, pre_release TEXT
+);
+CREATE TABLE IF NOT EXISTS keys (side TEXT, position INTEGER, value TEXT, digest TEXT);
+CREATE INDEX IF NOT EXISTS keys_value ON keys (side, position, value);
+CREATE INDEX IF NOT EXISTS keys_digest ON keys (side, digest);
+CREATE INDEX IF NOT EXISTS post_pre ON post (pre);
+"""
+
+ERROR_CODE = "Error Code"
+RELEASE_VERSION = "Release Version"
+HASH_BLOCK = 1 << 20
+# Digests per "IN (...)" query, below SQLite's limit on bound parameters.
+LOOKUP_BATCH = 500
+
+
+def row_digest(row, columns):
+    return hashlib.blake2b("\x1f".join(row.get(column, "") for column in columns).encode(), digest_size=16).hexdigest()
+
+
+def _edges(f, size):
+    """Hashes of the first and of the last HASH_BLOCK bytes of the first `size` bytes of f, and that last byte."""
+    f.seek(0)
+    head = hashlib.blake2b(f.read(min(size, HASH_BLOCK))).hexdigest()
+    f.seek(max(0, size - HASH_BLOCK))
+    block = f.read(size - f.tell())
+    return head, hashlib.blake2b(block).hexdigest(), block[-1:]
+
+
+def file_stamp(path, previous=None):
+    """
+    The stamp of a file: size, mtime and the hashes of its edges, and the
+    byte offset from which it has to be read given the stamp the previous
+    run left: its end if unchanged, the previous end if the file was only
+    appended to, else None (read it all). At most three blocks are read.
+    """
+    with open(path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        head, tail, last = _edges(f, stat.st_size)
+        stamp = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "head": head, "tail": tail,
+                 # Appends only start a new row when the file ends with a complete one.
+                 "complete": last in (b"\n", b"")}
+        if not previous or "mtime_ns" not in previous:
+            return stamp, None
+        if previous["size"] == stamp["size"] and previous["mtime_ns"] == stamp["mtime_ns"]:
+            return stamp, stamp["size"]
+        if stamp["size"] > previous["size"] and previous["complete"]:
+            if _edges(f, previous["size"])[:2] == (previous["head"], previous["tail"]):
+                return stamp, previous["size"]
+    return stamp, None
+
+
+def fingerprint(matcher):
+    spec = [list(rule) for rule in matcher.spec]
+    return hashlib.blake2b(json.dumps([spec, matcher.threshold, list(matcher.join_keys)]).encode()).hexdigest()
+
+
+class Report:
+    """
+    Regression report counters, keyed by tuples such as
+    ("error_codes", "shifts", "500 -> 503"), so that a row's contribution
+    can be added and later taken back out.
+    """
+
+    def __init__(self, counts=None):
+        self.counts = Counter(counts or {})
+
+    def add_post(self, result, count, threshold):
+        """`result` is (code, release, pre digest, score, pre code, pre release) of a post row."""
+        code, release, pre, score, pre_code, pre_release = result
+        counts = self.counts
+        counts[("post_rows",)] += count
+        counts[("error_codes", "post", code)] += count
+        counts[("release_versions", "post", release)] += count
+        if pre is None:
+            counts[("post_without_pre",)] += count
+            return
+        counts[("paired",)] += count
+        counts[("matched",)] += count if score >= threshold else 0
+        counts[("score_total",)] += score * count
+        if pre_code != code:
+            counts[("error_codes", "shifts", "%s -> %s" % (pre_code, code))] += count
+        counts[("release_versions", "pairs", "%s -> %s" % (pre_release, release))] += count
+
+    def add_pre(self, code, release, count):
+        self.counts[("pre_rows",)] += count
+        self.counts[("error_codes", "pre", code)] += count
+        self.counts[("release_versions", "pre", release)] += count
+
+    def dumps(self):
+        return json.dumps([[list(key), value] for key, value in self.counts.items() if value])
+
+    @classmethod
+    def loads(cls, text):
+        return cls({tuple(key): value for key, value in json.loads(text)} if text else {})
+
+    def as_dict(self, pre_without_post=None):
+        result = {}
+        for key, value in sorted(self.counts.items()):
+            if not value:
+                continue
+            node = result
+            for part in key[:-1]:
+                node = node.setdefault(part, {})
+            node[key[-1]] = round(value, 4) if isinstance(value, float) else value
+        if pre_without_post is not None:
+            result["pre_without_post"] = pre_without_post
+        if self.counts[("paired",)]:
+            result["mean_score"] = round(self.mean_score(), 4)
+        result.pop("score_total", None)
+        return result
+
+    def mean_score(self):
+        paired = self.counts[("paired",)]
+        return self.counts[("score_total",)] / paired if paired else 0.0
+
+    def diff(self, previous):
+        """Change of every counter since `previous`; counters that did not change are left out."""
+        delta = Report(self.counts)
+        delta.counts.subtract(previous.counts)
+        del delta.counts[("score_total",)]
+        result = delta.as_dict()
+        change = self.mean_score() - previous.mean_score()
+        if round(change, 4):
+            result["mean_score"] = round(change, 4)
+        return result
+
+
+class State:
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def get(self, name):
+        row = self.db.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, name, value):
+        self.db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+
+    def reset(self):
+        for table in ("pre", "post", "keys"):
+            self.db.execute("DELETE FROM %s" % table)
+        self.db.execute("DELETE FROM meta")
+
+    def counts(self, side):
+        return dict(self.db.execute("SELECT digest, count FROM %s" % side))
+
+    def lookup(self, side, column, digests):
+        """{digest: column} for those of the digests that are stored."""
+        digests = list(digests)
+        found = {}
+        for i in range(0, len(digests), LOOKUP_BATCH):
+            batch = digests[i:i + LOOKUP_BATCH]
+            found.update(self.db.execute(
+                "SELECT digest, %s FROM %s WHERE digest IN (%s)" % (column, side, ",".join("?" * len(batch))), batch,
+            ))
+        return found
+
+    def key_values(self, side, digests):
+        """{(position, value)} of the given rows."""
+        values = set()
+        for digest in digests:
+            values.update(self.db.execute("SELECT position, value FROM keys WHERE side = ? AND digest = ?",
+                                          (side, digest)))
+        return values
+
+    def digests_with(self, side, values):
+        """Digests of the rows with any of the (position, value) key values."""
+        self.db.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (position INTEGER, value TEXT)")
+        self.db.execute("DELETE FROM wanted")
+        self.db.executemany("INSERT INTO wanted (position, value) VALUES (?, ?)", values)
+        # CROSS JOIN keeps "wanted" the outer loop, so each value probes keys_value.
+        return {digest for (digest,) in self.db.execute(
+            "SELECT DISTINCT keys.digest FROM wanted CROSS JOIN keys"
+            " ON keys.side = ? AND keys.position = wanted.position AND keys.value = wanted.value", (side,),
+        )}
+
+    def add_keys(self, side, rows, join_keys):
+        """Index the join key values of (digest, row) pairs."""
+        self.db.executemany(
+            "INSERT INTO keys (side, position, value, digest) VALUES (?, ?, ?, ?)",
+            ((side, position, row[key], digest) for digest, row in rows
+             for position, key in enumerate(join_keys) if row.get(key)),
+        )
+
+    def result(self, digest):
+        """(result, count) stored for a post row; see Report.add_post()."""
+        row = self.db.execute(
+            "SELECT code, release, pre, score, pre_code, pre_release, count FROM post WHERE digest = ?", (digest,),
+        ).fetchone()
+        return row[:6], row[6]
+
+    def remove(self, side, digests):
+        for digest in digests:
+            self.db.execute("DELETE FROM %s WHERE digest = ?" % side, (digest,))
+            self.db.execute("DELETE FROM keys WHERE side = ? AND digest = ?", (side, digest))
+
+
+class Scan:
+    """What changed in one export since the state was saved."""
+
+    def __init__(self, state, side, path, columns):
+        self.side = side
+        self.path = path
+        self.stamp, start = file_stamp(path, json.loads(state.get("stamp:" + side) or "null"))
+        self.appended = start is not None
+        self.old = state.counts(side) if not self.appended else None
+        seen = Counter()
+        self.offsets = {}
+        self.rows = {}
+        for offset, row in iter_csv_offsets(path, start or None):
+            digest = row_digest(row, columns)
+            seen[digest] += 1
+            if digest not in self.offsets:
+                self.offsets[digest] = offset
+                if self.appended or digest not in self.old:
+                    self.rows[digest] = row
+        if self.appended:
+            self.old = state.lookup(side, "count", seen)
+            self.counts = {digest: self.old.get(digest, 0) + count for digest, count in seen.items()}
+            self.gone = set()
+        else:
+            self.counts = {digest: count for digest, count in seen.items() if self.old.get(digest) != count}
+            self.gone = set(self.old) - set(seen)
+        self.new = {digest for digest in self.counts if digest not in self.old}
+
+    def row(self, digest):
+        return self.rows.get(digest)
+
+
+def run(pre_path, post_path, matcher, state_path):
+    """
+    Bring the state at state_path up to date with the two CSV exports and
+    return the updated regression report, its diff from the previous run's
+    and how many post rows were re-scored.
+    """
+    state = State(state_path)
+    db = state.db
+    previous = Report.loads(state.get("report"))
+    report = Report(previous.counts)
+    if state.get("fingerprint") != fingerprint(matcher):
+        state.reset()
+        state.set("fingerprint", fingerprint(matcher))
+        report = Report()
+    keys = matcher.join_keys
+    threshold = matcher.threshold
+
+    pre = Scan(state, "pre", pre_path, matcher.columns)
+    post = Scan(state, "post", post_path, matcher.columns)
+
+    # Pre side: the report's pre counts, and the key values whose candidates changed.
+    dirty = state.key_values("pre", pre.gone)
+    for digest in pre.gone:
+        code, release, count = db.execute("SELECT code, release, count FROM pre WHERE digest = ?", (digest,)).fetchone()
+        report.add_pre(code, release, -count)
+    state.remove("pre", pre.gone)
+    added = [(digest, pre.row(digest)) for digest in pre.new]
+    for digest, row in added:
+        report.add_pre(row.get(ERROR_CODE), row.get(RELEASE_VERSION), pre.counts[digest])
+        dirty.update((position, row[key]) for position, key in enumerate(keys) if row.get(key))
+    db.executemany(
+        "INSERT INTO pre (digest, count, offset, code, release) VALUES (?, ?, ?, ?, ?)",
+        ((digest, pre.counts[digest], pre.offsets[digest], row.get(ERROR_CODE), row.get(RELEASE_VERSION))
+         for digest, row in added),
+    )
+    state.add_keys("pre", added, keys)
+    for digest, count in pre.counts.items():
+        if digest not in pre.new:
+            code, release = db.execute("SELECT code, release FROM pre WHERE digest = ?", (digest,)).fetchone()
+            report.add_pre(code, release, count - pre.old[digest])
+            db.execute("UPDATE pre SET count = ? WHERE digest = ?", (count, digest))
+    if not pre.appended:
+        db.executemany("UPDATE pre SET offset = ? WHERE digest = ?", [(o, d) for d, o in pre.offsets.items()])
+
+    # Post side: take back the contribution of every stored row that goes
+    # away, is re-scored or changes count.
+    rescore = set(post.new)
+    if dirty:
+        rescore |= state.digests_with("post", dirty) - post.gone
+    for digest in post.gone | rescore | set(post.counts):
+        if digest not in post.new:
+            result, count = state.result(digest)
+            report.add_post(result, -count, threshold)
+    state.remove("post", post.gone)
+    if not post.appended:
+        db.executemany("UPDATE post SET offset = ? WHERE digest = ?", [(o, d) for d, o in post.offsets.items()])
+    for digest in set(post.counts) - rescore:
+        result, count = state.result(digest)
+        report.add_post(result, post.counts[digest], threshold)
+        db.execute("UPDATE post SET count = ? WHERE digest = ?", (post.counts[digest], digest))
+
+    # Re-score: new rows come from the scan, the others are re-read at their offsets.
+    stored = state.lookup("post", "offset", rescore)
+    counts = state.lookup("post", "count", rescore)
+    counts.update((digest, post.counts[digest]) for digest in rescore if digest in post.counts)
+    reread = read_csv_at(post_path, stored.values())
+    post_rows = [(digest, post.row(digest) or reread[stored[digest]]) for digest in sorted(rescore)]
+    values = {(position, row[key]) for digest, row in post_rows for position, key in enumerate(keys) if row.get(key)}
+    candidates = state.digests_with("pre", values)
+    offsets = state.lookup("pre", "offset", candidates)
+    reread = read_csv_at(pre_path, [offsets[digest] for digest in candidates if pre.row(digest) is None])
+    # In file order, like the pre rows of match_files(): probe() gives ties to the first candidate.
+    pre_rows = [(digest, pre.row(digest) or reread[offsets[digest]]) for digest in sorted(candidates, key=offsets.get)]
+    pre_by_digest = dict(pre_rows)
+    rows = dict(post_rows)
+    scored = []
+    for match in matcher.probe(matcher.build_index(pre_rows), post_rows, set()):
+        row = rows[match.post]
+        paired = pre_by_digest.get(match.pre, {})
+        result = (row.get(ERROR_CODE), row.get(RELEASE_VERSION), match.pre, match.score,
+                  paired.get(ERROR_CODE), paired.get(RELEASE_VERSION))
+        report.add_post(result, counts[match.post], threshold)
+        scored.append((match.post, counts[match.post], stored.get(match.post, post.offsets.get(match.post)))
+                      + result + (match.join, json.dumps(match.fields)))
+    db.executemany(
+        "INSERT OR REPLACE INTO post (digest, count, offset, code, release, pre, score, pre_code, pre_release,"
+        " join_key, fields) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", scored,
+    )
+    db.executemany("DELETE FROM keys WHERE side = 'post' AND digest = ?", ((digest,) for digest in stored))
+    state.add_keys("post", post_rows, keys)
+
+    pre_without_post = db.execute(
+        "SELECT COALESCE(SUM(count), 0) FROM pre WHERE digest NOT IN (SELECT pre FROM post WHERE pre IS NOT NULL)"
+    ).fetchone()[0]
+    state.set("report", report.dumps())
+    state.set("stamp:pre", json.dumps(pre.stamp))
+    state.set("stamp:post", json.dumps(post.stamp))
+    db.commit()
+    db.close()
+    return {
+        "report": report.as_dict(pre_without_post),
+        "diff": report.diff(previous),
+        "rescored": len(rescore),
+        "appended": {"pre": pre.appended, "post": post.appended},
+    }
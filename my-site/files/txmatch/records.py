@@ -0,0 +1,123 @@
+"""Streaming readers for the Splunk exports: CSV, .xlsx and columnar caches (see columnar.py)."""
+
+import csv
+import datetime
+import os
+from itertools import islice
+
+
+def _select(row, columns):
+    if columns is None:
+        return row
+    return {column: row[column] for column in columns if column in row}
+
+
+def iter_csv_rows(path, columns=None):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for number, row in enumerate(csv.DictReader(f), start=1):
+            yield number, _select(row, columns)
+
+
+def cell_text(value):
+    """A worksheet cell as the text the CSV export has for it."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat(sep=" ") if isinstance(value, datetime.datetime) else value.isoformat()
+    return str(value)
+
+
+def iter_xlsx_rows(path, columns=None):
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        cells = workbook.active.iter_rows(values_only=True)
+        header = [cell_text(value) for value in next(cells, ())]
+        # Blank rows are skipped without a number, as csv.DictReader does.
+        rows = (values for values in cells if any(value is not None for value in values))
+        for number, values in enumerate(rows, start=1):
+            row = dict(zip(header, (cell_text(value) for value in values)))
+            yield number, _select(row, columns)
+    finally:
+        workbook.close()
+
+
+def iter_rows(path, columns=None):
+    """
+    Yield (row number, row dict) for every data row of an export; rows are
+    numbered from 1. With `columns`, rows hold only those of the columns the
+    export has.
+    """
+    if os.path.isdir(path):
+        from .columnar import ColumnarExport
+
+        yield from ColumnarExport(path).iter_rows(columns)
+    elif path.lower().endswith(".xlsx"):
+        yield from iter_xlsx_rows(path, columns)
+    else:
+        yield from iter_csv_rows(path, columns)
+
+
+def _record(f):
+    """The next CSV record of a binary file, continued over newlines inside quotes."""
+    record = f.readline()
+    while record.count(b'"') % 2:
+        line = f.readline()
+        if not line:
+            break
+        record += line
+    return record
+
+
+def _header(f):
+    return next(csv.reader([_record(f).decode("utf-8-sig")]), [])
+
+
+def iter_csv_offsets(path, start=None):
+    """
+    Yield (byte offset, row dict) for the data rows of a CSV export, from
+    the row at offset `start` if given. Offsets can be passed to read_csv_at().
+    """
+    with open(path, "rb") as f:
+        header = _header(f)
+        if start is not None:
+            f.seek(start)
+        while True:
+            offset = f.tell()
+            record = _record(f)
+            if not record:
+                return
+            values = next(csv.reader([record.decode("utf-8")]), None)
+            if values:
+                yield offset, dict(zip(header, values))
+
+
+def read_csv_at(path, offsets):
+    """{offset: row dict} for the rows of a CSV export starting at the given byte offsets."""
+    rows = {}
+    with open(path, "rb") as f:
+        header = _header(f)
+        for offset in sorted(set(offsets)):
+            f.seek(offset)
+            rows[offset] = dict(zip(header, next(csv.reader([_record(f).decode("utf-8")]))))
+    return rows
+
+
+def export_size(path):
+    """Bytes on disk of an export file or columnar cache directory."""
+    if os.path.isdir(path):
+        return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+    return os.path.getsize(path)
+
+
+def read_chunks(rows, chunk_size=10000):
+    """Group an iterable of rows into lists of at most chunk_size."""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,158 @@
+"""Per-field comparators. Each takes the pre and post value and returns a score in [0, 1]."""
+
+import ast
+import re
+from difflib import SequenceMatcher
+from functools import lru_cache
+
+
+class LiteralText(str):
+    """Column text that carries its parse_literal() result, e.g. as read back from a columnar cache."""
+
+    def __new__(cls, text, literal):
+        self = super().__new__(cls, text)
+        self.literal = literal
+        return self
+
+
+@lru_cache(maxsize=65536)
+def parse_literal(text):
+    """Parse a Python-literal dict column such as "{'code': 401}"; None if it is not one."""
+    if isinstance(text, LiteralText):
+        return text.literal
+    text = text.strip()
+    if not text.startswith("{"):
+        return None
+    try:
+        value = ast.literal_eval(text)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def flatten(value, prefix=""):
+    """Flatten nested dicts into {"a.b": leaf} pairs."""
+    items = {}
+    for key, item in value.items():
+        path = "%s.%s" % (prefix, key) if prefix else str(key)
+        if isinstance(item, dict) and item:
+            items.update(flatten(item, path))
+        else:
+            items[path] = item
+    return items
+
+
+@lru_cache(maxsize=65536)
+def similarity(a, b):
+    if a == b:
+        return 1.0
+    return SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+
+def exact(a, b, threshold):
+    return 1.0 if a.strip() == b.strip() else 0.0
+
+
+def service(a, b, threshold):
+    return 1.0 if a.strip().lower() == b.strip().lower() else 0.0
+
+
+def fuzzy(a, b, threshold):
+    return 1.0 if similarity(a.strip().lower(), b.strip().lower()) >= threshold else 0.0
+
+
+def _dict_overlap(a, b):
+    if not a and not b:
+        return 1.0
+    keys = a.keys() | b.keys()
+    return sum(1 for key in keys if key in a and key in b and a[key] == b[key]) / len(keys)
+
+
+def kv(a, b, threshold):
+    """Share of header names present on both sides with the same value."""
+    da, db = parse_literal(a), parse_literal(b)
+    if da is None or db is None:
+        return exact(a, b, threshold)
+    return _dict_overlap(da, db)
+
+
+def fields(a, b, threshold):
+    """Like kv(), over the flattened (dotted) paths of nested payloads."""
+    da, db = parse_literal(a), parse_literal(b)
+    if da is None or db is None:
+        return exact(a, b, threshold)
+    return _dict_overlap(flatten(da), flatten(db))
+
+
+def structure(a, b, threshold):
+    """Key structure and data, half each; a match once that reaches the threshold."""
+    da, db = parse_literal(a), parse_literal(b)
+    if da is None or db is None:
+        return fuzzy(a, b, threshold)
+    fa, fb = flatten(da), flatten(db)
+    keys = fa.keys() | fb.keys()
+    key_score = len(fa.keys() & fb.keys()) / len(keys) if keys else 1.0
+    data_a = " ".join(str(fa[k]) for k in sorted(fa))
+    data_b = " ".join(str(fb[k]) for k in sorted(fb))
+    score = 0.5 * key_score + 0.5 * similarity(data_a, data_b)
+    return 1.0 if score >= threshold else 0.0
+
+
+def _region(text):
+    text = text.strip().lower()
+    if ":" in text:
+        text = text.split(":", 1)[1].strip()
+    return text
+
+
+def location(a, b, threshold):
+    return 1.0 if _region(a) == _region(b) else 0.0
+
+
+OS_PATTERN = re.compile(r"(ios|iphone os|android|windows(?: nt)?|mac ?os(?: x)?|linux|chrome ?os)[ /]?([\d_.]*)", re.I)
+OS_NAMES = {"iphone os": "ios", "windows nt": "windows", "mac os": "macos", "mac os x": "macos", "macos x": "macos", "chromeos": "chrome os"}
+
+
+@lru_cache(maxsize=4096)
+def parse_device(text):
+    """
+    Split a Device/OS value ("iPhone 13, iOS 15", "Windows 10") or a
+    User-Agent string into (device, os family, os major version).
+    """
+    match = OS_PATTERN.search(text)
+    if match:
+        family = match.group(1).lower()
+        family = OS_NAMES.get(family, family)
+        major = re.split(r"[._]", match.group(2))[0] if match.group(2) else ""
+    else:
+        family, major = "", ""
+    device = ""
+    if "(" in text:
+        # User-Agent string: "Mozilla/5.0 (iPhone; CPU iPhone OS 16_0 ...)".
+        device = text[text.index("(") + 1:].split(";")[0].strip(" )").lower()
+    for part in ([] if device else text.split(",")):
+        part = part.strip()
+        if part and not OS_PATTERN.match(part):
+            device = part.lower()
+            break
+    return device or family, family, major
+
+
+def useragent(a, b, threshold):
+    da, db = parse_device(a), parse_device(b)
+    score = 0.4 * (da[0] == db[0]) + 0.4 * (da[1] == db[1])
+    if da[1] == db[1]:
+        score += 0.2 * (da[2] == db[2])
+    return score
+
+
+COMPARATORS = {
+    "exact": exact,
+    "service": service,
+    "fuzzy": fuzzy,
+    "kv": kv,
+    "fields": fields,
+    "structure": structure,
+    "location": location,
+    "useragent": useragent,
+}
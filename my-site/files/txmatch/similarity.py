@@ -0,0 +1,188 @@
+"""
+Batched fuzzy matching with NumPy.
+
+A fuzzy rule asks whether difflib's ratio of two strings reaches a
+threshold. The ratio is 2 * matched / total length, and the characters
+the two strings have in common (counted with multiplicity) bound the
+matched characters from above, so that bound, computed for a whole batch
+of pairs from per-string character count vectors, rejects most pairs
+without running difflib. Only the pairs that survive it are compared with
+difflib, so the decisions are the same as the per-pair rules. Count
+vectors are memoized per distinct string (log fields repeat the same few
+values, e.g. "Unauthorized", over and over) and each distinct pair in a
+batch is scored once.
+
+MinHashLSH finds likely-similar strings without comparing all pairs, for
+records that share no join key.
+"""
+
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from .rules import flatten, parse_literal, similarity
+
+# Characters are counted in this many buckets; characters that share a
+# bucket only loosen the bound.
+BUCKETS = 128
+CACHE_SIZE = 50000
+NGRAM = 3
+
+
+def ngrams(text, n=NGRAM):
+    text = " %s " % text.lower()
+    return [text[i:i + n] for i in range(max(1, len(text) - n + 1))]
+
+
+class CharCounts:
+    """Character count vectors, with an LRU cache of those already built."""
+
+    def __init__(self, buckets=BUCKETS, cache_size=CACHE_SIZE):
+        self.buckets = buckets
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self.hits = self.misses = 0
+
+    def _build(self, text):
+        codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32) % self.buckets
+        return np.bincount(codes, minlength=self.buckets).astype(np.int32)
+
+    def vectors(self, strings):
+        """Matrix with one row per string."""
+        matrix = np.empty((len(strings), self.buckets), dtype=np.int32)
+        cache = self._cache
+        for i, text in enumerate(strings):
+            vector = cache.get(text)
+            if vector is None:
+                self.misses += 1
+                vector = cache[text] = self._build(text)
+                if len(cache) > self.cache_size:
+                    cache.popitem(last=False)
+            else:
+                self.hits += 1
+                cache.move_to_end(text)
+            matrix[i] = vector
+        return matrix
+
+
+counts = CharCounts()
+
+
+def ratios(left, right, threshold):
+    """
+    rules.similarity(left[i], right[i]) for every i where it can reach
+    `threshold`, and 0.0 where the bound shows it cannot.
+    """
+    if not len(left):
+        return np.zeros(0)
+    ids = {}
+    a = np.fromiter((ids.setdefault(s, len(ids)) for s in left), dtype=np.int64, count=len(left))
+    b = np.fromiter((ids.setdefault(s, len(ids)) for s in right), dtype=np.int64, count=len(right))
+    pairs, inverse = np.unique(np.stack([a, b], axis=1), axis=0, return_inverse=True)
+    strings = list(ids)
+    matrix = counts.vectors(strings)
+    lengths = np.fromiter((len(s) for s in strings), dtype=np.int64, count=len(strings))
+    pa, pb = pairs[:, 0], pairs[:, 1]
+    common = np.minimum(matrix[pa], matrix[pb]).sum(axis=1)
+    bound = 2.0 * common / np.maximum(lengths[pa] + lengths[pb], 1)
+    result = (pa == pb).astype(np.float64)
+    for k in np.flatnonzero((pa != pb) & (bound >= threshold)).tolist():
+        result[k] = similarity(strings[pa[k]], strings[pb[k]])
+    return result[inverse.reshape(-1)]
+
+
+def fuzzy_batch(left, right, threshold):
+    """rules.fuzzy() over many pairs, as a float array."""
+    left = [s.strip().lower() for s in left]
+    right = [s.strip().lower() for s in right]
+    return (ratios(left, right, threshold) >= threshold).astype(np.float64)
+
+
+def structure_batch(left, right, threshold):
+    """
+    rules.structure() over many pairs. The data only needs comparing where
+    the key overlap leaves the threshold within reach, and then only has to
+    reach 2 * threshold - key overlap, so pairs are batched by that.
+    """
+    scores = np.zeros(len(left))
+    texts = []
+    needed = {}
+    for i, (a, b) in enumerate(zip(left, right)):
+        da, db = parse_literal(a), parse_literal(b)
+        if da is None or db is None:
+            texts.append(i)
+            continue
+        fa, fb = flatten(da), flatten(db)
+        keys = fa.keys() | fb.keys()
+        key_score = len(fa.keys() & fb.keys()) / len(keys) if keys else 1.0
+        if 0.5 * key_score + 0.5 >= threshold:
+            data = (" ".join(str(fa[k]) for k in sorted(fa)), " ".join(str(fb[k]) for k in sorted(fb)))
+            needed.setdefault(key_score, []).append((i, data))
+    for key_score, items in needed.items():
+        rows = [i for i, data in items]
+        # Slightly below the exact need, so rounding cannot prune a match.
+        data = ratios([a for i, (a, b) in items], [b for i, (a, b) in items], 2 * threshold - key_score - 1e-9)
+        scores[rows] = 0.5 * key_score + 0.5 * data >= threshold
+    if texts:
+        scores[texts] = fuzzy_batch([left[i] for i in texts], [right[i] for i in texts], threshold)
+    return scores
+
+
+BATCH_COMPARATORS = {
+    "fuzzy": fuzzy_batch,
+    "structure": structure_batch,
+}
+
+
+class MinHashLSH:
+    """
+    MinHash signatures over character trigrams, banded into hash buckets:
+    two strings land in a common bucket with high probability when their
+    trigram Jaccard similarity is above roughly (1 / bands) ** (1 / rows).
+    """
+
+    PRIME = (1 << 31) - 1
+
+    def __init__(self, bands=16, rows=4, seed=0):
+        self.bands = bands
+        self.rows = rows
+        rng = np.random.default_rng(seed)
+        size = bands * rows
+        self._a = rng.integers(1, self.PRIME, size=size, dtype=np.uint64)
+        self._b = rng.integers(0, self.PRIME, size=size, dtype=np.uint64)
+        self._buckets = {}
+        self._signatures = {}
+
+    def signature(self, text):
+        shingles = np.fromiter(
+            {zlib.crc32(g.encode()) % self.PRIME for g in ngrams(text)}, dtype=np.uint64,
+        )
+        hashed = (self._a[:, None] * shingles[None, :] + self._b[:, None]) % self.PRIME
+        return hashed.min(axis=1)
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def add(self, key, text):
+        signature = self._signatures[key] = self.signature(text)
+        for band_key in self._band_keys(signature):
+            self._buckets.setdefault(band_key, []).append(key)
+
+    def query(self, text, limit=None):
+        """
+        Keys added with text that probably resembles `text`, most similar
+        first: by the share of signature values they have in common with it,
+        which estimates the Jaccard similarity, then in insertion order.
+        """
+        signature = self.signature(text)
+        found = {}
+        for band_key in self._band_keys(signature):
+            for key in self._buckets.get(band_key, ()):
+                found[key] = None
+        keys = list(found)
+        if len(keys) > 1:
+            agree = np.count_nonzero(np.stack([self._signatures[key] for key in keys]) == signature, axis=1)
+            keys = [keys[i] for i in np.argsort(-agree, kind="stable").tolist()]
+        return keys[:limit]
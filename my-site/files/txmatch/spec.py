@@ -0,0 +1,75 @@
+"""Load the weighted field specs (AD-TransactionAnalysis-Fields.csv, MatchFields.csv)."""
+
+import csv
+import os
+import re
+from collections import namedtuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SPEC = os.path.join(os.path.dirname(HERE), "AD-TransactionAnalysis-Fields.csv")
+
+# One weighted field: `rule` is one of the comparator names in rules.py and
+# `threshold` the similarity a fuzzy rule needs to count as a match. `join`
+# ranks the field among the join keys (1 is tried first), None if it is not one.
+FieldRule = namedtuple("FieldRule", "field weight group rule threshold join", defaults=(None,))
+
+
+def parse_weight(text):
+    text = text.strip()
+    if text.endswith("%"):
+        return float(text[:-1]) / 100
+    return float(text)
+
+
+def parse_rule(text):
+    """Map a free-text "Validation Rule" onto (rule name, threshold)."""
+    text = text.strip().lower()
+    percent = re.search(r"(\d+(?:\.\d+)?)\s*%", text)
+    threshold = float(percent.group(1)) / 100 if percent else 0.85
+    if text.startswith("fuzzy"):
+        if "key structure" in text:
+            return "structure", threshold
+        return "fuzzy", threshold
+    if "key-value" in text:
+        return "kv", 1.0
+    if "field-level" in text:
+        return "fields", 1.0
+    if "x-service-name" in text or "correlation" in text:
+        return "service", 1.0
+    if "geo" in text:
+        return "location", 1.0
+    if "user-agent" in text:
+        return "useragent", 1.0
+    return "exact", 1.0
+
+
+def parse_join(text):
+    text = (text or "").strip()
+    return int(text) if text else None
+
+
+def ranked_join_keys(spec):
+    """The spec's join key fields, in the order of their Join Key rank."""
+    return tuple(rule.field for rule in sorted((rule for rule in spec if rule.join is not None), key=lambda r: r.join))
+
+
+def load_spec(path=DEFAULT_SPEC):
+    """
+    Read a spec CSV. Two layouts are understood: the transaction analysis
+    sheet (Match Group, Parameter, Weight, Example, Validation Rule) and the
+    Splunk field list (Field, Weight, Match Category), whose fields are all
+    compared exactly. Either may have a Join Key column that ranks the
+    fields records are paired by.
+    """
+    rules = []
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            if "Parameter" in row:
+                rule, threshold = parse_rule(row.get("Validation Rule", ""))
+                rules.append(FieldRule(row["Parameter"].strip(), parse_weight(row["Weight"]),
+                                       row["Match Group"].strip(), rule, threshold, parse_join(row.get("Join Key"))))
+            else:
+                rules.append(FieldRule(row["Field"].strip(), parse_weight(row["Weight"]),
+                                       row.get("Match Category", "").strip(), "exact", 1.0,
+                                       parse_join(row.get("Join Key"))))
+    return rules
@@ -0,0 +1,26 @@
+"""
+Tests for txmatch; run from my-site/files with
+
+    python -m unittest discover -s txmatch/tests -t .
+"""
+
+import csv
+import os
+
+from ..records import iter_rows
+
+FILES = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PRE = os.path.join(FILES, "splunk_log_data_pre.csv")
+POST = os.path.join(FILES, "splunk_log_data_post.csv")
+
+
+def read(path):
+    return [row for number, row in iter_rows(path)]
+
+
+def write_csv(path, rows, mode="w"):
+    with open(path, mode, newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, list(rows[0]))
+        if mode == "w":
+            writer.writeheader()
+        writer.writerows(rows)
@@ -0,0 +1,53 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from .. import columnar
+from ..columnar import ColumnarExport, cache_path, ingest, is_fresh
+from ..records import iter_rows
+from ..rules import LiteralText, parse_literal
+from . import PRE, read, write_csv
+
+
+class ColumnarTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="txmatch-test-")
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "pre.csv")
+        shutil.copy(PRE, self.path)
+
+    def test_round_trip(self):
+        target = ingest(self.path)
+        self.assertEqual(target, cache_path(self.path))
+        with open(os.path.join(target, "meta.json"), encoding="utf-8") as f:
+            encodings = {column["encoding"] for column in json.load(f)["columns"]}
+        self.assertEqual(encodings, {"dictionary", "plain"})
+        rows = list(iter_rows(target))
+        self.assertEqual(rows, list(iter_rows(self.path)))
+        literals = [value for number, row in rows for value in row.values() if isinstance(value, LiteralText)]
+        self.assertTrue(literals)
+        for value in literals:
+            self.assertEqual(value.literal, parse_literal(str(value)))
+
+    def test_arrays_are_flushed_in_chunks(self):
+        expected = list(iter_rows(ingest(self.path)))
+        with mock.patch.object(columnar, "FLUSH_ITEMS", 7):
+            target = ingest(self.path, force=True)
+        self.assertEqual(list(iter_rows(target)), expected)
+        self.assertEqual(sorted(name for name in os.listdir(target) if name.endswith(".raw")), [])
+
+    def test_selected_columns(self):
+        columns = ["Session ID", "Response Body", "missing"]
+        self.assertEqual(list(iter_rows(ingest(self.path), columns)), list(iter_rows(self.path, columns)))
+
+    def test_stale_cache_is_rebuilt(self):
+        target = ingest(self.path)
+        self.assertTrue(is_fresh(self.path))
+        rows = read(self.path)
+        write_csv(self.path, rows[:10])
+        self.assertFalse(is_fresh(self.path))
+        ingest(self.path)
+        self.assertEqual(ColumnarExport(target).rows, 10)
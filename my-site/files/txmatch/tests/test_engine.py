@@ -0,0 +1,90 @@
+import io
+import unittest
+
+import os
+
+from ..engine import Blocker, Matcher, Summary, match_files
+from ..similarity import ngrams
+from ..spec import load_spec
+from . import FILES, POST, PRE, read
+
+
+def run(**options):
+    out = io.StringIO()
+    summary = match_files(PRE, POST, Matcher(load_spec()), out=out, **options)
+    lines = out.getvalue().splitlines()
+    return summary.as_dict(), lines[0], sorted(lines[1:])
+
+
+class GraceJoinTests(unittest.TestCase):
+    def test_partitioned_join_equals_in_memory_join(self):
+        expected = run(partitions=1)
+        self.assertEqual(expected[0]["post_rows"], 100)
+        self.assertEqual(run(partitions=4), expected)
+        self.assertEqual(run(partitions=7, chunk_size=8), expected)
+
+    def test_workers_do_not_change_the_result(self):
+        self.assertEqual(run(partitions=4, workers=2), run(partitions=1))
+
+    def test_workers_need_partitions(self):
+        with self.assertRaisesRegex(ValueError, "2 workers need at least as many partitions"):
+            run(partitions=1, workers=2)
+
+
+class MatcherTests(unittest.TestCase):
+    def test_join_keys_come_from_the_spec_unless_given(self):
+        self.assertEqual(Matcher(load_spec()).join_keys, ("Session ID", "User ID"))
+        self.assertEqual(Matcher(load_spec(os.path.join(FILES, "MatchFields.csv"))).join_keys, ("ose_sessionid",))
+        matcher = Matcher(load_spec(), join_keys=["User ID"])
+        self.assertEqual(matcher.join_keys, ("User ID",))
+        self.assertEqual(set(match_files(PRE, POST, matcher).as_dict()["joins"]), {"User ID"})
+
+    def test_group_means_weight_each_groups_fields(self):
+        matcher = Matcher(load_spec())
+        pre = read(PRE)[0]
+        post = dict(pre, **{"Error Code": "599", "Location": "ZZ"})
+        summary = Summary(matcher)
+        summary.add(next(matcher.probe(matcher.build_index([(1, pre)]), [(1, post)], set())))
+        groups = summary.as_dict()["group_means"]
+        # Error Code is 10% of Baseline's 50%, Location 5% of Comprehensive's 50%.
+        self.assertEqual(groups, {"Baseline": 0.8, "Comprehensive": 0.9})
+        self.assertEqual(set(run()[0]["group_means"]), {"Baseline", "Comprehensive"})
+
+
+class BlockerTests(unittest.TestCase):
+    fields = ["Request Payload"]
+
+    def test_recall_of_similar_texts(self):
+        """Every pre row whose block text is similar to a post row's is among its candidates."""
+        pre = list(enumerate(read(PRE), start=1))
+        blocker = Blocker(self.fields, pre, limit=len(pre))
+        shingles = {number: set(ngrams(blocker.text(row))) for number, row in pre}
+        wanted = found = 0
+        for row in read(POST):
+            text = set(ngrams(blocker.text(row)))
+            candidates = {number for number, candidate in blocker.candidates(row)}
+            for number, other in shingles.items():
+                if len(text & other) / len(text | other) >= 0.7:
+                    wanted += 1
+                    found += number in candidates
+        self.assertGreater(wanted, 100)
+        self.assertGreaterEqual(found / wanted, 0.95)
+
+    def test_most_similar_candidates_are_kept(self):
+        base = "{'payment_method': 'credit_card', 'amount': 150.0}"
+        pre = [(n, {"Request Payload": base.replace("150", str(150 + n))}) for n in range(1, 10)]
+        pre.append((10, {"Request Payload": base}))
+        blocker = Blocker(self.fields, pre, limit=1)
+        self.assertGreater(len(blocker.lsh.query(base)), 1)
+        self.assertEqual(blocker.candidates({"Request Payload": base}), [(10, {"Request Payload": base})])
+
+    def test_blocking_is_refused_on_partitioned_runs(self):
+        matcher = Matcher(load_spec(), block_fields=self.fields)
+        for options in ({"partitions": 2}, {"workers": 2}):
+            with self.assertRaisesRegex(ValueError, "in-memory join"):
+                match_files(PRE, POST, matcher, **options)
+        self.assertEqual(match_files(PRE, POST, matcher).as_dict()["post_rows"], 100)
+
+    def test_rows_without_block_text_have_no_candidates(self):
+        blocker = Blocker(self.fields, enumerate(read(PRE), start=1))
+        self.assertEqual(blocker.candidates({"Request Payload": "  "}), [])
@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from .. import incremental
+from ..engine import Matcher, match_files
+from ..spec import load_spec
+from ..records import iter_csv_offsets
+from . import POST, PRE, read, write_csv
+
+
+class IncrementalTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="txmatch-test-")
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.pre = os.path.join(self.directory, "pre.csv")
+        self.post = os.path.join(self.directory, "post.csv")
+        self.pre_rows, self.post_rows = read(PRE), read(POST)
+        write_csv(self.pre, self.pre_rows[:80])
+        write_csv(self.post, self.post_rows[:70])
+        self.matcher = Matcher(load_spec())
+        self.state = os.path.join(self.directory, "state.sqlite3")
+        self.runs = 0
+
+    def run_incremental(self):
+        return incremental.run(self.pre, self.post, self.matcher, self.state)
+
+    def full_run(self):
+        self.runs += 1
+        return incremental.run(self.pre, self.post, self.matcher, os.path.join(self.directory, "full-%d" % self.runs))
+
+    def assertMatchesFullRun(self, result):
+        full = self.full_run()
+        self.assertEqual(result["report"], full["report"])
+        summary = match_files(self.pre, self.post, self.matcher).as_dict()
+        report = result["report"]
+        self.assertEqual(
+            [report.get(key, 0) for key in ("post_rows", "paired", "matched", "post_without_pre", "pre_without_post")],
+            [summary[key] for key in ("post_rows", "paired", "matched", "post_without_pre", "pre_without_post")],
+        )
+
+    def test_appends(self):
+        self.assertMatchesFullRun(self.run_incremental())
+        write_csv(self.post, self.post_rows[70:], mode="a")
+        write_csv(self.pre, self.pre_rows[80:], mode="a")
+        result = self.run_incremental()
+        self.assertEqual(result["appended"], {"pre": True, "post": True})
+        # The new post rows, and the old ones whose key values gained a pre row.
+        self.assertTrue(30 <= result["rescored"] < 100, result["rescored"])
+        self.assertMatchesFullRun(result)
+        self.assertEqual(result["diff"]["post_rows"], 30)
+
+    def test_edits_and_deletes(self):
+        self.run_incremental()
+        pre_rows = [dict(row) for row in self.pre_rows[:80]]
+        pre_rows[3]["Error Code"] = "599"
+        del pre_rows[10:15]
+        write_csv(self.pre, pre_rows)
+        post_rows = [dict(row) for row in self.post_rows[:70]]
+        post_rows[0]["Error Description"] = "Unauthorised"
+        del post_rows[20]
+        write_csv(self.post, post_rows)
+        result = self.run_incremental()
+        self.assertEqual(result["appended"], {"pre": False, "post": False})
+        self.assertMatchesFullRun(result)
+        self.assertEqual(result["diff"]["post_rows"], -1)
+        self.assertEqual(result["diff"]["pre_rows"], -5)
+
+    def test_appends_read_only_the_new_tail(self):
+        self.run_incremental()
+        size = os.path.getsize(self.post)
+        write_csv(self.post, self.post_rows[70:], mode="a")
+        with mock.patch.object(incremental, "iter_csv_offsets", wraps=iter_csv_offsets) as scan:
+            self.run_incremental()
+        self.assertEqual([call.args[1] for call in scan.call_args_list], [os.path.getsize(self.pre), size])
+
+    def test_same_size_edit_is_rescanned(self):
+        self.run_incremental()
+        with open(self.post, "r+b") as f:
+            f.seek(os.path.getsize(self.post) // 2)
+            f.write(b"X")
+        os.utime(self.post, ns=(0, os.stat(self.post).st_mtime_ns + 10 ** 9))
+        result = self.run_incremental()
+        self.assertEqual(result["appended"], {"pre": True, "post": False})
+        self.assertMatchesFullRun(result)
+
+    def test_ties_are_broken_like_match_files(self):
+        """Pre rows that score the same against a post row: the first in the export wins."""
+        post = dict(self.post_rows[0], **{"Release Version": "v9"})
+        pre = [dict(post, **{"Release Version": "v%d" % i}) for i in range(1, 8)]
+        write_csv(self.pre, pre)
+        write_csv(self.post, [post])
+        report = self.run_incremental()["report"]
+        self.assertEqual(report["release_versions"]["pairs"], {"v1 -> v9": 1})
+        self.assertMatchesFullRun(self.run_incremental())
+
+    def test_unchanged_exports_rescore_nothing(self):
+        self.run_incremental()
+        result = self.run_incremental()
+        self.assertEqual(result["rescored"], 0)
+        self.assertEqual(result["diff"], {})
+        self.assertMatchesFullRun(result)
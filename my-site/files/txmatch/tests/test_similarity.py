@@ -0,0 +1,45 @@
+import random
+import unittest
+
+from .. import rules
+from ..similarity import fuzzy_batch, ratios, structure_batch
+from . import POST, PRE, read
+
+
+def mutations(seed, count=400):
+    """Pairs of strings from a small alphabet, most of them a few edits apart."""
+    rng = random.Random(seed)
+    pairs = []
+    for i in range(count):
+        a = "".join(rng.choice("abcde xyz") for i in range(rng.randint(0, 30)))
+        b = list(a)
+        for edit in range(rng.randint(0, 6)):
+            position = rng.randint(0, len(b))
+            if b and rng.random() < 0.5:
+                del b[min(position, len(b) - 1)]
+            else:
+                b.insert(position, rng.choice("abcde xyz"))
+        pairs.append((a, "".join(b)))
+    return pairs
+
+
+class BoundTests(unittest.TestCase):
+    def test_bound_never_prunes_a_passing_pair(self):
+        pairs = mutations(0)
+        left, right = [a for a, b in pairs], [b for a, b in pairs]
+        for threshold in (0.5, 0.7, 0.85, 0.95, 1.0):
+            result = ratios(left, right, threshold).tolist()
+            for (a, b), value in zip(pairs, result):
+                ratio = rules.similarity(a, b)
+                if ratio >= threshold:
+                    self.assertEqual(value, ratio, (a, b, threshold))
+
+    def test_batches_decide_like_the_rules(self):
+        pre, post = read(PRE)[:30], read(POST)[:30]
+        for field, batch, rule in (("Error Description", fuzzy_batch, rules.fuzzy),
+                                   ("Response Body", structure_batch, rules.structure)):
+            left = [a[field] for a in pre for b in post]
+            right = [b[field] for a in pre for b in post]
+            for threshold in (0.6, 0.85):
+                expected = [rule(a, b, threshold) for a, b in zip(left, right)]
+                self.assertEqual(batch(left, right, threshold).tolist(), expected, (field, threshold))
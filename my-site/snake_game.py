@@ -1,13 +1,15 @@
+import argparse
 import pygame
 import random
 import sys
+from collections import deque
 
-# Initialize pygame
-pygame.init()
+from files.render import DirtyScreen, prerender, text_surface
 
 # Screen dimensions
 WIDTH, HEIGHT = 600, 400
 TILE_SIZE = 20
+COLS, ROWS = WIDTH // TILE_SIZE, HEIGHT // TILE_SIZE
 
 # Colors
 BLACK = (0, 0, 0)
@@ -15,89 +17,199 @@ GREEN = (0, 255, 0)
 RED = (255, 0, 0)
 WHITE = (255, 255, 255)
 
-# Fonts
-title_font = pygame.font.SysFont('Arial', 40, bold=True)
-score_font = pygame.font.SysFont('Arial', 20)
-level_font = pygame.font.SysFont('Arial', 18)
+# Font sizes
+TITLE_SIZE = 40
+SCORE_SIZE = 20
+LEVEL_SIZE = 18
 
-# Set up display
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption('Snake Game')
+# The window, set up by init_display() so that importing the game opens none
+screen = clock = display = None
 
-# Clock
-clock = pygame.time.Clock()
-
-def draw_text(text, font, color, surface, x, y, center=False):
-    textobj = font.render(text, True, color)
+def draw_text(text, size, color, surface, x, y, center=False, bold=False):
+    textobj = text_surface(text, size, color, name='Arial', bold=bold)
     textrect = textobj.get_rect()
     if center:
         textrect.midtop = (x, y)
     else:
         textrect.topleft = (x, y)
-    surface.blit(textobj, textrect)
-
-def random_position():
-    return (random.randrange(0, WIDTH, TILE_SIZE), random.randrange(0, HEIGHT, TILE_SIZE))
-
-def main():
-    snake = [(WIDTH // 2, HEIGHT // 2)]
-    direction = (0, -TILE_SIZE)
-    meal = random_position()
+    return surface.blit(textobj, textrect)
+
+def draw_title(surface):
+    surface.fill(BLACK)
+    draw_text('Snake Game', TITLE_SIZE, WHITE, surface, WIDTH // 2, 10, center=True, bold=True)
+
+def init_display():
+    global screen, clock, display
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption('Snake Game')
+    clock = pygame.time.Clock()
+    # The title never changes, so it is part of the background
+    display = DirtyScreen(screen, prerender((WIDTH, HEIGHT), draw_title))
+
+# Auto-play moves this many cells per frame drawn
+AUTO_MOVES_PER_FRAME = 25
+
+# Directions, in cells
+UP, DOWN, LEFT, RIGHT = (0, -1), (0, 1), (-1, 0), (1, 0)
+
+class Board:
+    """
+    The snake on a cols x rows grid whose cells are numbered y * cols + x.
+
+    The body is a deque, head first, with a bitmap of the cells it covers,
+    and the free cells are kept in a list alongside each cell's index in
+    it, so testing a cell, moving, growing and picking a random free cell
+    for the meal all take constant time however long the snake gets.
+    """
+
+    def __init__(self, cols=COLS, rows=ROWS, start=None, rng=random):
+        self.cols, self.rows = cols, rows
+        self.rng = rng
+        self.free = list(range(cols * rows))
+        self.slot = list(range(cols * rows))  # cell -> its index in free
+        self.occupied = bytearray(cols * rows)
+        if start is None:
+            start = self.cell(cols // 2, rows // 2)
+        self.body = deque([start])
+        self._take(start)
+        self.meal = None
+        self.place_meal()
+
+    def cell(self, x, y):
+        return y * self.cols + x
+
+    def position(self, cell):
+        return cell % self.cols, cell // self.cols
+
+    def _take(self, cell):
+        # Swap the last free cell into this cell's place.
+        index, last = self.slot[cell], self.free.pop()
+        if last != cell:
+            self.free[index] = last
+            self.slot[last] = index
+        self.occupied[cell] = 1
+
+    def _release(self, cell):
+        self.slot[cell] = len(self.free)
+        self.free.append(cell)
+        self.occupied[cell] = 0
+
+    def full(self):
+        return not self.free
+
+    def place_meal(self):
+        """Put the meal on a free cell chosen uniformly; None when the board is full."""
+        self.meal = self.free[self.rng.randrange(len(self.free))] if self.free else None
+        return self.meal
+
+    def next_cell(self, direction):
+        x, y = self.position(self.body[0])
+        return self.cell((x + direction[0]) % self.cols, (y + direction[1]) % self.rows)
+
+    def move(self, direction):
+        """Move one cell, wrapping at the edges; returns 'dead', 'ate' or 'moved'."""
+        head = self.next_cell(direction)
+        if self.occupied[head]:
+            return 'dead'  # End game on self-collision
+        self.body.appendleft(head)
+        self._take(head)
+        if head == self.meal:
+            self.place_meal()
+            return 'ate'
+        self._release(self.body.pop())
+        return 'moved'
+
+def hamiltonian_cycle(cols, rows):
+    """
+    A closed path through every cell of the grid, as the direction to take
+    from each cell: serpentine along the rows from column 1, back up column
+    0. Needs an even number of rows, or of columns (then it runs along them).
+    """
+    if rows % 2:
+        if cols % 2:
+            raise ValueError('no Hamiltonian cycle on a %dx%d grid' % (cols, rows))
+        order = [(x, y) for y, x in _serpentine(rows, cols)]
+    else:
+        order = _serpentine(cols, rows)
+    directions = [None] * (cols * rows)
+    for (x, y), (nx, ny) in zip(order, order[1:] + order[:1]):
+        directions[y * cols + x] = (nx - x, ny - y)
+    return directions
+
+def _serpentine(cols, rows):
+    order = [(0, 0)]
+    for y in range(rows):
+        xs = range(1, cols) if y % 2 == 0 else range(cols - 1, 0, -1)
+        order.extend((x, y) for x in xs)
+    order.extend((0, y) for y in range(rows - 1, 0, -1))
+    return order
+
+def main(auto=False):
+    init_display()
+    board = Board()
+    cycle = hamiltonian_cycle(COLS, ROWS) if auto else None
+    direction = UP
     score = 0
     level = 1
     speed = 10
 
     running = True
     while running:
-        clock.tick(speed + (level - 1) * 2)
+        # Auto-play runs as fast as it can draw
+        clock.tick() if auto else clock.tick(speed + (level - 1) * 2)
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
-            elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_UP and direction != (0, TILE_SIZE):
-                    direction = (0, -TILE_SIZE)
-                elif event.key == pygame.K_DOWN and direction != (0, -TILE_SIZE):
-                    direction = (0, TILE_SIZE)
-                elif event.key == pygame.K_LEFT and direction != (TILE_SIZE, 0):
-                    direction = (-TILE_SIZE, 0)
-                elif event.key == pygame.K_RIGHT and direction != (-TILE_SIZE, 0):
-                    direction = (TILE_SIZE, 0)
+            elif event.type == pygame.KEYDOWN and not auto:
+                if event.key == pygame.K_UP and direction != DOWN:
+                    direction = UP
+                elif event.key == pygame.K_DOWN and direction != UP:
+                    direction = DOWN
+                elif event.key == pygame.K_LEFT and direction != RIGHT:
+                    direction = LEFT
+                elif event.key == pygame.K_RIGHT and direction != LEFT:
+                    direction = RIGHT
 
         # Move snake
-        new_head = ((snake[0][0] + direction[0]) % WIDTH, (snake[0][1] + direction[1]) % HEIGHT)
-        if new_head in snake:
-            running = False  # End game on self-collision
+        for _ in range(AUTO_MOVES_PER_FRAME if auto else 1):
+            if auto:
+                # Following the cycle from the start never meets the body
+                direction = cycle[board.body[0]]
+            result = board.move(direction)
+            if result == 'dead':
+                running = False
+                break
+            if result == 'ate':
+                score += 1
+                if score % 10 == 0:
+                    level += 1
+                if board.full():
+                    running = False  # Nowhere left to go: the board is filled
+                    break
+        if result == 'dead':
             continue
-        snake.insert(0, new_head)
-
-        # Check for meal
-        if new_head == meal:
-            score += 1
-            if score % 10 == 0:
-                level += 1
-            meal = random_position()
-            while meal in snake:
-                meal = random_position()
-        else:
-            snake.pop()
-
-        # Draw everything
-        screen.fill(BLACK)
-        # Draw title
-        draw_text('Snake Game', title_font, WHITE, screen, WIDTH // 2, 10, center=True)
+
+        # Draw everything: erase last tick's drawing back to the background
+        display.clear()
         # Draw score and level
-        draw_text(f'Score: {score}', score_font, WHITE, screen, WIDTH - 120, 10)
-        draw_text(f'Level: {level}', level_font, WHITE, screen, WIDTH - 120, 35)
+        draw_text(f'Score: {score}', SCORE_SIZE, WHITE, display, WIDTH - 120, 10)
+        draw_text(f'Level: {level}', LEVEL_SIZE, WHITE, display, WIDTH - 120, 35)
         # Draw meal
-        pygame.draw.rect(screen, RED, (*meal, TILE_SIZE, TILE_SIZE))
+        if board.meal is not None:
+            x, y = board.position(board.meal)
+            display.fill(RED, (x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE))
         # Draw snake
-        for segment in snake:
-            pygame.draw.rect(screen, GREEN, (*segment, TILE_SIZE, TILE_SIZE))
+        for segment in board.body:
+            x, y = board.position(segment)
+            display.fill(GREEN, (x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE))
 
-        pygame.display.flip()
+        display.update()
 
     pygame.quit()
     sys.exit()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Snake Game')
+    parser.add_argument('--auto', action='store_true', help='let the snake play itself until it fills the board')
+    main(auto=parser.parse_args().auto)